@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import sys
+import json
+import logging
+import argparse
+import platform
+import datetime
+import subprocess
+from . import micro
+from . import trials
+
+
+# Module API
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+        description='Benchmark the trial processing hot path.')
+    parser.add_argument('--records', type=int, default=1000,
+        help='number of generated records of every registry')
+    parser.add_argument('--workers', type=int, default=1,
+        help='number of process_trials workers')
+    parser.add_argument('--repeat', type=int, default=5,
+        help='number of microbenchmark repetitions')
+    parser.add_argument('--skip-trials', action='store_true',
+        help='run only microbenchmarks (no database needed)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='compare results with this JSON file')
+    args = parser.parse_args(argv)
+
+    # Processors and helpers log (and warn) about every record
+    logging.disable(logging.WARNING)
+
+    results = {
+        'commit': _get_commit(),
+        'created': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'micro': micro.run_micro_benchmarks(repeat=args.repeat),
+        'trials': {},
+    }
+    if not args.skip_trials:
+        conn = trials.get_benchmark_conn()
+        results['trials'] = trials.run_trials_benchmark(
+            conn, records=args.records, workers=args.workers)
+
+    baseline = None
+    if args.compare:
+        with io.open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    print(format_results(results, baseline))
+
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(results, indent=2, sort_keys=True, ensure_ascii=False))
+
+
+def format_results(results, baseline=None):
+    """Return results table, with time ratios to baseline results if given.
+    """
+    lines = ['%-48s %12s %12s %8s' % ('Benchmark', 'Seconds', 'Per second', 'Ratio')]
+    for name, result in _iter_results(results):
+        ratio = ''
+        baseline_result = dict(_iter_results(baseline or {})).get(name)
+        if baseline_result and baseline_result['seconds']:
+            ratio = '%.2f' % (result['seconds'] / baseline_result['seconds'])
+        lines.append('%-48s %12.4f %12.1f %8s' % (
+            name, result['seconds'], result['per_second'] or 0, ratio))
+    return '\n'.join(lines)
+
+
+# Internal
+
+def _iter_results(results):
+    for name, result in sorted(results.get('micro', {}).items()):
+        yield 'micro.%s' % name, {'seconds': result['seconds'],
+                                  'per_second': result['calls_per_second']}
+    for registry, result in sorted(results.get('trials', {}).items()):
+        yield 'trials.%s' % registry, {'seconds': result['seconds'],
+                                       'per_second': result['records_per_second']}
+        for stage, timer in sorted(result['timers'].items()):
+            yield 'trials.%s.%s' % (registry, stage), {
+                'seconds': timer['seconds'],
+                'per_second': timer['calls'] / timer['seconds'] if timer['seconds'] else None,
+            }
+
+
+def _get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
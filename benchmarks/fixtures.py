@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import random
+import datetime
+
+
+# Module API
+
+def generate_nct_records(count, seed=0):
+    """Generate `nct` warehouse records.
+
+    Args:
+        count (int): number of records
+        seed (int): random seed
+
+    Returns:
+        list: records
+
+    """
+    rand = random.Random(seed)
+    records = []
+    for index in range(count):
+        nct_id = _get_nct_id(index)
+        records.append(dict(_get_meta(rand, 'https://clinicaltrials.gov/ct2/show/%s' % nct_id), **{
+            'nct_id': nct_id,
+            'secondary_ids': [_get_isrctn_id(index)] if not index % 5 else [],
+            'brief_title': 'Study of %s in %s' % (rand.choice(_INTERVENTIONS), rand.choice(_CONDITIONS)),
+            'official_title': _get_text(rand, 12),
+            'brief_summary': _get_text(rand, 60),
+            'detailed_description': _get_text(rand, 200),
+            'overall_status': rand.choice(['Completed', 'Recruiting', 'Terminated', None]),
+            'eligibility': {'gender': rand.choice(['Both', 'Male', 'Female']), 'criteria': _get_text(rand, 40)},
+            'clinical_results': {'outcomes': _get_text(rand, 10)} if not index % 4 else None,
+            'enrollment_anticipated': rand.randint(10, 1000),
+            'phase': rand.choice(['Phase 1', 'Phase 2', 'Phase 2/Phase 3', 'Phase 3', 'N/A']),
+            'firstreceived_date': _get_date(rand),
+            'start_date': _get_date(rand),
+            'completion_date_actual': _get_date(rand),
+            'verification_date': _get_date(rand),
+            'results_exemption_date': None,
+            'study_type': 'Interventional',
+            'study_design': 'Allocation: Randomized, Masking: Double Blind',
+            'primary_outcomes': [{'measure': _get_text(rand, 6)}],
+            'secondary_outcomes': [{'measure': _get_text(rand, 6)}],
+            'conditions': rand.sample(_CONDITIONS, rand.randint(1, 3)),
+            'interventions': [{'intervention_name': name}
+                              for name in rand.sample(_INTERVENTIONS, rand.randint(1, 3))],
+            'location_countries': rand.sample(_COUNTRIES, rand.randint(1, 4)),
+            'sponsors': [{'lead_spondor': {'agency': rand.choice(_ORGANISATIONS)}}],
+            'overall_officials': [{'role': 'Principal Investigator', 'last_name': rand.choice(_PERSONS)}],
+        }))
+    return records
+
+
+def generate_euctr_records(count, seed=0):
+    """Generate `euctr` warehouse records.
+
+    Every third record refers to a trial of `generate_nct_records`.
+
+    Args:
+        count (int): number of records
+        seed (int): random seed
+
+    Returns:
+        list: records
+
+    """
+    rand = random.Random(seed)
+    records = []
+    for index in range(count):
+        eudract_number = '%04d-%06d-%02d' % (2004 + index % 12, index + 1, index % 100)
+        country = rand.choice(['GB', 'DE', 'FR', 'IT', 'ES'])
+        records.append(dict(_get_meta(rand, 'https://www.clinicaltrialsregister.eu/ctr-search/trial/%s/%s' % (
+            eudract_number, country)), **{
+            'eudract_number': eudract_number,
+            'eudract_number_with_country': '%s/%s' % (eudract_number, country),
+            'us_nct_clinicaltrials_gov_registry_number': _get_nct_id(index) if not index % 3 else None,
+            'isrctn_international_standard_randomised_controlled_trial_numbe': None,
+            'who_universal_trial_reference_number_utrn': None,
+            'title_of_the_trial_for_lay_people_in_easily_understood_i_e_non_': _get_text(rand, 10),
+            'full_title_of_the_trial': _get_text(rand, 20),
+            'trial_status': rand.choice(['Completed', 'Ongoing', 'Prematurely Ended', None]),
+            'subject_male': rand.choice([True, False]),
+            'subject_female': rand.choice([True, False]),
+            'trial_results_url': 'https://www.clinicaltrialsregister.eu/ctr-search/trial/%s/results' % (
+                eudract_number) if not index % 4 else None,
+            'date_on_which_this_record_was_first_entered_in_the_eudract_data': _get_date(rand),
+            'date_of_the_global_end_of_the_trial': _get_date(rand),
+            'trial_main_objective_of_the_trial': _get_text(rand, 60),
+            'trial_principal_inclusion_criteria': _get_text(rand, 40),
+            'trial_principal_exclusion_criteria': _get_text(rand, 40),
+            'subject_in_the_whole_clinical_trial': rand.randint(10, 1000),
+            'trial_medical_condition_s_being_investigated': '\n'.join(
+                rand.sample(_CONDITIONS, rand.randint(1, 3))),
+            'imps': [{'product_name': name} for name in rand.sample(_INTERVENTIONS, rand.randint(1, 3))],
+            'sponsors': [{'name_of_sponsor': rand.choice(_ORGANISATIONS)}],
+        }))
+    return records
+
+
+def generate_ictrp_records(count, seed=0):
+    """Generate `ictrp` warehouse records.
+
+    Records are registered in ISRCTN and every fifth record refers to a
+    trial of `generate_nct_records` by its secondary identifier.
+
+    Args:
+        count (int): number of records
+        seed (int): random seed
+
+    Returns:
+        list: records
+
+    """
+    rand = random.Random(seed)
+    records = []
+    for index in range(count):
+        main_id = _get_isrctn_id(index)
+        records.append(dict(_get_meta(rand, 'http://apps.who.int/trialsearch/Trial3.aspx?trialid=%s' % main_id), **{
+            'register': 'ISRCTN',
+            'main_id': main_id,
+            'date_of_registration': _get_date(rand).strftime('%d/%m/%Y'),
+            'public_title': _get_text(rand, 10),
+            'scientific_title': _get_text(rand, 20),
+            'recruitment_status': rand.choice(['Recruiting', 'Completed', 'Not recruiting', '']),
+            'study_type': 'Interventional',
+            'study_design': 'Randomised controlled trial',
+            'study_phase': rand.choice(['Phase 1', 'Phase 2', 'Phase III', 'Not Specified']),
+            'target_sample_size': rand.randint(10, 1000),
+            'key_inclusion_exclusion_criteria': _get_text(rand, 40),
+            'countries_of_recruitment': ['; '.join(rand.sample(_COUNTRY_VARIATIONS, rand.randint(1, 3)))],
+            'health_conditions_or_problems_studied': rand.sample(_CONDITIONS, rand.randint(1, 3)),
+            'interventions': ['Intervention 1: %s Intervention 2: %s' % tuple(rand.sample(_INTERVENTIONS, 2))],
+            'primary_outcomes': [_get_text(rand, 8)],
+            'secondary_outcomes': [_get_text(rand, 8)],
+        }))
+    return records
+
+
+def insert_records(conn, table, records, chunk_size=1000):
+    """Insert records into the warehouse table.
+    """
+    conn['warehouse'][table].insert_many(records, chunk_size=chunk_size, ensure=False)
+
+
+# Internal
+
+_WORDS = (
+    'randomized double blind placebo controlled study efficacy safety '
+    'patients with moderate severe disease treatment weeks dose response '
+    'open label extension phase multicenter trial evaluate compare versus'
+).split()
+
+_CONDITIONS = [
+    'Asthma', 'Diabetes Mellitus, Type 2', 'Hypertension', 'Breast Cancer',
+    'Alzheimer Disease', 'HIV Infections', 'Depression', 'Schizophrenia',
+    'Rheumatoid Arthritis', 'Psoriasis', 'Migraine', 'Obesity',
+]
+
+_INTERVENTIONS = [
+    'Placebo', 'Metformin', 'Aspirin', 'Ibuprofen', 'Paroxetine',
+    'Insulin Glargine', 'Adalimumab', 'Atorvastatin', 'Salbutamol',
+    'Risperidone', 'Sitagliptin', 'Tamoxifen',
+]
+
+_COUNTRIES = [
+    'United States', 'United Kingdom', 'Germany', 'France', 'Brazil',
+    'Japan', 'India', 'Canada', 'Australia', 'Spain', 'Italy', 'China',
+]
+
+# Country names as they are found in registries (normalized by
+# `get_canonical_location_name`)
+_COUNTRY_VARIATIONS = [
+    'USA', 'UK', 'England', 'Brasil', 'Korea, Republic of', 'Viet Nam',
+    'The Netherlands', 'Germany', 'Russian Federation', 'Iran',
+]
+
+_ORGANISATIONS = [
+    'GlaxoSmithKline', 'Pfizer', 'Novartis', 'Takeda', 'Sanofi',
+    'National Cancer Institute (NCI)', 'University of Oxford',
+]
+
+_PERSONS = ['Smith', 'Jones', 'Garcia', 'Muller', 'Rossi', 'Tanaka']
+
+
+def _get_meta(rand, source):
+    timestamp = datetime.datetime(2016, 1, 1) + datetime.timedelta(seconds=rand.randint(0, 3e7))
+    return {
+        # Records of all registries share `records.id` so derive ids from urls
+        'meta_id': uuid.uuid5(uuid.NAMESPACE_URL, source.encode('utf-8')).hex,
+        'meta_source': source,
+        'meta_created': timestamp,
+        'meta_updated': timestamp,
+    }
+
+
+def _get_nct_id(index):
+    return 'NCT%08d' % (index + 1)
+
+
+def _get_isrctn_id(index):
+    return 'ISRCTN%08d' % (index + 1)
+
+
+def _get_text(rand, words):
+    return ' '.join(rand.choice(_WORDS) for _ in range(words)).capitalize()
+
+
+def _get_date(rand):
+    return datetime.date(2000, 1, 1) + datetime.timedelta(days=rand.randint(0, 6000))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+import random
+import timeit
+import logging
+from processors.base import helpers
+
+
+# Module API
+
+def make_page_text(words=200000, identifiers_ratio=0.005, seed=0):
+    """Generate page text shaped like FDA documents pages.
+
+    Args:
+        words (int): number of words
+        identifiers_ratio (float): ratio of words that are trial identifiers
+        seed (int): random seed
+
+    Returns:
+        str: page text
+
+    """
+    rand = random.Random(seed)
+    text = []
+    for _ in range(words):
+        if rand.random() < identifiers_ratio:
+            text.append(rand.choice(_IDENTIFIERS))
+        else:
+            text.append(rand.choice(_WORDS))
+    return ' '.join(text)
+
+
+def benchmark_find_list_of_identifiers(text, repeat=5):
+    """Return best time of `helpers.find_list_of_identifiers` on text.
+    """
+    timer = timeit.Timer(lambda: helpers.find_list_of_identifiers(text))
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+# Internal
+
+# Words containing identifier prefixes (e.g. "distinct") are on purpose
+_WORDS = (
+    'the study was a randomized double blind placebo controlled trial '
+    'in patients with distinct clinical outcomes and adverse events '
+    'reported to the agency during the review of the application '
+    'gastrointestinal symptoms were assessed at baseline and at week'
+).split()
+
+_IDENTIFIERS = [
+    'NCT00020500',
+    'NCT 01234567',
+    'ISRCTN02018090',
+    'EUCTR2013-030180-02',
+    'JPRN-UMIN123456789',
+    'UMIN000012345',
+    'ACTRN12615001075572p',
+    'TAKEDA01-02-TL-375-033',
+    'GSK123456',
+    'NCT00000000',
+]
+
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    words = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    text = make_page_text(words)
+    seconds = benchmark_find_list_of_identifiers(text)
+    print('find_list_of_identifiers: %s chars in %.3fs (%.1f MB/s)' % (
+        len(text), seconds, len(text) / seconds / 1e6))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import timeit
+from processors.base import helpers
+from . import fixtures
+from . import identifiers
+
+
+# Module API
+
+def run_micro_benchmarks(repeat=5):
+    """Run helpers microbenchmarks.
+
+    Every benchmark is run `repeat` times and the best time is reported.
+
+    Args:
+        repeat (int): number of repetitions
+
+    Returns:
+        dict: benchmark name to {calls, seconds, calls_per_second} dict
+
+    """
+    records = fixtures.generate_nct_records(1000)
+    raw_identifiers = [{'nct': record['nct_id'], 'isrctn': 'ISRCTN 12345678', 'euctr': 'bad'}
+                       for record in records]
+    titles = [record['brief_title'] for record in records]
+    locations = [location
+                 for record in fixtures.generate_ictrp_records(1000)
+                 for location in record['countries_of_recruitment'][0].split('; ')]
+    page_text = identifiers.make_page_text(20000)
+
+    def clean_identifiers():
+        for identifiers_dict in raw_identifiers:
+            helpers.clean_identifiers(identifiers_dict)
+
+    def find_list_of_identifiers():
+        helpers.find_list_of_identifiers(page_text)
+
+    def get_canonical_location_name_cold():
+        normalizer = helpers.LocationNormalizer()
+        for location in locations[:10]:
+            normalizer.normalize(location)
+
+    def get_canonical_location_name():
+        for location in locations:
+            helpers.get_canonical_location_name(location)
+
+    def slugify_string():
+        for title in titles:
+            helpers.slugify_string(title)
+
+    benchmarks = [
+        ('clean_identifiers', clean_identifiers, len(raw_identifiers)),
+        ('find_list_of_identifiers', find_list_of_identifiers, 1),
+        ('get_canonical_location_name_cold', get_canonical_location_name_cold, 10),
+        ('get_canonical_location_name', get_canonical_location_name, len(locations)),
+        ('slugify_string', slugify_string, len(titles)),
+    ]
+    results = {}
+    for name, function, calls in benchmarks:
+        seconds = min(timeit.Timer(function).repeat(repeat=repeat, number=1))
+        results[name] = {
+            'calls': calls,
+            'seconds': seconds,
+            'calls_per_second': calls / seconds if seconds else None,
+        }
+    return results
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import time
+import dataset
+import sqlalchemy
+from importlib import import_module
+from processors.base import helpers
+from processors.base import processors
+from . import fixtures
+
+
+# Module API
+
+def get_benchmark_conn():
+    """Connect to benchmark databases.
+
+    Databases are taken from `BENCHMARK_DATABASE_URL`/`BENCHMARK_WAREHOUSE_URL`
+    or the test databases. They must have the API and warehouse schemas (see
+    `make restore_schemas`) and ALL THEIR DATA IS DELETED by the benchmark.
+
+    Returns:
+        dict: connection dict
+
+    """
+    urls = {
+        'database': os.environ.get('BENCHMARK_DATABASE_URL', os.environ.get('TEST_DATABASE_URL')),
+        'warehouse': os.environ.get('BENCHMARK_WAREHOUSE_URL', os.environ.get('TEST_WAREHOUSE_URL')),
+    }
+    for name, url in urls.items():
+        if not url:
+            raise RuntimeError('Benchmark %s URL is not set' % name)
+    return {name: dataset.connect(url) for name, url in urls.items()}
+
+
+def run_trials_benchmark(conn, records=1000, workers=1, seed=0):
+    """Time `process_trials` of generated nct, euctr and ictrp records.
+
+    Registries are processed in this order on empty databases, so euctr and
+    ictrp records are partly merged into trials created from nct records.
+
+    Args:
+        conn (dict): connection dict
+        records (int): number of records of every registry
+        workers (int): number of `process_trials` workers
+        seed (int): random seed
+
+    Returns:
+        dict: registry to {records, seconds, records_per_second, stats} dict
+
+    """
+    results = {}
+    for name, generate_records in [
+        ('nct', fixtures.generate_nct_records),
+        ('euctr', fixtures.generate_euctr_records),
+        ('ictrp', fixtures.generate_ictrp_records),
+    ]:
+        _truncate_database(conn['warehouse'].engine)
+        if name == 'nct':
+            _truncate_database(conn['database'].engine)
+            helpers.clear_slug_caches()
+        fixtures.insert_records(conn, name, generate_records(records, seed=seed))
+        extractors = helpers.get_variables(
+            import_module('processors.%s.extractors' % name),
+            lambda x: x.startswith('extract_'))
+
+        stats = helpers.reset_stats(enabled=True)
+        started = time.time()
+        processors.process_trials(conn, name, extractors, workers=workers, full=True)
+        seconds = time.time() - started
+        helpers.reset_stats(enabled=False)
+
+        summary = stats.get_summary()
+        results[name] = {
+            'records': records,
+            'seconds': seconds,
+            'records_per_second': records / seconds if seconds else None,
+            'timers': summary['timers'],
+            'counters': summary['counters'],
+        }
+    return results
+
+
+# Internal
+
+def _truncate_database(engine):
+    metadata = sqlalchemy.MetaData(bind=engine)
+    metadata.reflect()
+    with engine.begin() as connection:
+        for table in reversed(metadata.sorted_tables):
+            connection.execute(table.delete())
@@ -5,10 +5,12 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import sys
+import logging
 import dataset
 from importlib import import_module
 from . import config
 from . import helpers
+logger = logging.getLogger(__name__)
 
 
 # Module API
@@ -18,6 +20,18 @@ def cli(argv):
     # Prepare conf dict
     conf = helpers.get_variables(config, lambda x: x.isupper())
 
+    # Get processor args
+    args = argv[2:]
+    if '--full' in args:
+        args.remove('--full')
+        conf['PROCESS_FULL'] = True
+    if '--dry-run' in args:
+        args.remove('--dry-run')
+        conf['PROCESS_DRY_RUN'] = True
+    if '--stats' in args:
+        args.remove('--stats')
+        conf['PROCESS_STATS'] = True
+
     # Prepare conn dict
     conn = {
         'database': dataset.connect(config.DATABASE_URL),
@@ -26,8 +40,15 @@ def cli(argv):
     }
 
     # Get and call processor
+    stats = helpers.reset_stats(enabled=conf['PROCESS_STATS'])
     process = import_module('processors.%s' % argv[1]).process
-    process(conf, conn, *argv[2:])
+    try:
+        process(conf, conn, *args)
+    finally:
+        if stats.enabled:
+            logger.info('Stats of %s:\n%s', argv[1], stats.format_summary())
+            if conf['PROCESS_STATS_FILE']:
+                stats.write_json_lines(conf['PROCESS_STATS_FILE'], processor=argv[1])
 
 
 if __name__ == '__main__':
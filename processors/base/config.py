@@ -29,6 +29,25 @@ else:
     DATABASE_URL = os.environ['DATABASE_URL']
     EXPLORERDB_URL = os.environ['EXPLORERDB_URL']
 
+# Processing
+
+PROCESS_TRIALS_WORKERS = int(os.environ.get('PROCESS_TRIALS_WORKERS', 1))
+# Commit every N records instead of every record (a failed record is
+# rolled back alone using savepoints)
+PROCESS_COMMIT_BATCH_SIZE = int(os.environ.get('PROCESS_COMMIT_BATCH_SIZE', 1))
+# Ignore watermarks and process all warehouse records (same as `--full`)
+PROCESS_FULL = bool(os.environ.get('PROCESS_FULL'))
+# Number of trials removed per transaction by `trial_remover`
+TRIAL_REMOVER_BATCH_SIZE = int(os.environ.get('TRIAL_REMOVER_BATCH_SIZE', 1000))
+# Report what maintenance processors would change without changing it (same as `--dry-run`)
+PROCESS_DRY_RUN = bool(os.environ.get('PROCESS_DRY_RUN'))
+# Log per-stage timings and counters at the end of a run (same as `--stats`)
+PROCESS_STATS = bool(os.environ.get('PROCESS_STATS'))
+# Append per-batch and summary stats as JSON lines to this file
+PROCESS_STATS_FILE = os.environ.get('PROCESS_STATS_FILE')
+# Number of rows copied into staging tables at once by `bulk_trials`
+BULK_LOAD_BUFFER_SIZE = int(os.environ.get('BULK_LOAD_BUFFER_SIZE', 10000))
+
 # Logging
 
 
@@ -84,17 +103,36 @@ AWS_S3_BUCKET = os.environ.get('AWS_S3_BUCKET', None)
 AWS_S3_REGION = os.environ.get('AWS_S3_REGION', None)
 AWS_S3_CUSTOM_DOMAIN = os.environ.get('AWS_S3_CUSTOM_DOMAIN')
 
+# Downloads
+
+# Directory to cache downloaded documents in (disabled if not set)
+DOWNLOAD_CACHE_PATH = os.environ.get('DOWNLOAD_CACHE_PATH')
+# Max size of cached documents in bytes (least recently used are evicted)
+DOWNLOAD_CACHE_MAX_SIZE = int(os.environ.get('DOWNLOAD_CACHE_MAX_SIZE', 10 * 1024 ** 3))
+
+# FDA
+
+# Number of PDFs downloaded concurrently by `fda_dap`
+FDA_DAP_DOWNLOAD_WORKERS = int(os.environ.get('FDA_DAP_DOWNLOAD_WORKERS', 4))
+
 # DocumentCloud
 
 DOCUMENTCLOUD_USERNAME = os.environ.get('DOCUMENTCLOUD_USERNAME')
 DOCUMENTCLOUD_PASSWORD = os.environ.get('DOCUMENTCLOUD_PASSWORD')
 DOCUMENTCLOUD_PROJECT = os.environ.get('DOCUMENTCLOUD_PROJECT')
+# Number of concurrent requests to DocumentCloud
+DOCUMENTCLOUD_WORKERS = int(os.environ.get('DOCUMENTCLOUD_WORKERS', 8))
+# Max requests per second per DocumentCloud host
+DOCUMENTCLOUD_RATE_LIMIT = float(os.environ.get('DOCUMENTCLOUD_RATE_LIMIT', 10))
 
 # PyBossa
 
 PYBOSSA_URL = os.environ.get('PYBOSSA_URL')
 PYBOSSA_API_KEY = os.environ.get('PYBOSSA_API_KEY')
 PYBOSSA_PROJECT_INDICATIONS = os.environ.get('PYBOSSA_PROJECT_INDICATIONS')
+# Days after which tasks are fetched from PyBossa again instead of using the
+# snapshot of the last run (to find tasks deleted or duplicated on the server)
+PYBOSSA_SNAPSHOT_MAX_AGE = int(os.environ.get('PYBOSSA_SNAPSHOT_MAX_AGE', 7))
 
 # Remove sources
 REMOVE_SOURCE_IDS = os.environ.get('REMOVE_SOURCE_IDS')
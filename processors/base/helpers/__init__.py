@@ -14,13 +14,49 @@ import datetime
 import urlparse
 import csv
 import fuzzywuzzy.fuzz
-import fuzzywuzzy.process
+import fuzzywuzzy.utils
 import iso3166
+import sqlalchemy
 
 from . import pybossa_tasks_updater
+from . import trial_identifier_index
+from . import slug_cache
+from . import watermark
+from . import stats
+from . import commit_batch
+from . import union_find
+from . import copy_writer
+from . import trial_deduplicator
+from . import checkpoint
+from . import retry
+from . import download_cache
+from . import rate_limiter
 
 logger = logging.getLogger(__name__)
 PyBossaTasksUpdater = pybossa_tasks_updater.PyBossaTasksUpdater
+TrialIdentifierIndex = trial_identifier_index.TrialIdentifierIndex
+SlugCache = slug_cache.SlugCache
+get_slug_cache = slug_cache.get_slug_cache
+clear_slug_caches = slug_cache.clear_slug_caches
+WatermarkTracker = watermark.WatermarkTracker
+get_watermark = watermark.get_watermark
+set_watermark = watermark.set_watermark
+reset_watermarks = watermark.reset_watermarks
+get_latest_updated = watermark.get_latest_updated
+Stats = stats.Stats
+get_stats = stats.get_stats
+reset_stats = stats.reset_stats
+CommitBatch = commit_batch.CommitBatch
+UnionFind = union_find.UnionFind
+CopyWriter = copy_writer.CopyWriter
+TrialDeduplicator = trial_deduplicator.TrialDeduplicator
+get_checkpoint = checkpoint.get_checkpoint
+set_checkpoint = checkpoint.set_checkpoint
+get_backoff_delay = retry.get_backoff_delay
+call_with_retry = retry.call_with_retry
+DownloadCache = download_cache.DownloadCache
+get_download_cache = download_cache.get_download_cache
+RateLimiter = rate_limiter.RateLimiter
 
 
 # Module API
@@ -76,31 +112,10 @@ def clean_list(raw_list):
 def clean_identifiers(identifiers):
     """Remove invalid identifiers.
     """
-    PATTERNS = {
-        'actrn': r'^ACTRN\d{14}p?$',
-        'chictr': r'^ChiCTR',
-        'drks': r'^DRKS',
-        'euctr': r'^EUCTR\d{4}-\d{6}-\d{2}$',
-        'gsk': r'^GSK',
-        'irct': r'^IRCT',
-        'isrctn': r'^ISRCTN\d{8}$',
-        'jprn': r'^(JPRN-)?(C\d{9}|JapicCTI-\d{6}|JMA-IIA\d{5}|UMIN\d{9})$',
-        'kct': r'^KCT',
-        'nct': r'^NCT\d{8}$',
-        'ntr': r'^NTR',
-        'pactr': r'^PACTR',
-        'per': r'^PER',
-        'rbr': r'^RBR',
-        'rpcec': r'^RPCEC',
-        'takeda': r'^TAKEDA',
-        'tctr': r'^TCTR',
-        'who': r'^U\d{4}-\d{4}-\d{4}$',
-    }
     result = {}
     for key, value in identifiers.items():
         try:
-            new_value, num_changes = re.subn(
-                r'^(\w+)\s+', r'\g<1>', value, re.IGNORECASE)
+            new_value, num_changes = _IDENTIFIER_WHITESPACE_PATTERN.subn(r'\g<1>', value)
             if num_changes:
                 logger.debug('Removed whitespaces from identifier "%s" to "%s"',
                              value, new_value)
@@ -109,7 +124,7 @@ def clean_identifiers(identifiers):
             pass
         if not validate_identifier(value):
             logger.warning('Ignoring invalid identifier %s:%s', key, value)
-        elif key not in PATTERNS or not re.match(PATTERNS[key], value, re.IGNORECASE):
+        elif key not in _IDENTIFIER_REGEXES or not _IDENTIFIER_REGEXES[key].match(value):
             message = 'Identifier "%s:%s" is not recognized'
             logger.warning(message, key, value)
         else:
@@ -153,31 +168,23 @@ def find_list_of_identifiers(text):
     validate_identifiers() function.
     """
 
-    # Pattern could be improved based on a extended
-    # clinical trial identifiers format analysis
-    PATTERN = r'(%s\s*[\w\d-]{3,})'
-    # In a form (source_id, pattern[])
-    PREFIXES = [
-        ('actrn', ['actrn']),
-        ('euctr', ['euctr']),
-        ('gsk', ['gsk']),
-        ('isrctn', ['isrctn']),
-        ('jprn', ['jprn', 'umin']),
-        ('nct', ['nct']),
-        ('takeda', ['takeda']),
-    ]
-
-    # Find identifiers
+    # Find identifiers of all prefixes in a single pass. Matches of the same
+    # prefix don't overlap as if they were found by `re.findall`
+    matches = {prefix: [] for _, prefix in _IDENTIFIER_PREFIXES}
+    ends = {}
+    for match in _IDENTIFIER_SCANNER.finditer(text):
+        prefix = match.group(2).lower()
+        if match.start() >= ends.get(prefix, 0):
+            ends[prefix] = match.end(1)
+            matches[prefix].append(match.group(1))
+
+    # Validate identifiers
     list_of_identifiers = []
-    for source_id, patterns in PREFIXES:
-        for prefix in patterns:
-            pattern = PATTERN % prefix
-            matches = re.findall(pattern, text, re.IGNORECASE)
-
-            for match in matches:
-                clean_ids = clean_identifiers({source_id: match})
-                if clean_ids:
-                    list_of_identifiers.extend([clean_ids])
+    for source_id, prefix in _IDENTIFIER_PREFIXES:
+        for match in matches[prefix]:
+            clean_ids = clean_identifiers({source_id: match})
+            if clean_ids:
+                list_of_identifiers.append(clean_ids)
 
     return list_of_identifiers
 
@@ -185,7 +192,7 @@ def find_list_of_identifiers(text):
 def validate_identifier(identifier):
     """Empty or identifiers with only zeros are invalid."""
     if identifier:
-        numbers = re.sub('[^\d]', '', identifier)
+        numbers = _NON_DIGITS_PATTERN.sub('', identifier)
         if numbers:
             return int(numbers) != 0
 
@@ -203,57 +210,117 @@ def validate_remote_url(url):
     return is_valid_url
 
 
-def iter_rows(conn, dataset, table, orderby, bufsize=100, **filter):
+def iter_rows(conn, dataset, table, orderby, bufsize=100, keyset=False,
+              server_side=False, count=True, shard=None, updated_since=None, **filter):
     """Yield keyed rows from dataset table lazily and effective (using buffer).
 
+    By default rows are paged with OFFSET/LIMIT which makes every next page
+    slower on big tables. With `keyset` enabled each page seeks on the
+    `orderby` column instead (it must be unique and indexed, e.g. `meta_id`),
+    and with `server_side` enabled the whole table is streamed through a
+    server-side (named) cursor fetching `bufsize` rows at a time.
+
+    With `shard` set to an `(index, total)` tuple only rows whose `orderby`
+    value hashes into the given shard are yielded, so `total` workers can
+    split the table between them without overlapping. With `updated_since`
+    set only rows with later `meta_updated` are yielded, and rows without
+    `meta_updated` (it's nullable in some warehouse tables) are yielded
+    every time.
+
     Args:
         conn (dict): connection dict
         dataset (str): dataset name (e.g. warehouse/database)
         table (str): table name
         order_by (str): how to order rows
         bufsize (int): how many rows to get per query
+        keyset (bool): use keyset pagination on the `orderby` column
+        server_side (bool): use a server-side cursor instead of pagination
+        count (bool): count rows before iterating (offset pagination only)
+        shard (tuple): (index, total) of the shard to iterate
+        updated_since (datetime): skip rows not updated after this time
         filter (dict): additional field filter
 
     Yields:
         dict: the next row from table
 
     """
-    offset = 0
-    count = conn[dataset][table].count(**filter)
-    # FIXME: This doesn't avoid changing the received filter param
-    query = filter
-    query['order_by'] = orderby
-    while offset < count:
-        query.update({
-            '_offset': offset,
-            '_limit': bufsize,
-        })
-        offset += bufsize
-        for row in conn[dataset][table].find(**query):
-            # Fixing hex representation
-            for field in ['id', 'meta_id']:
-                if field in row:
-                    try:
-                        row[field] = uuid.UUID(row[field]).hex
-                    except ValueError:
-                        # Ignore errors if ID fields aren't UUIDs
-                        pass
-            yield row
+    clauses = []
+    if shard is not None:
+        clauses.append(_get_shard_clause(conn[dataset][table], orderby, *shard))
+    if updated_since is not None:
+        meta_updated = conn[dataset][table].table.c.meta_updated
+        clauses.append(sqlalchemy.or_(meta_updated > updated_since, meta_updated.is_(None)))
+    if server_side:
+        rows = _iter_rows_server_side(conn, dataset, table, orderby, bufsize, clauses, filter)
+    elif keyset:
+        rows = _iter_rows_keyset(conn, dataset, table, orderby, bufsize, clauses, filter)
+    else:
+        rows = _iter_rows_offset(conn, dataset, table, orderby, bufsize, count, clauses, filter)
+    for row in rows:
+        # Fixing hex representation
+        for field in ['id', 'meta_id']:
+            if field in row:
+                try:
+                    row[field] = uuid.UUID(row[field]).hex
+                except ValueError:
+                    # Ignore errors if ID fields aren't UUIDs
+                    pass
+        yield row
+
+
+def iter_query_rows(conn, dataset, query, bufsize=100, **params):
+    """Yield rows of a raw query lazily through a server-side cursor.
+
+    Unlike `iter_rows` it works with any query (e.g. with joins), which
+    should be ordered as the caller needs. Rows are streamed `bufsize` at a
+    time over a dedicated connection, so memory doesn't grow with the result.
+
+    Args:
+        conn (dict): connection dict
+        dataset (str): dataset name (e.g. warehouse/database)
+        query (str): SQL query with `:name` params
+        bufsize (int): how many rows to fetch at a time
+        params (dict): query params
+
+    Yields:
+        dict: the next row of the query
+
+    """
+    connection = conn[dataset].engine.connect()
+    try:
+        result = connection.execution_options(stream_results=True).execute(
+            sqlalchemy.text(query), **params)
+        while True:
+            rows = result.fetchmany(bufsize)
+            if not rows:
+                break
+            for row in rows:
+                yield conn[dataset].row_type(row.items())
+    finally:
+        connection.close()
 
 
-def find_trial_by_identifiers(conn, identifiers, ignore_record_id=None):
+def find_trial_by_identifiers(conn, identifiers, ignore_record_id=None, index=None):
     """Find first trial matched by one of passed identifiers.
 
     Args:
         conn (dict): connection dict
         identifiers (dict): identifiers dict (nct: <id>, euct: <id>, ...)
         ignore_record_id (str): skip record with this id (for better dedup)
+        index (TrialIdentifierIndex): look records up in the index
+            instead of querying the database
 
     Returns:
         dict: trial
 
     """
     trial = None
+    if index is not None:
+        for trial_id in index.find_trial_ids(identifiers, ignore_record_id):
+            trial = conn['database']['trials'].find_one(id=trial_id)
+            if trial:
+                break
+        return trial
     # See https://github.com/opentrials/processors/pull/46/files/f5e8403072bf6ed93b82d0c45bd3877e42e435c4#r76836368
     QUERY = "SELECT * FROM records WHERE identifiers @> '%s'"
     for source, identifier in identifiers.items():
@@ -271,6 +338,55 @@ def find_trial_by_identifiers(conn, identifiers, ignore_record_id=None):
     return trial
 
 
+def find_by_slug(conn, table, slug):
+    """Find entity by slug using the table's slug cache.
+
+    Entities found in the cache are returned without querying the database
+    and only contain `id` and `slug` fields.
+
+    Args:
+        conn (dict): connection dict
+        table (str): entity table name
+        slug (str): entity slug
+
+    Returns:
+        dict/None: entity/if not found
+
+    """
+    cache = get_slug_cache(table)
+    object_id = cache.get(slug)
+    if object_id is not None:
+        return {'id': object_id, 'slug': slug}
+    object = conn['database'][table].find_one(slug=slug)
+    if object:
+        cache.set(slug, object['id'])
+    return object
+
+
+def lock_identifiers(conn, identifiers):
+    """Acquire transaction level advisory locks for trial identifiers.
+
+    It serializes trial deduplication between concurrent transactions writing
+    records with shared identifiers. Locks are acquired in a stable order to
+    avoid deadlocks and released on commit or rollback.
+
+    Args:
+        conn (dict): connection dict
+        identifiers (dict): identifiers dict (nct: <id>, euct: <id>, ...)
+
+    """
+    QUERY = """
+        SELECT pg_advisory_xact_lock(key)
+        FROM (
+            SELECT DISTINCT hashtext(unnest(:keys)) AS key ORDER BY key
+        ) AS keys
+    """
+    keys = ['%s:%s' % (source, identifier)
+            for source, identifier in identifiers.items()]
+    if keys:
+        list(conn['database'].query(QUERY, keys=keys))
+
+
 def safe_prepend(prepend_string, string):
     """Prepend to string non-destructively
     Ex: safe_prepend('EUCTR', 'EUCTR12345678') => 'EUCTR12345678'
@@ -287,6 +403,92 @@ def safe_prepend(prepend_string, string):
     return string
 
 
+class LocationNormalizer(object):
+    """Normalize locations to canonical country names.
+
+    Countries are loaded once into an exact-match dictionary and an index of
+    preprocessed names for fuzzy matching, and results are memoized per
+    location (see `hits` and `misses` counters).
+
+    Args:
+        csv_path (str): path to countries CSV
+
+    """
+
+    # Extracted from: https://github.com/datasets/country-codes/blob/master/data/country-codes.csv
+    CSV_PATH = os.path.join(os.path.dirname(__file__), 'data/countries.csv')
+
+    def __init__(self, csv_path=CSV_PATH):
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._exact_index = {}
+        self._fuzzy_index = []
+        with open(csv_path, 'r') as csv_file:
+            reader = csv.DictReader(csv_file)
+            for country in reader:
+                name = iso3166.countries.get(country['ISO3166-1-Alpha-3']).name
+                choices = []
+                for field in reader.fieldnames[0:5]:
+                    choice = remove_string_punctuation(unicode(country[field], encoding='utf-8'))
+                    # Same preprocessing as `extractOne` does for every choice
+                    choice = _sort_tokens(fuzzywuzzy.utils.full_process(choice, force_ascii=True))
+                    if choice:
+                        self._exact_index.setdefault(choice, name)
+                    choices.append(choice)
+                self._fuzzy_index.append((name, choices))
+
+    def normalize(self, location):
+        """Find the canonical location name according to the passed entry
+
+        Args:
+            location (str): the location to be normalized
+        """
+        if location is None:
+            return None
+        try:
+            result = self._results[location]
+        except KeyError:
+            self.misses += 1
+            result = self._results[location] = self._normalize(location)
+        else:
+            self.hits += 1
+        return result
+
+    def _normalize(self, location):
+        cleaned_location = remove_string_punctuation(location)
+        try:
+            current_match = iso3166.countries.get(cleaned_location).name
+        except KeyError:
+            # Same preprocessing as `extractOne` does for the query
+            query = fuzzywuzzy.utils.full_process(cleaned_location)
+            query = _sort_tokens(fuzzywuzzy.utils.full_process(query, force_ascii=True))
+            current_match = self._exact_index.get(query)
+            if current_match is None:
+                current_score = float('-inf')
+                for name, choices in self._fuzzy_index:
+                    score = max(fuzzywuzzy.fuzz.ratio(query, choice) for choice in choices)
+                    if score > current_score:
+                        current_match = name
+                        current_score = score
+                if current_score < EDIT_DISTANCE_THRESHOLD:
+                    logger.debug('Location "%s" not normalized', location)
+                    return location
+
+        logger.debug('Location "%s" normalized as "%s"', cleaned_location, current_match)
+
+        return current_match
+
+
+def get_location_normalizer():
+    """Return location normalizer shared by the current process.
+    """
+    global _location_normalizer
+    if _location_normalizer is None:
+        _location_normalizer = LocationNormalizer()
+    return _location_normalizer
+
+
 def get_canonical_location_name(location):
     """Find the canonical location name according to the
     passed entry
@@ -294,38 +496,140 @@ def get_canonical_location_name(location):
     Args:
         location (str): the location to be normalized
     """
+    return get_location_normalizer().normalize(location)
+
+
+# Internal
+
+_IDENTIFIER_PATTERNS = {
+    'actrn': r'^ACTRN\d{14}p?$',
+    'chictr': r'^ChiCTR',
+    'drks': r'^DRKS',
+    'euctr': r'^EUCTR\d{4}-\d{6}-\d{2}$',
+    'gsk': r'^GSK',
+    'irct': r'^IRCT',
+    'isrctn': r'^ISRCTN\d{8}$',
+    'jprn': r'^(JPRN-)?(C\d{9}|JapicCTI-\d{6}|JMA-IIA\d{5}|UMIN\d{9})$',
+    'kct': r'^KCT',
+    'nct': r'^NCT\d{8}$',
+    'ntr': r'^NTR',
+    'pactr': r'^PACTR',
+    'per': r'^PER',
+    'rbr': r'^RBR',
+    'rpcec': r'^RPCEC',
+    'takeda': r'^TAKEDA',
+    'tctr': r'^TCTR',
+    'who': r'^U\d{4}-\d{4}-\d{4}$',
+}
+
+_IDENTIFIER_REGEXES = {key: re.compile(pattern, re.IGNORECASE)
+                       for key, pattern in _IDENTIFIER_PATTERNS.items()}
+
+_IDENTIFIER_WHITESPACE_PATTERN = re.compile(r'^(\w+)\s+')
+
+_NON_DIGITS_PATTERN = re.compile(r'[^\d]')
+
+# In a form (source_id, prefix)
+_IDENTIFIER_PREFIXES = [
+    ('actrn', 'actrn'),
+    ('euctr', 'euctr'),
+    ('gsk', 'gsk'),
+    ('isrctn', 'isrctn'),
+    ('jprn', 'jprn'),
+    ('jprn', 'umin'),
+    ('nct', 'nct'),
+    ('takeda', 'takeda'),
+]
+
+# Pattern could be improved based on a extended
+# clinical trial identifiers format analysis.
+# Lookahead finds overlapping identifiers of different prefixes
+# and the first letters class is a fast path for other positions
+_IDENTIFIER_SCANNER = re.compile(r'(?=[%s])(?=((%s)\s*[\w\d-]{3,}))' % (
+    ''.join(sorted(set(prefix[0] for _, prefix in _IDENTIFIER_PREFIXES))),
+    '|'.join(prefix for _, prefix in _IDENTIFIER_PREFIXES),
+), re.IGNORECASE)
+
+_location_normalizer = None
+
+
+def _sort_tokens(value):
+    return ' '.join(sorted(value.split())).strip()
+
+
+def _iter_rows_offset(conn, dataset, table, orderby, bufsize, count, clauses, filter):
+    offset = 0
+    total = None
+    if count:
+        total = conn[dataset][table].count(*clauses, **filter)
+    query = dict(filter, order_by=orderby)
+    while total is None or offset < total:
+        query.update({
+            '_offset': offset,
+            '_limit': bufsize,
+        })
+        offset += bufsize
+        rows = list(conn[dataset][table].find(*clauses, **query))
+        for row in rows:
+            yield row
+        if total is None and len(rows) < bufsize:
+            break
 
-    if location is None:
-        return None
 
-    # Extracted from: https://github.com/datasets/country-codes/blob/master/data/country-codes.csv
-    CSV_PATH = os.path.join(os.path.dirname(__file__), 'data/countries.csv')
-    DISTANCE_SCORER = fuzzywuzzy.fuzz.token_sort_ratio
+def _iter_rows_keyset(conn, dataset, table, orderby, bufsize, clauses, filter):
+    column = _get_column(conn[dataset][table], orderby)
+    descending = orderby.startswith('-')
+    last_key = None
+    query = dict(filter, order_by=orderby, _limit=bufsize)
+    while True:
+        page_clauses = list(clauses)
+        if last_key is not None:
+            page_clauses.append(column < last_key if descending else column > last_key)
+        rows = list(conn[dataset][table].find(*page_clauses, **query))
+        if rows:
+            # Read the key before yielding as the caller may change the row
+            last_key = rows[-1][column.name]
+        for row in rows:
+            yield row
+        if len(rows) < bufsize:
+            break
 
-    cleaned_location = remove_string_punctuation(location)
-    current_match = location
 
+def _iter_rows_server_side(conn, dataset, table, orderby, bufsize, clauses, filter):
+    table = conn[dataset][table]
+    column = _get_column(table, orderby)
+    clauses = list(clauses)
+    for name, value in filter.items():
+        if isinstance(value, (list, tuple)):
+            clauses.append(table.table.c[name].in_(value))
+        else:
+            clauses.append(table.table.c[name] == value)
+    query = table.table.select(
+        whereclause=sqlalchemy.and_(*clauses),
+        order_by=column.desc() if orderby.startswith('-') else column)
+    # Named cursors only live inside a transaction so we use a dedicated
+    # connection not to interfere with writes made by the caller
+    connection = conn[dataset].engine.connect()
     try:
-        current_match = iso3166.countries.get(cleaned_location).name
-    except KeyError:
-        with open(CSV_PATH, 'r') as csv_file:
-            reader = csv.DictReader(csv_file)
-            current_score = float('-inf')
-            for country in reader:
-                relevant_info = [unicode(country[field], encoding='utf-8')
-                                 for field in reader.fieldnames[0:5]]
-
-                location_info = [remove_string_punctuation(location_info) for location_info in relevant_info]
-                _, score = fuzzywuzzy.process.extractOne(cleaned_location, location_info, scorer=DISTANCE_SCORER)
+        result = connection.execution_options(stream_results=True).execute(query)
+        while True:
+            rows = result.fetchmany(bufsize)
+            if not rows:
+                break
+            for row in rows:
+                yield conn[dataset].row_type(row.items())
+    finally:
+        connection.close()
 
-                if score > current_score:
-                    current_match = iso3166.countries.get(country['ISO3166-1-Alpha-3']).name
-                    current_score = score
 
-            if current_score < EDIT_DISTANCE_THRESHOLD:
-                logger.debug('Location "%s" not normalized', location)
-                return location
+def _get_column(table, orderby):
+    name = orderby[1:] if orderby.startswith('-') else orderby
+    return table.table.c[name]
 
-    logger.debug('Location "%s" normalized as "%s"', cleaned_location, current_match)
 
-    return current_match
+def _get_shard_clause(table, orderby, index, total):
+    # hashtext() returns a signed int4 so we shift it to be non-negative
+    column = _get_column(table, orderby)
+    hashed = sqlalchemy.func.hashtext(sqlalchemy.cast(column, sqlalchemy.Text))
+    hashed = sqlalchemy.cast(hashed, sqlalchemy.BigInteger) + 2 ** 31
+    return hashed % total == index
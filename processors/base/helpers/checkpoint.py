@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def get_checkpoint(conn, name):
+    """Get the last position saved by an interrupted run (e.g. last exported id).
+
+    Args:
+        conn (dict): connection dict
+        name (str): checkpoint name (e.g. processor name)
+
+    Returns:
+        str/None: checkpoint/if there is no checkpoint
+
+    """
+    query = 'SELECT value FROM processors_checkpoints WHERE name = :name'
+    for row in conn['database'].query(query, name=name):
+        return row['value']
+    return None
+
+
+def set_checkpoint(conn, name, value):
+    """Save position of the run, so it can be continued if interrupted.
+
+    Args:
+        conn (dict): connection dict
+        name (str): checkpoint name (e.g. processor name)
+        value (str): checkpoint (None to remove it once the run is finished)
+
+    """
+    if value is None:
+        query = 'DELETE FROM processors_checkpoints WHERE name = :name'
+    else:
+        query = """
+            INSERT INTO processors_checkpoints (name, value, updated_at)
+            VALUES (:name, :value, now())
+            ON CONFLICT (name) DO UPDATE
+            SET value = EXCLUDED.value, updated_at = EXCLUDED.updated_at
+        """
+    conn['database'].query(query, name=name, value=value)
+    if value is None:
+        logger.debug('Checkpoint of %s removed', name)
+    else:
+        logger.debug('Checkpoint of %s set (%s characters)', name, len(value))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CommitBatch(object):
+    """Write records in transactions committed every `size` records.
+
+    Every record is written in its own savepoint, so a failed record is
+    rolled back alone and records written before it in the same transaction
+    are kept. With a size of 1 every record is written in its own transaction.
+
+    Example:
+        batch = CommitBatch(conn['database'], size=100)
+        for record in records:
+            batch.begin()
+            try:
+                write(record)
+            except Exception:
+                batch.rollback()
+            else:
+                batch.commit()
+        batch.flush()
+
+    Args:
+        db (dataset.Database): database
+        size (int): number of records per transaction
+
+    """
+
+    def __init__(self, db, size=1):
+        self.db = db
+        self.size = max(size, 1)
+        self.pending = 0
+        self._in_transaction = False
+        self._savepoint = None
+
+    def begin(self):
+        """Start writing a record.
+        """
+        if not self._in_transaction:
+            self.db.begin()
+            self._in_transaction = True
+        if self.size > 1:
+            self._savepoint = self.db.executable.begin_nested()
+
+    def commit(self):
+        """Keep the written record and commit the transaction if it's full.
+        """
+        if self._savepoint is not None:
+            self._savepoint.commit()
+            self._savepoint = None
+        self.pending += 1
+        if self.pending >= self.size:
+            self.flush()
+
+    def rollback(self):
+        """Roll back the record written since the last `begin`.
+        """
+        if self._savepoint is not None:
+            self._savepoint.rollback()
+            self._savepoint = None
+        elif self._in_transaction:
+            self.db.rollback()
+            self._in_transaction = False
+
+    def flush(self):
+        """Commit records written since the last commit.
+        """
+        if self._in_transaction:
+            self.db.commit()
+            self._in_transaction = False
+            if self.size > 1:
+                logger.debug('Committed %s records', self.pending)
+        self.pending = 0
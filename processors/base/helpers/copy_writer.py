@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import json
+import logging
+import datetime
+import sqlalchemy
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 10000
+
+
+class CopyWriter(object):
+    """Stream rows into a database table with `COPY ... FROM STDIN`.
+
+    Rows are buffered and copied every `bufsize` rows (and on `flush`) using
+    a pooled connection of its own, so the table must be visible to other sessions
+    (e.g. a staging table, not a temporary one). Every copy is committed.
+    Row keys which aren't table columns are ignored and missing ones are
+    copied as NULL.
+
+    Example:
+        writer = CopyWriter(conn['database'], 'bulk_trials')
+        for trial in trials:
+            writer.write(trial)
+        writer.flush()
+
+    Args:
+        db (dataset.Database): database
+        table (str): table name
+        bufsize (int): number of rows per copy
+
+    """
+
+    def __init__(self, db, table, bufsize=COPY_BUFFER_SIZE):
+        columns = db[table].table.columns
+        self.table = table
+        self.columns = [column.name for column in columns]
+        self.json_columns = set(column.name for column in columns
+                                if isinstance(column.type, sqlalchemy.types.JSON))
+        self.bufsize = bufsize
+        self.count = 0
+        self._engine = db.engine
+        self._buffer = io.BytesIO()
+        self._buffered = 0
+
+    def write(self, row):
+        """Buffer row and copy buffered rows if the buffer is full.
+        """
+        line = '\t'.join(
+            _format_value(row.get(column), is_json=column in self.json_columns)
+            for column in self.columns)
+        self._buffer.write((line + '\n').encode('utf-8'))
+        self._buffered += 1
+        if self._buffered >= self.bufsize:
+            self.flush()
+
+    def flush(self):
+        """Copy buffered rows.
+        """
+        if not self._buffered:
+            return
+        self._buffer.seek(0)
+        connection = self._engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.copy_expert('COPY %s (%s) FROM STDIN' % (
+                self.table, ', '.join('"%s"' % column for column in self.columns)),
+                self._buffer)
+            connection.commit()
+        finally:
+            connection.close()
+        self.count += self._buffered
+        logger.debug('Copied %s rows into %s', self.count, self.table)
+        self._buffer = io.BytesIO()
+        self._buffered = 0
+
+
+# Internal
+
+_ARRAY_SPECIAL_CHARS = set('{}",\\ \t\n\r\v\f')
+
+
+def _format_value(value, is_json=False):
+    if value is None:
+        return '\\N'
+    if is_json:
+        value = json.dumps(value)
+    elif isinstance(value, (list, tuple)):
+        value = _format_array(value)
+    else:
+        value = _format_scalar(value)
+    return (value
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r'))
+
+
+def _format_scalar(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return '%s' % value
+
+
+def _format_array(value):
+    # Same literal as psycopg2 writes (an ARRAY rendered by Postgres), so
+    # lists end up the same in text and array columns
+    items = []
+    for item in value:
+        if item is None:
+            items.append('NULL')
+        elif isinstance(item, (list, tuple)):
+            items.append(_format_array(item))
+        else:
+            item = _format_scalar(item)
+            if (not item or item.upper() == 'NULL' or
+                    any(char in _ARRAY_SPECIAL_CHARS for char in item)):
+                item = '"%s"' % item.replace('\\', '\\\\').replace('"', '\\"')
+            items.append(item)
+    return '{%s}' % ','.join(items)
+
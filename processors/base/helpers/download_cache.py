@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import json
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+import threading
+import collections
+import requests
+logger = logging.getLogger(__name__)
+
+CachedFile = collections.namedtuple('CachedFile', ['path', 'sha1', 'modified'])
+
+
+class DownloadCache(object):
+    """Cache downloaded files on disk by their content.
+
+    Files are stored once per content under their SHA-1 and looked up by url.
+    Cached urls are revalidated with `If-None-Match`/`If-Modified-Since`
+    (once per cache instance), so unchanged files aren't downloaded again.
+    When files take more than `max_size` bytes, the least recently used
+    ones are evicted. The cache can also keep small values derived from
+    files' content (e.g. checksum of merged files, see `get_value`).
+
+    It's safe to use from multiple threads of a process. Call `save` when
+    done to keep access times of files which weren't downloaded.
+
+    Example:
+        cache = DownloadCache('/tmp/downloads', max_size=10 * 1024 ** 3)
+        cached_file = cache.fetch(url)
+        with open(cached_file.path, 'rb') as file:
+            process(file, cached_file.sha1)
+
+    Args:
+        path (str): cache directory
+        max_size (int): max size of cached files in bytes
+        session (requests.Session): session to download with (optional)
+
+    """
+
+    def __init__(self, path, max_size, session=None):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._validated = set()
+        self._index_path = os.path.join(path, 'index.json')
+        _ensure_directory(os.path.join(path, 'objects'))
+        try:
+            with io.open(self._index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (IOError, ValueError):
+            index = {}
+        self._urls = index.get('urls', {})
+        self._values = index.get('values', {})
+
+    def fetch(self, url):
+        """Return cached file of url downloading it if it's not cached or changed.
+
+        Args:
+            url (str): file url
+
+        Returns:
+            CachedFile: (path, sha1, modified) tuple, `modified` is False if the
+                cached file was still valid
+
+        """
+        with self._lock:
+            entry = self._urls.get(url)
+            if entry is not None and not os.path.exists(self._get_object_path(entry['sha1'])):
+                entry = None
+            if entry is not None and url in self._validated:
+                return self._hit(url, entry)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self._session.get(url, headers=headers, stream=True)
+        try:
+            if entry is not None and response.status_code == 304:
+                with self._lock:
+                    self._validated.add(url)
+                    return self._hit(url, entry)
+            response.raise_for_status()
+            sha1, size = self._download(response)
+        finally:
+            response.close()
+
+        with self._lock:
+            self.misses += 1
+            self._validated.add(url)
+            self._urls[url] = {
+                'sha1': sha1,
+                'size': size,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'accessed': time.time(),
+            }
+            self._evict(keep_sha1=sha1)
+            self._save()
+        logger.debug('Downloaded %s (%s bytes) to cache', url, size)
+        modified = entry is None or entry['sha1'] != sha1
+        return CachedFile(self._get_object_path(sha1), sha1, modified)
+
+    def get_value(self, key):
+        """Return value derived from cached files' content or None.
+        """
+        with self._lock:
+            return self._values.get(key)
+
+    def set_value(self, key, value):
+        """Keep value derived from cached files' content (e.g. a checksum).
+
+        Values should only depend on files' content (e.g. keyed by checksums),
+        so they're never stale and aren't evicted.
+        """
+        with self._lock:
+            self._values[key] = value
+            self._save()
+
+    @property
+    def size(self):
+        """Size of cached files in bytes.
+        """
+        sizes = {entry['sha1']: entry['size'] for entry in self._urls.values()}
+        return sum(sizes.values())
+
+    def save(self):
+        """Save access times of files found in the cache since the last download.
+        """
+        with self._lock:
+            self._save()
+
+    def _hit(self, url, entry):
+        self.hits += 1
+        entry['accessed'] = time.time()
+        return CachedFile(self._get_object_path(entry['sha1']), entry['sha1'], False)
+
+    def _download(self, response):
+        hasher = hashlib.sha1()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in response.iter_content(_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+            sha1 = hasher.hexdigest()
+            os.rename(temp_path, self._get_object_path(sha1))
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return sha1, size
+
+    def _evict(self, keep_sha1=None):
+        accessed = {}
+        sizes = {}
+        for entry in self._urls.values():
+            sha1 = entry['sha1']
+            accessed[sha1] = max(accessed.get(sha1, 0), entry['accessed'])
+            sizes[sha1] = entry['size']
+        size = sum(sizes.values())
+        for sha1 in sorted(accessed, key=accessed.get):
+            if size <= self.max_size:
+                break
+            if sha1 == keep_sha1:
+                continue
+            for url in [url for url, entry in self._urls.items() if entry['sha1'] == sha1]:
+                del self._urls[url]
+                self._validated.discard(url)
+            try:
+                os.remove(self._get_object_path(sha1))
+            except OSError:
+                pass
+            size -= sizes[sha1]
+            logger.debug('Evicted %s (%s bytes) from cache', sha1, sizes[sha1])
+
+    def _save(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.json')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(json.dumps({'urls': self._urls, 'values': self._values}).encode('utf-8'))
+        os.rename(temp_path, self._index_path)
+
+    def _get_object_path(self, sha1):
+        return os.path.join(self.path, 'objects', sha1)
+
+
+def get_download_cache(conf, session=None):
+    """Return download cache configured by `DOWNLOAD_CACHE_PATH` or None.
+
+    Args:
+        conf (dict): config dict
+        session (requests.Session): session to download with (optional)
+
+    Returns:
+        DownloadCache/None: cache/if it isn't configured
+
+    """
+    path = conf.get('DOWNLOAD_CACHE_PATH')
+    if not path:
+        return None
+    max_size = conf.get('DOWNLOAD_CACHE_MAX_SIZE', _DEFAULT_MAX_SIZE)
+    return DownloadCache(path, max_size, session=session)
+
+
+# Internal
+
+_CHUNK_SIZE = 64 * 1024
+_DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+
+
+def _ensure_directory(path):
+    try:
+        os.makedirs(path)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise
@@ -4,64 +4,116 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import logging
+import json
 import time
+import hashlib
+import logging
+import collections
 import pbclient
 logger = logging.getLogger(__name__)
 
 
 class PyBossaTasksUpdater(object):
+    """Keep tasks of a PyBossa project in sync with the given tasks' data.
+
+    Tasks are identified by values of `unique_keys` in their info and diffed
+    by a hash of their info, so unchanged tasks are skipped. `run` returns a
+    snapshot of the server's tasks (key to task id and hash) which can be
+    passed to the next run instead of fetching all tasks from the server
+    again, in which case only updated tasks are fetched. Tasks deleted or
+    duplicated on the server after the snapshot was taken aren't noticed
+    until their data changes, so the snapshot should be dropped from time
+    to time. Duplicate tasks on the server (with the same key) are logged
+    and left untouched, only the first one is kept in sync.
+
+    Args:
+        endpoint (str): PyBossa url
+        api_key (str): PyBossa API key
+        project_id (int): PyBossa project id
+
+    """
+
     def __init__(self, endpoint, api_key, project_id):
         pbclient.set('endpoint', endpoint)
         pbclient.set('api_key', api_key)
         self.project_id = project_id
+        self._tasks = {}
 
-    def run(self, tasks_data, unique_keys):
-        add, delete, update = self._filter_tasks(tasks_data, unique_keys)
+    def run(self, tasks_data, unique_keys, snapshot=None):
+        """Add, delete and update tasks on the server to match tasks' data.
 
-        msg = '{} tasks to add, {} tasks to delete, {} tasks to update'
-        logger.debug(msg.format(len(add), len(delete), len(update)))
-
-        for task_data in add:
-            self._add_task(task_data)
+        Args:
+            tasks_data (list): tasks' info dicts
+            unique_keys (list): info keys identifying a task
+            snapshot (dict): snapshot returned by the last run (optional),
+                all tasks are fetched from the server if it's not given
 
-        for task in delete:
-            self._delete_task(task)
+        Returns:
+            dict: snapshot of tasks on the server (JSON serializable)
 
-        for task in update:
-            self._update_task(task)
-
-    def _filter_tasks(self, tasks_data, unique_keys):
-        get_key = lambda value: tuple((key, value[key]) for key in unique_keys) # noqa: E731
-        get_keys = lambda values: [get_key(value) for value in values] # noqa: E731
+        """
+        if snapshot is None:
+            snapshot = self._get_snapshot(unique_keys)
+        else:
+            snapshot = dict(snapshot)
+        add, delete, update = self._filter_tasks(tasks_data, unique_keys, snapshot)
 
-        existing_tasks = self._get_existing_tasks()
-        existing_tasks_info = [task.data['info'] for task in existing_tasks]
-        existing_ids = get_keys(existing_tasks_info)
-        new_ids = get_keys(tasks_data)
+        msg = '{} tasks to add, {} tasks to delete, {} tasks to update'
+        logger.debug(msg.format(len(add), len(delete), len(update)))
 
-        tasks_to_add = [task_data for task_data in tasks_data
-                        if get_key(task_data) not in existing_ids]
-        tasks_to_delete = [existing_tasks[i]
-                           for i, task_info in enumerate(existing_tasks_info)
-                           if get_key(task_info) not in new_ids]
+        for key, task_data in add.items():
+            task = self._add_task(task_data)
+            if task is not None:
+                snapshot[key] = [task.id, _get_hash(task_data)]
 
-        tasks_to_update = []
-        for existing_task in existing_tasks:
-            if existing_task in tasks_to_delete:
-                continue
-            try:
-                index = new_ids.index(get_key(existing_task.data['info']))
-            except ValueError:
-                continue
+        for key in delete:
+            task_id, _ = snapshot.pop(key)
+            self._delete_task(task_id)
 
-            task_data = tasks_data[index]
-            if task_data != existing_task.data['info']:
-                existing_task.data['info'] = task_data
-                tasks_to_update.append(existing_task)
+        for key, task_data in update.items():
+            task = self._get_task(snapshot[key][0])
+            if task is None:
+                # Deleted on the server since the snapshot was taken
+                task = self._add_task(task_data)
+            else:
+                task.data['info'] = task_data
+                self._update_task(task)
+            if task is not None:
+                snapshot[key] = [task.id, _get_hash(task_data)]
+
+        return snapshot
+
+    def _filter_tasks(self, tasks_data, unique_keys, snapshot):
+        tasks_to_add = collections.OrderedDict()
+        tasks_to_update = collections.OrderedDict()
+        keys = set()
+        for task_data in tasks_data:
+            key = _get_key(task_data, unique_keys)
+            keys.add(key)
+            if key not in snapshot:
+                tasks_to_add[key] = task_data
+            elif snapshot[key][1] != _get_hash(task_data):
+                tasks_to_update[key] = task_data
+        tasks_to_delete = [existing_key for existing_key in snapshot
+                           if existing_key not in keys]
 
         return tasks_to_add, tasks_to_delete, tasks_to_update
 
+    def _get_snapshot(self, unique_keys):
+        snapshot = {}
+        for task in self._get_existing_tasks():
+            info = task.data['info']
+            key = _get_key(info, unique_keys)
+            if key in snapshot:
+                # Duplicates may have task runs of volunteers so they're left
+                # alone (and untracked) on the server
+                logger.warning('Ignoring duplicate task {} of task {}'.format(
+                    task.id, snapshot[key][0]))
+                continue
+            snapshot[key] = [task.id, _get_hash(info)]
+            self._tasks[task.id] = task
+        return snapshot
+
     def _get_existing_tasks(self):
         project_id = self.project_id
         tasks = []
@@ -80,15 +132,28 @@ class PyBossaTasksUpdater(object):
         logger.debug('{} tasks on the server'.format(len(tasks)))
         return tasks
 
+    def _get_task(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is None:
+            res = pbclient.find_tasks(self.project_id, id=task_id)
+            if self._wait_if_reached_rate_limit(res):
+                return self._get_task(task_id)
+            if res:
+                task = res[0]
+        return task
+
     def _add_task(self, task_data):
         res = pbclient.create_task(self.project_id, task_data)
         if self._wait_if_reached_rate_limit(res):
-            self._add_task(task_data)
+            return self._add_task(task_data)
+        return res
 
-    def _delete_task(self, task):
-        res = pbclient.delete_task(task.id)
+    def _delete_task(self, task_id):
+        res = pbclient.delete_task(task_id)
+        if isinstance(res, dict) and res.get('status_code') == 404:
+            return
         if self._wait_if_reached_rate_limit(res):
-            self._delete_task(task.id)
+            self._delete_task(task_id)
 
     def _update_task(self, task):
         res = pbclient.update_task(task)
@@ -111,3 +176,13 @@ class PyBossaTasksUpdater(object):
             return True
         except AttributeError:
             pass
+
+
+# Internal
+
+def _get_key(info, unique_keys):
+    return json.dumps([info.get(key) for key in unique_keys])
+
+
+def _get_hash(info):
+    return hashlib.sha1(json.dumps(info, sort_keys=True).encode('utf-8')).hexdigest()
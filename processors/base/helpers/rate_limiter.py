@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+import logging
+import threading
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """Limit rate of calls per key (e.g. per host) across threads.
+
+    Calls of the same key are spaced by `1 / rate` seconds, so threads
+    sharing a limiter never make more than `rate` calls per second per key.
+
+    Example:
+        limiter = RateLimiter(rate=10)
+        limiter.wait('www.documentcloud.org')
+        requests.get(url)
+
+    Args:
+        rate (float): max calls per second per key
+
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_times = {}
+
+    def wait(self, key=None):
+        """Wait until the next call of key is allowed.
+        """
+        with self._lock:
+            now = time.time()
+            call_time = max(now, self._next_times.get(key, now))
+            self._next_times[key] = call_time + 1.0 / self.rate
+        if call_time > now:
+            time.sleep(call_time - now)
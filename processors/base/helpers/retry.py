@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+import random
+import logging
+logger = logging.getLogger(__name__)
+
+
+def get_backoff_delay(attempt, backoff=1, max_backoff=60):
+    """Return seconds to wait before the given retry attempt.
+
+    Delays grow exponentially with "full jitter": a random delay up to
+    `backoff * 2 ** attempt` seconds (capped by `max_backoff`), so clients
+    failing at the same time don't retry at the same time.
+
+    Args:
+        attempt (int): number of the retry (starting from 0)
+        backoff (float): base delay in seconds
+        max_backoff (float): max delay in seconds
+
+    Returns:
+        float: delay in seconds
+
+    """
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def call_with_retry(func, retries=3, backoff=1, max_backoff=60,
+                    exceptions=(Exception,), sleep=time.sleep):
+    """Call function retrying on errors with exponential backoff and jitter.
+
+    Args:
+        func (callable): function to call without arguments
+        retries (int): max number of retries
+        backoff (float): base delay in seconds (see `get_backoff_delay`)
+        max_backoff (float): max delay in seconds
+        exceptions (tuple): exception classes to retry on
+        sleep (callable): function to wait with
+
+    Returns:
+        the function's result (the last error is raised if all retries fail)
+
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except exceptions as exception:
+            if attempt >= retries:
+                raise
+            delay = get_backoff_delay(attempt, backoff=backoff, max_backoff=max_backoff)
+            logger.warning('Retrying in %.1fs (%s of %s) after error: %s',
+                           delay, attempt + 1, retries, repr(exception))
+            sleep(delay)
+            attempt += 1
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import logging
+logger = logging.getLogger(__name__)
+
+SLUG_CACHE_SIZE = 10000
+
+
+class SlugCache(object):
+    """Bounded LRU cache of entity slugs to their ids.
+    """
+
+    def __init__(self, size=SLUG_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._ids = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, slug):
+        """Return cached id for the slug or None.
+        """
+        try:
+            object_id = self._ids.pop(slug)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._ids[slug] = object_id
+        self.hits += 1
+        return object_id
+
+    def set(self, slug, object_id):
+        """Cache id for the slug evicting the least recently used one if full.
+        """
+        self._ids.pop(slug, None)
+        self._ids[slug] = object_id
+        if len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+
+    def remove(self, slug):
+        """Remove slug from the cache if it's cached.
+        """
+        self._ids.pop(slug, None)
+
+    def clear(self):
+        """Remove all slugs from the cache.
+        """
+        self._ids.clear()
+
+
+def get_slug_cache(table):
+    """Return slug cache of the entity table shared by the current process.
+    """
+    cache = _caches.get(table)
+    if cache is None:
+        cache = _caches[table] = SlugCache()
+    return cache
+
+
+def clear_slug_caches(*tables):
+    """Clear slug caches of the given entity tables (of all tables by default).
+
+    It must be called after entities are deleted or a transaction that could
+    create entities is rolled back.
+    """
+    for table, cache in _caches.items():
+        if not tables or table in tables:
+            logger.debug('Clearing slug cache of %s (hits: %s, misses: %s)',
+                         table, cache.hits, cache.misses)
+            cache.clear()
+
+
+# Internal
+
+_caches = {}
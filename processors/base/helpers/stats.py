@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import json
+import time
+
+
+class Stats(object):
+    """Per-stage timers and counters of a processor run.
+
+    Timers are inclusive (e.g. `find_trial` is also counted in `write_trial`)
+    and are summed over parallel workers. When disabled timers and counters
+    do nothing so they can be left in hot paths.
+
+    Args:
+        enabled (bool): collect stats
+
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.batches = []
+        self._batch_started = self.started
+        self._batch_timers = {}
+        self._batch_counters = {}
+
+    def timer(self, stage):
+        """Return context manager timing the stage.
+
+        Example:
+            with stats.timer('write_trial'):
+                writers.write_trial(...)
+
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def count(self, counter, value=1):
+        """Increment the counter (e.g. number of processed records).
+        """
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def end_batch(self, **fields):
+        """Save timers and counters since the previous batch.
+
+        Args:
+            fields (dict): extra batch fields (e.g. table)
+
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        batch = dict(fields, **{
+            'seconds': now - self._batch_started,
+            'timers': _subtract(self.timers, self._batch_timers),
+            'counters': _subtract(self.counters, self._batch_counters),
+        })
+        self.batches.append(batch)
+        self._batch_started = now
+        self._batch_timers = {stage: list(timer) for stage, timer in self.timers.items()}
+        self._batch_counters = dict(self.counters)
+
+    def merge(self, other):
+        """Merge stats collected by other instance (e.g. of another worker).
+        """
+        for stage, (calls, seconds) in other.timers.items():
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+        for counter, value in other.counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        self.batches.extend(other.batches)
+
+    def get_summary(self):
+        """Return summary dict of the run so far.
+        """
+        wall_seconds = time.time() - self.started
+        return {
+            'seconds': wall_seconds,
+            'timers': {stage: {'calls': calls, 'seconds': seconds}
+                       for stage, (calls, seconds) in self.timers.items()},
+            'counters': dict(self.counters),
+        }
+
+    def format_summary(self):
+        """Return summary table of the run so far.
+
+        Stages are ordered by total time, the slowest first.
+        """
+        summary = self.get_summary()
+        wall_seconds = summary['seconds'] or float('nan')
+        lines = ['%-24s %10s %12s %10s %12s %8s' % (
+            'Stage', 'Calls', 'Total (s)', 'Avg (ms)', 'Calls/s', 'Wall %')]
+        timers = sorted(summary['timers'].items(), key=lambda item: -item[1]['seconds'])
+        for stage, timer in timers:
+            calls, seconds = timer['calls'], timer['seconds']
+            lines.append('%-24s %10d %12.3f %10.3f %12.1f %8.1f' % (
+                stage, calls, seconds,
+                seconds / calls * 1000 if calls else 0,
+                calls / seconds if seconds else 0,
+                seconds / wall_seconds * 100))
+        for counter, value in sorted(summary['counters'].items()):
+            lines.append('%-24s %10d %25s %12.1f' % (
+                counter, value, '', value / wall_seconds))
+        lines.append('Wall time: %.3fs' % summary['seconds'])
+        return '\n'.join(lines)
+
+    def write_json_lines(self, path, **fields):
+        """Append batches and the summary as JSON lines to the file.
+
+        Args:
+            path (str): file path
+            fields (dict): extra fields for every line (e.g. processor)
+
+        """
+        with io.open(path, 'a', encoding='utf-8') as file:
+            for batch in self.batches:
+                line = dict(fields, type='batch', **batch)
+                file.write(json.dumps(line, sort_keys=True, ensure_ascii=False) + '\n')
+            line = dict(fields, type='summary', **self.get_summary())
+            file.write(json.dumps(line, sort_keys=True, ensure_ascii=False) + '\n')
+
+
+def get_stats():
+    """Return stats of the current process.
+    """
+    return _stats
+
+
+def reset_stats(enabled=None):
+    """Start collecting new stats of the current process.
+
+    Args:
+        enabled (bool): collect stats (keep the current setting by default)
+
+    Returns:
+        Stats: new stats
+
+    """
+    global _stats
+    if enabled is None:
+        enabled = _stats.enabled
+    _stats = Stats(enabled=enabled)
+    return _stats
+
+
+# Internal
+
+class _Timer(object):
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.time()
+
+    def __exit__(self, *exc_info):
+        timer = self.stats.timers.setdefault(self.stage, [0, 0.0])
+        timer[0] += 1
+        timer[1] += time.time() - self.started
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+_stats = Stats()
+
+
+def _subtract(values, previous_values):
+    result = {}
+    for key, value in values.items():
+        previous_value = previous_values.get(key)
+        if isinstance(value, list):
+            previous_value = previous_value or [0, 0.0]
+            if value[0] != previous_value[0]:
+                result[key] = {'calls': value[0] - previous_value[0],
+                               'seconds': value[1] - previous_value[1]}
+        elif value != (previous_value or 0):
+            result[key] = value - (previous_value or 0)
+    return result
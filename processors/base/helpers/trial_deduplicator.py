@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import logging
+import collections
+from . import union_find
+logger = logging.getLogger(__name__)
+
+
+class TrialDeduplicator(object):
+    """Plan which trial every record should belong to by its identifiers.
+
+    Records sharing identifiers, even transitively, are grouped into one
+    component using `UnionFind`, so the whole plan is computed in a single
+    pass over records instead of comparing records trial by trial.
+
+    Every component is planned to belong to one of its records' trials: the
+    biggest components (by number of identifiers, then records) choose first
+    and take the trial most of their records belong to. Components without a
+    free trial left are planned to get a new trial. From the plan:
+
+    - split records are records of a trial planned for another component
+      (they should be processed again to get the right trial)
+    - merged records are records of a trial planned for no component (they
+      should be moved to the trial planned for their component)
+
+    Args:
+        conn (dict): connection dict to load all records from (optional)
+
+    """
+
+    def __init__(self, conn=None):
+        self._groups = union_find.UnionFind()
+        self._records = collections.OrderedDict()
+        self._plan = None
+        if conn is not None:
+            query = 'SELECT id, trial_id, identifiers, is_primary FROM records'
+            for record in conn['database'].query(query):
+                self.add_record(record['id'], record['trial_id'],
+                                record['identifiers'], record['is_primary'])
+            logger.debug('Grouped identifiers of %s records', len(self._records))
+
+    def add_record(self, record_id, trial_id, identifiers, is_primary=False):
+        """Add record to be planned.
+
+        Args:
+            record_id (str): record id
+            trial_id (str): current trial id
+            identifiers (dict): identifiers dict (nct: <id>, euct: <id>, ...)
+            is_primary (bool): is the record primary
+
+        """
+        record_id = _get_hex(record_id)
+        identifiers = dict(identifiers or {})
+        self._records[record_id] = (_get_hex(trial_id), identifiers, bool(is_primary))
+        self._groups.add(record_id)
+        for item in identifiers.items():
+            self._groups.union(record_id, item)
+        self._plan = None
+
+    def get_plan(self):
+        """Return which trial records of every component should belong to.
+
+        Returns:
+            list: (trial id/None, record ids) tuples, the biggest components
+                first, None if records should get a new trial
+
+        """
+        if self._plan is None:
+            self._plan = []
+            planned_trial_ids = set()
+            for record_ids in self._get_components():
+                trial_id = None
+                for candidate in self._get_candidate_trial_ids(record_ids):
+                    if candidate not in planned_trial_ids:
+                        trial_id = candidate
+                        planned_trial_ids.add(trial_id)
+                        break
+                self._plan.append((trial_id, record_ids))
+        return self._plan
+
+    def get_split_records(self):
+        """Return ids of records which belong to a trial of another component.
+
+        Returns:
+            list: record ids
+
+        """
+        planned_trial_ids = self._get_planned_trial_ids()
+        split_records = []
+        for trial_id, record_ids in self.get_plan():
+            for record_id in record_ids:
+                current_trial_id = self._records[record_id][0]
+                if current_trial_id != trial_id and current_trial_id in planned_trial_ids:
+                    split_records.append(record_id)
+        return split_records
+
+    def get_merged_records(self):
+        """Return records which belong to a trial not planned for any component.
+
+        Returns:
+            dict: record ids to ids of trials they should be moved to
+
+        """
+        planned_trial_ids = self._get_planned_trial_ids()
+        merged_records = collections.OrderedDict()
+        for trial_id, record_ids in self.get_plan():
+            for record_id in record_ids:
+                current_trial_id = self._records[record_id][0]
+                if current_trial_id is not None and current_trial_id not in planned_trial_ids:
+                    merged_records[record_id] = trial_id
+        return merged_records
+
+    def get_trial_identifiers(self):
+        """Return identifiers of records planned for every trial.
+
+        Identifiers of primary records win over other records' identifiers
+        from the same source.
+
+        Returns:
+            dict: trial ids to identifiers dicts
+
+        """
+        trial_identifiers = {}
+        for trial_id, record_ids in self.get_plan():
+            if trial_id is None:
+                continue
+            identifiers = trial_identifiers[trial_id] = {}
+            for record_id in sorted(record_ids, key=lambda id: self._records[id][2]):
+                identifiers.update(self._records[record_id][1])
+        return trial_identifiers
+
+    def _get_components(self):
+        components = []
+        for items in self._groups.groups().values():
+            record_ids = sorted(item for item in items if item in self._records)
+            components.append((len(items) - len(record_ids), len(record_ids), record_ids))
+        components.sort(key=lambda component: (-component[0], -component[1], component[2]))
+        return [component[2] for component in components]
+
+    def _get_candidate_trial_ids(self, record_ids):
+        counts = collections.Counter(
+            self._records[record_id][0] for record_id in record_ids)
+        counts.pop(None, None)
+        return sorted(counts, key=lambda trial_id: (-counts[trial_id], trial_id))
+
+    def _get_planned_trial_ids(self):
+        return set(trial_id for trial_id, _ in self.get_plan() if trial_id is not None)
+
+
+# Internal
+
+def _get_hex(value):
+    if value is None:
+        return None
+    return uuid.UUID(str(value)).hex
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import uuid
+import logging
+logger = logging.getLogger(__name__)
+
+
+class TrialIdentifierIndex(object):
+    """In-memory index of records identifiers to their trials.
+
+    It's loaded once from the `records` table and should be updated with
+    `add_record` every time a record is written, so trials could be looked up
+    by identifiers without querying `records.identifiers` for every record.
+    With `lazy` set records are loaded by identifier the first time it's looked
+    up instead, which is faster when only a few records are written (e.g. on
+    incremental runs).
+
+    Changes made after `begin` are undone by `rollback`, so the index could
+    follow a rolled back record (see `CommitBatch`).
+
+    NOTE: The index isn't shared between processes, so it mustn't be used
+    when other processes write records concurrently.
+
+    Args:
+        conn (dict): connection dict
+        lazy (bool): load records by identifier on lookup
+
+    """
+
+    def __init__(self, conn, lazy=False):
+        self._conn = conn
+        self._lazy = lazy
+        self._records = {}
+        self._index = {}
+        self._loaded = set()
+        self._changes = None
+        if not lazy:
+            query = 'SELECT id, trial_id, identifiers FROM records'
+            for record in conn['database'].query(query):
+                self._add_record(record['id'], record['trial_id'], record['identifiers'])
+            logger.debug('Indexed identifiers of %s records', len(self._records))
+
+    def begin(self):
+        """Start tracking changes to undo them with `rollback`.
+        """
+        self._changes = {}
+
+    def commit(self):
+        """Keep changes made since `begin`.
+        """
+        self._changes = None
+
+    def rollback(self):
+        """Undo changes made since `begin`.
+        """
+        changes, self._changes = self._changes or {}, None
+        for record_id, previous in changes.items():
+            self._remove_record(record_id)
+            if previous is not None:
+                self._add_record(record_id, *previous)
+
+    def add_record(self, record_id, trial_id, identifiers):
+        """Add record to the index or update it if it's already indexed.
+
+        Args:
+            record_id (str): record id
+            trial_id (str): related trial id
+            identifiers (dict): identifiers dict (nct: <id>, euct: <id>, ...)
+
+        """
+        record_id = _get_hex(record_id)
+        self._track_change(record_id)
+        self._add_record(record_id, trial_id, identifiers)
+
+    def remove_record(self, record_id):
+        """Remove record from the index if it's indexed.
+
+        Args:
+            record_id (str): record id
+
+        """
+        record_id = _get_hex(record_id)
+        self._track_change(record_id)
+        self._remove_record(record_id)
+
+    def find_trial_ids(self, identifiers, ignore_record_id=None):
+        """Yield ids of trials related to records matched by identifiers.
+
+        Trial ids are yielded in the same order as `find_trial_by_identifiers`
+        would check them: by identifier and then by record.
+
+        Args:
+            identifiers (dict): identifiers dict (nct: <id>, euct: <id>, ...)
+            ignore_record_id (str): skip record with this id
+
+        Yields:
+            str: trial id
+
+        """
+        if ignore_record_id:
+            ignore_record_id = _get_hex(ignore_record_id)
+        for item in identifiers.items():
+            if self._lazy:
+                self._load_identifier(item)
+            for record_id in list(self._index.get(item, [])):
+                if record_id == ignore_record_id:
+                    continue
+                trial_id = self._records[record_id][0]
+                if trial_id:
+                    yield trial_id
+
+    def _track_change(self, record_id):
+        if self._changes is not None and record_id not in self._changes:
+            self._changes[record_id] = self._records.get(record_id)
+
+    def _add_record(self, record_id, trial_id, identifiers):
+        record_id = _get_hex(record_id)
+        self._remove_record(record_id)
+        self._records[record_id] = (_get_hex(trial_id), dict(identifiers or {}))
+        for item in self._records[record_id][1].items():
+            self._index.setdefault(item, []).append(record_id)
+
+    def _remove_record(self, record_id):
+        _, identifiers = self._records.pop(record_id, (None, {}))
+        for item in identifiers.items():
+            record_ids = self._index[item]
+            record_ids.remove(record_id)
+            if not record_ids:
+                del self._index[item]
+
+    def _load_identifier(self, item):
+        if item in self._loaded:
+            return
+        self._loaded.add(item)
+        query = """
+            SELECT id, trial_id, identifiers FROM records
+            WHERE identifiers @> CAST(:identifiers AS jsonb)
+        """
+        for record in self._conn['database'].query(query, identifiers=json.dumps(dict([item]))):
+            record_id = _get_hex(record['id'])
+            # Records changed since `begin` are already up to date
+            if self._changes is not None and record_id in self._changes:
+                continue
+            self._add_record(record_id, record['trial_id'], record['identifiers'])
+
+
+# Internal
+
+def _get_hex(value):
+    if value is None:
+        return None
+    return uuid.UUID(str(value)).hex
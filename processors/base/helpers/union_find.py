@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+
+class UnionFind(object):
+    """Disjoint sets of hashable items (union by size with path compression).
+
+    It's used to group records sharing identifiers transitively, e.g. records
+    `{nct: A}`, `{nct: A, euctr: B}` and `{euctr: B}` are all in one set.
+    """
+
+    def __init__(self):
+        self._parents = {}
+        self._sizes = {}
+
+    def __contains__(self, item):
+        return item in self._parents
+
+    def __len__(self):
+        return len(self._parents)
+
+    def add(self, item):
+        """Add item as a single item set if it's not added yet.
+        """
+        if item not in self._parents:
+            self._parents[item] = item
+            self._sizes[item] = 1
+
+    def find(self, item):
+        """Return root item of the item's set adding the item if needed.
+        """
+        self.add(item)
+        root = item
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[item] != root:
+            self._parents[item], item = root, self._parents[item]
+        return root
+
+    def union(self, item, other):
+        """Merge sets of the items and return root item of the merged set.
+        """
+        root = self.find(item)
+        other_root = self.find(other)
+        if root == other_root:
+            return root
+        if self._sizes[root] < self._sizes[other_root]:
+            root, other_root = other_root, root
+        self._parents[other_root] = root
+        self._sizes[root] += self._sizes.pop(other_root)
+        return root
+
+    def groups(self):
+        """Return dict of root items to lists of their sets' items.
+        """
+        groups = {}
+        for item in self._parents:
+            groups.setdefault(self.find(item), []).append(item)
+        return groups
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import logging
+logger = logging.getLogger(__name__)
+
+
+class WatermarkTracker(object):
+    """Track `meta_updated` of processed rows to get the next watermark.
+
+    The next watermark is the latest `meta_updated` of processed rows, but it
+    never passes a failed row, so failed rows are processed again next run.
+    It never passes `limit` either, which should be the latest `meta_updated`
+    at the start of the run (see `get_latest_updated`), so rows updated while
+    the run was iterating over the table are processed again next run.
+
+    Args:
+        limit (datetime): the latest possible watermark
+
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.max_updated = None
+        self.min_failed_updated = None
+
+    def add(self, row, failed=False):
+        """Track processed row.
+        """
+        updated = row.get('meta_updated')
+        if updated is None:
+            return
+        if self.max_updated is None or updated > self.max_updated:
+            self.max_updated = updated
+        if failed:
+            if self.min_failed_updated is None or updated < self.min_failed_updated:
+                self.min_failed_updated = updated
+
+    def merge(self, other):
+        """Merge rows tracked by other tracker (e.g. of another worker).
+        """
+        if other.max_updated is not None:
+            self.add({'meta_updated': other.max_updated})
+        if other.min_failed_updated is not None:
+            self.add({'meta_updated': other.min_failed_updated}, failed=True)
+
+    @property
+    def watermark(self):
+        """Next watermark or None if no rows were tracked.
+        """
+        watermark = self.max_updated
+        if watermark is not None and self.limit is not None:
+            watermark = min(watermark, self.limit)
+        if self.min_failed_updated is not None:
+            watermark = min(watermark, self.min_failed_updated - datetime.timedelta(microseconds=1))
+        return watermark
+
+
+def get_latest_updated(conn, table):
+    """Get the latest `meta_updated` of the warehouse table.
+
+    Taken at the start of a run it's the limit of the run's watermark
+    (see `WatermarkTracker`).
+
+    Args:
+        conn (dict): connection dict
+        table (str): warehouse table name
+
+    Returns:
+        datetime/None: the latest `meta_updated`/if the table is empty
+
+    """
+    query = 'SELECT max(meta_updated) AS meta_updated FROM %s' % table
+    for row in conn['warehouse'].query(query):
+        return row['meta_updated']
+    return None
+
+
+def get_watermark(conn, name):
+    """Get `meta_updated` watermark of the last successful run.
+
+    Args:
+        conn (dict): connection dict
+        name (str): watermark name (e.g. warehouse table)
+
+    Returns:
+        datetime/None: watermark/if there was no successful run
+
+    """
+    query = 'SELECT meta_updated FROM processors_watermarks WHERE name = :name'
+    for row in conn['database'].query(query, name=name):
+        return row['meta_updated']
+    return None
+
+
+def set_watermark(conn, name, meta_updated, source_id=None):
+    """Set `meta_updated` watermark of the successful run.
+
+    Args:
+        conn (dict): connection dict
+        name (str): watermark name (e.g. warehouse table)
+        meta_updated (datetime): latest processed `meta_updated`
+        source_id (str): source of the processed rows (see `reset_watermarks`)
+
+    """
+    query = """
+        INSERT INTO processors_watermarks (name, meta_updated, updated_at, source_id)
+        VALUES (:name, :meta_updated, now(), :source_id)
+        ON CONFLICT (name) DO UPDATE
+        SET meta_updated = EXCLUDED.meta_updated, updated_at = EXCLUDED.updated_at,
+            source_id = EXCLUDED.source_id
+    """
+    conn['database'].query(query, name=name, meta_updated=meta_updated, source_id=source_id)
+    logger.debug('Watermark of %s set to %s', name, meta_updated)
+
+
+def reset_watermarks(conn, source_ids=None):
+    """Reset watermarks of the sources, so their next runs process all rows.
+
+    It must be called after records of the sources are removed or moved to
+    other trials (e.g. by `record_remover`), otherwise they wouldn't be
+    written again until their warehouse rows are updated.
+
+    Args:
+        conn (dict): connection dict
+        source_ids (list): source ids (all sources by default)
+
+    """
+    if source_ids is None:
+        conn['database'].query('DELETE FROM processors_watermarks')
+    else:
+        conn['database'].query("""
+            DELETE FROM processors_watermarks
+            WHERE source_id = ANY(CAST(:source_ids AS text[]))
+        """, source_ids=list(source_ids))
+    logger.info('Reset watermarks of %s sources',
+        'all' if source_ids is None else ', '.join(sorted(source_ids)))
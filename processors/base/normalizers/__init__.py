@@ -5,3 +5,4 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from .phase_normalizer import get_normalized_phase
+from .registry import VariationsTable, register_variations_table, get_variations_table
@@ -1,12 +1,14 @@
 import os
-import json
 import logging
+from . import registry
 
 logger = logging.getLogger(__name__)
 
 PHASE_VARIATION_PATH = os.path.join(os.path.dirname(__file__),
                                     'phases_variations.json')
 
+registry.register_variations_table('phase', PHASE_VARIATION_PATH)
+
 
 def get_normalized_phase(phase):
     """ Receives a phase as an input and normalizes it if possible.
@@ -18,11 +20,10 @@ def get_normalized_phase(phase):
         :return:
             phase_suggestions (list): normalized phase suggestions
     """
-    with open(PHASE_VARIATION_PATH) as phase_variation_file:
-        phase_variation_map = json.load(phase_variation_file)
-    phase_suggestions = None
-    if phase in phase_variation_map.keys():
-        phase_suggestions = phase_variation_map[phase]
+    phase_variation_map = registry.get_variations_table('phase')
+    phase_suggestions = phase_variation_map.get(phase)
+    if phase_suggestions is not None:
+        phase_suggestions = list(phase_suggestions)
     else:
         logger.debug('Unable to normalize phase \'%s\'', phase)
         if phase:
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+
+# Module API
+
+class VariationsTable(collections.Mapping):
+    """Immutable mapping of value variations to their normalized values.
+
+    The table is loaded from a JSON object file on first use. List values
+    are stored as tuples so they can't be changed by callers.
+
+    Args:
+        path (str): path to JSON file
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._variations = None
+        self._lock = threading.Lock()
+
+    def __getitem__(self, variation):
+        return self._get_variations()[variation]
+
+    def __iter__(self):
+        return iter(self._get_variations())
+
+    def __len__(self):
+        return len(self._get_variations())
+
+    def _get_variations(self):
+        if self._variations is None:
+            with self._lock:
+                if self._variations is None:
+                    with open(self.path) as variations_file:
+                        variations = json.load(variations_file)
+                    self._variations = {key: _freeze(value)
+                                        for key, value in variations.items()}
+                    logger.debug('Loaded %s variations from %s',
+                                 len(self._variations), self.path)
+        return self._variations
+
+
+def register_variations_table(name, path):
+    """Register variations table to be loaded on first use.
+
+    Registering a table with the same name replaces the previous one.
+
+    Args:
+        name (str): table name (e.g. phase, gender, status)
+        path (str): path to JSON object file mapping variations to normalized values
+
+    """
+    _tables[name] = VariationsTable(path)
+
+
+def get_variations_table(name):
+    """Return registered variations table.
+
+    Args:
+        name (str): table name
+
+    Raises:
+        KeyError: if there is no table registered with this name
+
+    Returns:
+        VariationsTable: variations table
+
+    """
+    return _tables[name]
+
+
+# Internal
+
+_tables = {}
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(value)
+    return value
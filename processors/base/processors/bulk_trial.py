@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import logging
+import datetime
+import collections
+from .. import helpers
+from .. import config
+from .. import writers
+logger = logging.getLogger(__name__)
+
+
+# Module API
+
+def bulk_load_trials(conn, registries, bufsize=None):
+    """Load trial records from warehouse tables to database in bulk.
+
+    It's meant for full rebuilds of all trial registries at once, where
+    `process_trials` would write every record and entity one by one. Records
+    of every table are read twice:
+
+    - trial identifiers are extracted and records sharing identifiers (even
+      transitively) are grouped into trials using `helpers.UnionFind`
+    - records, trials, documents, entities (deduplicated by slug in memory)
+      and relationships are streamed into `bulk_*` staging tables with
+      `COPY` (see `helpers.CopyWriter`)
+
+    Then live tables are merged with staging tables in a single transaction:
+    trials and records are upserted, new entities and documents are inserted
+    and relationships of loaded trials are replaced. The live tables can't
+    be swapped with staging tables as other tables (e.g. `risk_of_biases`,
+    `trials_publications`) refer to them.
+
+    Existing ids are kept: trials keep ids they have through their records
+    and entities and documents are looked up by slug and url. The primary
+    record of a trial is chosen as `writers.write_trial` would choose it: by
+    registry priority, then by table order, later records winning ties.
+    Existing entities aren't updated. If extracting entities or documents of
+    a record fails, only its trial and record are loaded and the record is
+    left to be processed again by the next `process_trials` run.
+
+    Args:
+        conn (dict): connection dict
+        registries (list): (table, extractors) tuples in processing order
+        bufsize (int): number of rows per copy (default from config)
+
+    Returns:
+        (int, int): number of loaded and failed records
+
+    """
+    if bufsize is None:
+        bufsize = config.BULK_LOAD_BUFFER_SIZE
+    stats = helpers.get_stats()
+
+    # Extract and write sources
+    registries = [
+        (table, extractors, writers.write_source(conn, extractors['extract_source'](None)))
+        for table, extractors in registries]
+
+    # Get watermark limits before rows could be updated during the run
+    limits = {table: helpers.get_latest_updated(conn, table)
+              for table, _, _ in registries}
+
+    # Group records into trials
+    with stats.timer('group_records'):
+        records = _group_records(conn, registries)
+    logger.info('Grouped %s records into %s trials',
+        len(records), sum(is_primary for _, is_primary in records.values()))
+
+    # Stage and merge records
+    _create_staging_tables(conn)
+    try:
+        success, failed, trackers = _stage_records(conn, registries, records, bufsize, limits)
+        with stats.timer('merge'):
+            _merge_staging_tables(conn)
+    finally:
+        _drop_staging_tables(conn)
+    logger.info('Loaded %s trial records (%s failed)', success, failed)
+
+    # Update watermarks
+    source_ids = {table: source_id for table, _, source_id in registries}
+    for table, tracker in trackers.items():
+        if tracker.watermark is not None:
+            helpers.set_watermark(conn, table, tracker.watermark, source_id=source_ids[table])
+
+    return success, failed
+
+
+# Internal
+
+_ENTITY_NAMES = ['condition', 'intervention', 'location', 'organisation', 'person']
+
+_ENTITY_FIELDS = {
+    'condition': ['description', 'icdcm_code'],
+    'intervention': ['type', 'description', 'icdpcs_code', 'ndc_code', 'fda_application_id'],
+    'location': ['type'],
+    'organisation': [],
+    'person': [],
+}
+
+_STAGED_TABLES = (
+    ['trials', 'records', 'documents', 'trials_documents'] +
+    ['%ss' % name for name in _ENTITY_NAMES] +
+    ['trials_%ss' % name for name in _ENTITY_NAMES]
+)
+
+# Same as in `writers.write_trial`
+_PRIMARY_SOURCES = ['nct', 'euctr', 'isrctn']
+
+
+def _group_records(conn, registries):
+    groups = helpers.UnionFind()
+    ranks = collections.OrderedDict()
+
+    # Group records by identifiers
+    for position, (table, extractors, source_id) in enumerate(registries):
+        for record in _iter_records(conn, table):
+            try:
+                trial = extractors['extract_trial'](record)
+            except Exception:
+                config.SENTRY.captureException(extra={
+                    'record': record,
+                })
+                continue
+            groups.add(record['meta_id'])
+            for item in trial['identifiers'].items():
+                groups.union(record['meta_id'], item)
+            priority = len(_PRIMARY_SOURCES)
+            if source_id in _PRIMARY_SOURCES:
+                priority = _PRIMARY_SOURCES.index(source_id)
+            ranks[record['meta_id']] = (priority, position)
+
+    # Choose primary records
+    primaries = {}
+    for record_id, rank in ranks.items():
+        root = groups.find(record_id)
+        if root not in primaries or rank <= ranks[primaries[root]]:
+            primaries[root] = record_id
+
+    # Get trial ids (primary records' trials first)
+    existing_trial_ids = {}
+    query = 'SELECT id, trial_id FROM records WHERE trial_id IS NOT NULL'
+    for row in conn['database'].query(query):
+        existing_trial_ids[row['id'].hex] = row['trial_id'].hex
+    trial_ids = {}
+    used_trial_ids = set()
+    for record_id in list(primaries.values()) + list(ranks):
+        root = groups.find(record_id)
+        trial_id = existing_trial_ids.get(record_id)
+        if root not in trial_ids and trial_id and trial_id not in used_trial_ids:
+            trial_ids[root] = trial_id
+            used_trial_ids.add(trial_id)
+    for root in primaries:
+        if root not in trial_ids:
+            trial_ids[root] = uuid.uuid1().hex
+
+    records = {}
+    for record_id in ranks:
+        root = groups.find(record_id)
+        records[record_id] = (trial_ids[root], primaries[root] == record_id)
+    return records
+
+
+def _stage_records(conn, registries, records, bufsize, limits):
+    success = 0
+    failed = 0
+    trackers = {}
+    stats = helpers.get_stats()
+    timestamp = datetime.datetime.utcnow()
+    db = conn['database']
+    copy_writers = {
+        table: helpers.CopyWriter(db, 'bulk_%s' % table, bufsize=bufsize)
+        for table in _STAGED_TABLES}
+    entity_ids = {name: _get_slug_ids(conn, '%ss' % name) for name in _ENTITY_NAMES}
+    document_ids = _get_document_ids(conn)
+    document_category_ids = {}
+    source_urls = set()
+
+    for table, extractors, source_id in registries:
+        tracker = trackers[table] = helpers.WatermarkTracker(limit=limits[table])
+        for record in _iter_records(conn, table):
+
+            # Skip records failed to be grouped
+            if record['meta_id'] not in records:
+                tracker.add(record, failed=True)
+                failed += 1
+                continue
+            trial_id, is_primary = records[record['meta_id']]
+
+            # Extract trial, documents and entities
+            entities = []
+            documents = []
+            with stats.timer('extract'):
+                trial = extractors['extract_trial'](record)
+                try:
+                    if extractors.get('extract_documents'):
+                        doc_category = extractors['extract_document_category'](record)
+                        documents = list(extractors['extract_documents'](record))
+                    if is_primary:
+                        for entity_name in _ENTITY_NAMES:
+                            for entity in extractors['extract_%ss' % entity_name](record):
+                                entities.append((entity_name, entity))
+                except Exception:
+                    config.SENTRY.captureException(extra={
+                        'record': record,
+                    })
+                    tracker.add(record, failed=True)
+                    failed += 1
+                    entities = []
+                    documents = []
+                else:
+                    tracker.add(record)
+                    success += 1
+
+            with stats.timer('stage'):
+
+                # Stage trial
+                if is_primary:
+                    copy_writers['trials'].write(dict(
+                        writers.get_trial_data(trial, source_id),
+                        id=trial_id, created_at=timestamp, updated_at=timestamp))
+
+                # Stage record
+                if record['meta_source'] in source_urls:
+                    logger.warning('Record - %s wasn\'t loaded because its "source_url" '
+                        'is already loaded: %s', trial['identifiers'], record['meta_source'])
+                elif not helpers.validate_remote_url(record['meta_source']):
+                    logger.warning('Record - %s wasn\'t loaded because its "source_url" '
+                        'is invalid: %s', trial['identifiers'], record['meta_source'])
+                else:
+                    source_urls.add(record['meta_source'])
+                    copy_writers['records'].write(dict(
+                        writers.get_record_data(record, source_id, trial_id, trial, is_primary),
+                        id=record['meta_id'], created_at=record['meta_created']))
+
+                # Stage documents
+                for document in documents:
+                    category_id = document_category_ids.get(doc_category['id'])
+                    if category_id is None:
+                        category_id = writers.write_document_category(conn, doc_category)
+                        document_category_ids[doc_category['id']] = category_id
+                    document_id = _stage_document(copy_writers, document_ids,
+                                                  document, source_id, category_id)
+                    if document_id is not None:
+                        copy_writers['trials_documents'].write({
+                            'trial_id': trial_id,
+                            'document_id': document_id,
+                        })
+
+                # Stage entities and relationships
+                relationships = collections.OrderedDict()
+                for entity_name, entity in entities:
+                    entity_id = _stage_entity(copy_writers, entity_ids, entity_name,
+                                              entity, source_id, timestamp)
+                    if entity_id is None:
+                        continue
+                    relationship = {
+                        'trial_id': trial_id,
+                        '%s_id' % entity_name: entity_id,
+                        'role': entity.get('trial_role'),
+                    }
+                    relationships[(entity_name, entity_id)] = relationship
+                for (entity_name, _), relationship in relationships.items():
+                    copy_writers['trials_%ss' % entity_name].write(relationship)
+
+            if not (success + failed) % 10000:
+                logger.info('Staged %s trial records', success + failed)
+
+    with stats.timer('stage'):
+        for copy_writer in copy_writers.values():
+            copy_writer.flush()
+
+    return success, failed, trackers
+
+
+def _stage_entity(copy_writers, entity_ids, entity_name, entity, source_id, timestamp):
+
+    # Get name
+    if entity_name == 'location':
+        name = helpers.get_canonical_location_name(entity['name'])
+    else:
+        name = helpers.clean_string(entity['name'])
+    if len(name) <= 1:
+        return None
+
+    # Get slug/find entity
+    if entity_name == 'person':
+        slug = helpers.slugify_string(
+            '{name}_{trial_id}'.format(name=name, trial_id=entity['trial_id']))
+    else:
+        slug = helpers.slugify_string(name)
+    entity_id = entity_ids[entity_name].get(slug)
+
+    # Stage new entity
+    if entity_id is None:
+        entity_id = entity_ids[entity_name][slug] = uuid.uuid1().hex
+        data = {
+            'id': entity_id,
+            'created_at': timestamp,
+            'updated_at': timestamp,
+            'source_id': source_id,
+            'slug': slug,
+            'name': name,
+        }
+        for field in _ENTITY_FIELDS[entity_name]:
+            data[field] = entity.get(field)
+        copy_writers['%ss' % entity_name].write(data)
+
+    return entity_id
+
+
+def _stage_document(copy_writers, document_ids, document, source_id, category_id):
+
+    # Validate document
+    source_url = document.get('source_url')
+    if source_url is not None and not helpers.validate_remote_url(source_url):
+        logger.warning('Document %s wasn\'t loaded because its "source_url" '
+            'is invalid: %s', document['name'][0:50], source_url)
+        return None
+
+    # Find document
+    key = (category_id, document.get('file_id') or source_url)
+    document_id = document_ids.get(key)
+
+    # Stage new document
+    if document_id is None:
+        document_id = document_ids[key] = document.get('id', uuid.uuid1().hex)
+        copy_writers['documents'].write({
+            'id': document_id,
+            'source_id': source_id,
+            'document_category_id': category_id,
+            'name': document['name'],
+            'fda_approval_id': document.get('fda_approval_id'),
+            'file_id': document.get('file_id'),
+            'source_url': source_url,
+        })
+
+    return document_id
+
+
+def _merge_staging_tables(conn):
+    db = conn['database']
+    for table in _STAGED_TABLES:
+        db.query('ANALYZE bulk_%s' % table)
+    db.begin()
+    try:
+
+        # Insert new entities and documents
+        for table in ['%ss' % name for name in _ENTITY_NAMES] + ['documents']:
+            db.query('INSERT INTO {table} SELECT * FROM bulk_{table} '
+                     'ON CONFLICT DO NOTHING'.format(table=table))
+
+        # Remove live records with source urls of loaded records (e.g. of rows
+        # collected again with a new `meta_id`), they would violate
+        # `records_source_url_unique`
+        rows = list(db.query("""
+            DELETE FROM records USING bulk_records
+            WHERE records.source_url = bulk_records.source_url
+                AND records.id != bulk_records.id
+            RETURNING records.id
+        """))
+        if rows:
+            logger.info('Removed %s records with source urls of loaded records', len(rows))
+
+        # Upsert trials and records
+        for table in ['trials', 'records']:
+            db.query('INSERT INTO {table} SELECT * FROM bulk_{table} '
+                     'ON CONFLICT (id) DO UPDATE SET {updates}'.format(
+                         table=table, updates=', '.join(
+                             '"{column}" = EXCLUDED."{column}"'.format(column=column)
+                             for column in db[table].columns
+                             if column not in ['id', 'created_at'])))
+
+        # Unset primary records of loaded trials not loaded as primary
+        db.query("""
+            UPDATE records SET is_primary = false
+            WHERE is_primary
+                AND trial_id IN (SELECT id FROM bulk_trials)
+                AND id NOT IN (SELECT id FROM bulk_records WHERE is_primary)
+        """)
+
+        # Replace relationships of loaded trials
+        for entity_name in _ENTITY_NAMES:
+            db.query('DELETE FROM trials_{entity}s WHERE trial_id IN (SELECT id FROM bulk_trials); '
+                     'INSERT INTO trials_{entity}s SELECT * FROM bulk_trials_{entity}s '
+                     'ON CONFLICT DO NOTHING'.format(entity=entity_name))
+        db.query('INSERT INTO trials_documents SELECT DISTINCT * FROM bulk_trials_documents '
+                 'ON CONFLICT DO NOTHING')
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _create_staging_tables(conn):
+    for table in _STAGED_TABLES:
+        conn['database'].query(
+            'DROP TABLE IF EXISTS bulk_{table}; '
+            'CREATE UNLOGGED TABLE bulk_{table} (LIKE {table} INCLUDING DEFAULTS)'.format(table=table))
+
+
+def _drop_staging_tables(conn):
+    for table in _STAGED_TABLES:
+        conn['database'].query('DROP TABLE IF EXISTS bulk_%s' % table)
+
+
+def _iter_records(conn, table):
+    return helpers.iter_rows(conn, 'warehouse', table, orderby='meta_id',
+                             bufsize=1000, server_side=True)
+
+
+def _get_slug_ids(conn, table):
+    query = 'SELECT id, slug FROM %s WHERE slug IS NOT NULL' % table
+    return {row['slug']: row['id'].hex for row in conn['database'].query(query)}
+
+
+def _get_document_ids(conn):
+    query = 'SELECT id, document_category_id, file_id, source_url FROM documents'
+    document_ids = {}
+    for row in conn['database'].query(query):
+        key = (row['document_category_id'], row['file_id'].hex if row['file_id'] else row['source_url'])
+        document_ids[key] = row['id'].hex
+    return document_ids
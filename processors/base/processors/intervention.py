@@ -13,38 +13,70 @@ logger = logging.getLogger(__name__)
 
 # Module API
 
-def process_interventions(conn, table, extractors):
+def process_interventions(conn, table, extractors, full=False, commit_batch_size=None):
     """Translate intervention records from warehouse to database.
 
     Args:
         conn (dict): connection dict
         table (str): table name
         extractors (dict): extractors dict
+        full (bool): process all records ignoring the last run watermark
+        commit_batch_size (int): number of records per transaction (default from config)
 
     """
+    if commit_batch_size is None:
+        commit_batch_size = config.PROCESS_COMMIT_BATCH_SIZE
 
     # Extract and write source
     source = extractors['extract_source'](None)
     source_id = writers.write_source(conn, source)
 
+    # Get watermark
+    updated_since = None
+    if not full:
+        updated_since = helpers.get_watermark(conn, table)
+
     success = 0
-    for record in helpers.iter_rows(conn, 'warehouse', table, orderby='meta_id'):
+    tracker = helpers.WatermarkTracker(limit=helpers.get_latest_updated(conn, table))
+    stats = helpers.get_stats()
+    batch = helpers.CommitBatch(conn['database'], size=commit_batch_size)
+    for record in helpers.iter_rows(conn, 'warehouse', table, orderby='meta_id',
+                                    keyset=True, updated_since=updated_since):
 
-        conn['database'].begin()
+        batch.begin()
 
         try:
 
             # Extract and write intervention
-            interventions = extractors['extract_interventions'](record)
-            for intervention in interventions:
-                writers.write_intervention(conn, intervention, source_id)
+            with stats.timer('extract'):
+                interventions = extractors['extract_interventions'](record)
+            with stats.timer('write_intervention'):
+                for intervention in interventions:
+                    writers.write_intervention(conn, intervention, source_id)
 
         except Exception:
-            config.SENTRY.captureException()
-            conn['database'].rollback()
+            config.SENTRY.captureException(extra={
+                'record': record,
+            })
+            batch.rollback()
+            helpers.clear_slug_caches()
+            tracker.add(record, failed=True)
+            stats.count('failed')
         else:
+            tracker.add(record)
             success += 1
-            conn['database'].commit()
+            with stats.timer('commit'):
+                batch.commit()
+            stats.count('processed')
             if not success % 100:
                 logger.info('Processed %s interventions from %s',
                     success, table)
+                stats.end_batch(table=table)
+
+    with stats.timer('commit'):
+        batch.flush()
+    stats.end_batch(table=table)
+
+    # Update watermark
+    if tracker.watermark is not None:
+        helpers.set_watermark(conn, table, tracker.watermark, source_id=source_id)
@@ -5,6 +5,9 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+import multiprocessing
+import dataset
+import sqlalchemy.exc
 from .. import helpers
 from .. import config
 from .. import writers
@@ -13,122 +16,233 @@ logger = logging.getLogger(__name__)
 
 # Module API
 
-def process_trials(conn, table, extractors):
+def process_trials(conn, table, extractors, workers=None, full=False,
+                   commit_batch_size=None):
     """Translate trial records from warehouse to database.
 
+    With more than one worker the warehouse table is split into shards by
+    `meta_id` hash and every shard is processed in its own process using its
+    own connections. With a single worker trials are looked up in an
+    in-memory identifier index instead of querying records (loaded lazily
+    when only updated records are processed).
+
+    Unless `full` is set only records updated since the last run are
+    processed (see `helpers.get_watermark`). Records updated during the run
+    are processed again by the next run (see `helpers.WatermarkTracker`).
+
+    With a single worker records are committed every `commit_batch_size`
+    records (see `helpers.CommitBatch`). Shards always commit every record,
+    otherwise they would hold locks on shared entities for a whole batch.
+
     Args:
         conn (dict): connection dict
         table (str): table name
         extractors (dict): extractors dict
+        workers (int): number of parallel workers (default from config)
+        full (bool): process all records ignoring the last run watermark
+        commit_batch_size (int): number of records per transaction (default from config)
 
     """
+    if workers is None:
+        workers = config.PROCESS_TRIALS_WORKERS
+    if commit_batch_size is None:
+        commit_batch_size = config.PROCESS_COMMIT_BATCH_SIZE
 
     # Extract and write source
     source = extractors['extract_source'](None)
     source_id = writers.write_source(conn, source)
 
+    # Get watermark
+    updated_since = None
+    if not full:
+        updated_since = helpers.get_watermark(conn, table)
+        logger.info('Processing trials from %s updated since %s',
+            table, updated_since)
+    updated_until = helpers.get_latest_updated(conn, table)
+
+    # Process records
+    if workers > 1:
+        urls = {name: conn[name].url for name in ['database', 'warehouse']}
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_process_trials_shard, [
+                (urls, table, extractors, source_id, (index, workers), updated_since)
+                for index in range(workers)
+            ])
+        finally:
+            pool.close()
+            pool.join()
+        for result in results:
+            helpers.get_stats().merge(result[3])
+    else:
+        results = [_process_trials_rows(conn, table, extractors, source_id,
+                                        updated_since=updated_since,
+                                        commit_batch_size=commit_batch_size)]
+
+    # Merge results
+    success = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    tracker = helpers.WatermarkTracker(limit=updated_until)
+    for result in results:
+        tracker.merge(result[2])
+    logger.info('Processed %s trials from %s (%s failed)',
+        success, table, failed)
+
+    # Update watermark
+    if tracker.watermark is not None:
+        helpers.set_watermark(conn, table, tracker.watermark, source_id=source_id)
+
+
+# Internal
+
+def _process_trials_shard(args):
+    urls, table, extractors, source_id, shard, updated_since = args
+    conn = {name: dataset.connect(url) for name, url in urls.items()}
+    stats = helpers.reset_stats()
+    try:
+        result = _process_trials_rows(conn, table, extractors, source_id,
+                                      shard=shard, updated_since=updated_since)
+        return result + (stats,)
+    finally:
+        for db in conn.values():
+            db.engine.dispose()
+
+
+def _process_trials_rows(conn, table, extractors, source_id, shard=None,
+                         updated_since=None, commit_batch_size=1):
     success = 0
-    for record in helpers.iter_rows(conn, 'warehouse', table, orderby='meta_id'):
-
-        conn['database'].begin()
+    failed = 0
+    tracker = helpers.WatermarkTracker()
+    stats = helpers.get_stats()
+    batch = helpers.CommitBatch(conn['database'], size=commit_batch_size)
+    index = None
+    if shard is None:
+        with stats.timer('build_index'):
+            index = helpers.TrialIdentifierIndex(conn, lazy=updated_since is not None)
+    for record in helpers.iter_rows(conn, 'warehouse', table, orderby='meta_id',
+                                    keyset=True, shard=shard, updated_since=updated_since):
+
+        batch.begin()
+        if index is not None:
+            index.begin()
 
         try:
-
-            # Extract and write trial
-            trial = extractors['extract_trial'](record)
-            trial_id, is_primary = writers.write_trial(conn, trial, source_id, record['meta_id'])
-            if trial_id is None:
-                continue
-
-            # Set current primary record to false
-            if is_primary:
-                current_primary = conn['database']['records'].find_one(trial_id=trial_id,
-                                                                       is_primary=True)
-                if current_primary:
-                    current_primary['is_primary'] = False
-                    conn['database']['records'].update(current_primary, ['id'])
-
-            # Write record
-            writers.write_record(conn, record, source_id, trial_id, trial, is_primary)
-
-            # Extract and write documents
-            extract_documents = extractors.get('extract_documents')
-            if extract_documents:
-
-                # Extract and write document category
-                doc_category = extractors.get('extract_document_category')(record)
-                doc_category_id = writers.write_document_category(conn, doc_category)
-                for document in extract_documents(record):
-                    document.update({
-                        'trial_id': trial_id,
-                        'source_id': source_id,
-                        'document_category_id': doc_category_id,
-                    })
-                    writers.write_document(conn, document)
-
-            # Write other entities
-            if is_primary:
-
-                # Delete existent relationships
-                conn['database']['trials_conditions'].delete(trial_id=trial_id)
-                conn['database']['trials_interventions'].delete(trial_id=trial_id)
-                conn['database']['trials_locations'].delete(trial_id=trial_id)
-                conn['database']['trials_organisations'].delete(trial_id=trial_id)
-                conn['database']['trials_persons'].delete(trial_id=trial_id)
-
-                # Extract and write conditions/relationships
-                conditions = extractors['extract_conditions'](record)
-                for condition in conditions:
-                    condition_id = writers.write_condition(conn, condition, source_id)
-                    if condition_id is None:
-                        continue
-                    writers.write_trial_relationship(
-                        conn, 'condition', condition, condition_id, trial_id)
-
-                # Extract and write interventions/relationships
-                interventions = extractors['extract_interventions'](record)
-                for intervention in interventions:
-                    int_id = writers.write_intervention(conn, intervention, source_id)
-                    if int_id is None:
-                        continue
-                    writers.write_trial_relationship(
-                        conn, 'intervention', intervention, int_id, trial_id)
-
-                # Extract and write locations/relationships
-                locations = extractors['extract_locations'](record)
-                for location in locations:
-                    location_id = writers.write_location(conn, location, source_id)
-                    if location_id is None:
-                        continue
-                    writers.write_trial_relationship(
-                        conn, 'location', location, location_id, trial_id)
-
-                # Extract and write organisations/relationships
-                organisations = extractors['extract_organisations'](record)
-                for organisation in organisations:
-                    org_id = writers.write_organisation(conn, organisation, source_id)
-                    if org_id is None:
-                        continue
-                    writers.write_trial_relationship(
-                        conn, 'organisation', organisation, org_id, trial_id)
-
-                # Extract and write persons/relationships
-                persons = extractors['extract_persons'](record)
-                for person in persons:
-                    person_id = writers.write_person(conn, person, source_id)
-                    if person_id is None:
-                        continue
-                    writers.write_trial_relationship(
-                        conn, 'person', person, person_id, trial_id)
-
+            try:
+                _process_trial(conn, record, extractors, source_id, index=index,
+                               lock=shard is not None)
+            except sqlalchemy.exc.IntegrityError:
+                if shard is None:
+                    raise
+                # Another shard has just created a shared entity (e.g. a
+                # condition with the same slug) so retry to pick it up
+                batch.rollback()
+                helpers.clear_slug_caches()
+                batch.begin()
+                _process_trial(conn, record, extractors, source_id, lock=True)
         except Exception:
-            conn['database'].rollback()
+            batch.rollback()
+            if index is not None:
+                index.rollback()
+            helpers.clear_slug_caches()
             config.SENTRY.captureException(extra={
                 'record': record,
             })
+            tracker.add(record, failed=True)
+            failed += 1
+            stats.count('failed')
         else:
+            tracker.add(record)
             success += 1
-            conn['database'].commit()
+            if index is not None:
+                index.commit()
+            with stats.timer('commit'):
+                batch.commit()
+            stats.count('processed')
             if not success % 100:
                 logger.info('Processed %s trials from %s',
                     success, table)
+                stats.end_batch(table=table, shard=shard)
+
+    with stats.timer('commit'):
+        batch.flush()
+    stats.end_batch(table=table, shard=shard)
+
+    return success, failed, tracker
+
+
+def _process_trial(conn, record, extractors, source_id, index=None, lock=False):
+    stats = helpers.get_stats()
+
+    # Extract and write trial
+    with stats.timer('extract'):
+        trial = extractors['extract_trial'](record)
+    if lock:
+        # Concurrent shards may write records of the same trial
+        with stats.timer('lock_identifiers'):
+            helpers.lock_identifiers(conn, trial['identifiers'])
+    with stats.timer('write_trial'):
+        trial_id, is_primary = writers.write_trial(conn, trial, source_id, record['meta_id'],
+                                                   index=index)
+    if trial_id is None:
+        return
+
+    with stats.timer('write_record'):
+
+        # Set current primary record to false
+        if is_primary:
+            current_primary = conn['database']['records'].find_one(trial_id=trial_id,
+                                                           is_primary=True)
+            if current_primary:
+                current_primary['is_primary'] = False
+                conn['database']['records'].update(current_primary, ['id'])
+
+        # Write record
+        writers.write_record(conn, record, source_id, trial_id, trial, is_primary,
+                             index=index)
+
+    # Extract and write documents
+    extract_documents = extractors.get('extract_documents')
+    if extract_documents:
+
+        # Extract and write document category
+        with stats.timer('extract'):
+            doc_category = extractors.get('extract_document_category')(record)
+            documents = list(extract_documents(record))
+        with stats.timer('write_documents'):
+            doc_category_id = writers.write_document_category(conn, doc_category)
+            for document in documents:
+                document.update({
+                    'trial_id': trial_id,
+                    'source_id': source_id,
+                    'document_category_id': doc_category_id,
+                })
+                writers.write_document(conn, document)
+
+    # Write other entities
+    if is_primary:
+
+        # Delete existent relationships
+        with stats.timer('delete_relationships'):
+            writers.delete_trial_relationships(conn, [
+                'condition', 'intervention', 'location', 'organisation', 'person',
+            ], trial_id)
+
+        # Extract and write entities/relationships
+        for entity_name, write_entity in [
+            ('condition', writers.write_condition),
+            ('intervention', writers.write_intervention),
+            ('location', writers.write_location),
+            ('organisation', writers.write_organisation),
+            ('person', writers.write_person),
+        ]:
+            relationships = []
+            with stats.timer('extract'):
+                entities = extractors['extract_%ss' % entity_name](record)
+            with stats.timer('write_%s' % entity_name):
+                for entity in entities:
+                    entity_id = write_entity(conn, entity, source_id)
+                    if entity_id is None:
+                        continue
+                    relationships.append((entity, entity_id, trial_id))
+            with stats.timer('write_relationships'):
+                writers.write_trial_relationships(conn, entity_name, relationships)
@@ -10,10 +10,10 @@ from .organisation import write_organisation
 from .person import write_person
 from .condition import write_condition
 from .publication import write_publication
-from .record import write_record
+from .record import write_record, get_record_data
 from .source import write_source
-from .trial import write_trial
-from .trial_relationship import write_trial_relationship
+from .trial import write_trial, get_trial_data
+from .trial_relationship import write_trial_relationship, write_trial_relationships, delete_trial_relationships
 from .document import write_document
 from .file import write_file
 from .fda_application import write_fda_application
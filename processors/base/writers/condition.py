@@ -39,7 +39,7 @@ def write_condition(conn, condition, source_id, trial_id=None):
 
     # Get slug/find object
     slug = helpers.slugify_string(name)
-    object = conn['database']['conditions'].find_one(slug=slug)
+    object = helpers.find_by_slug(conn, 'conditions', slug)
 
     # Create object
     if not object:
@@ -64,6 +64,8 @@ def write_condition(conn, condition, source_id, trial_id=None):
 
         # Write object
         conn['database']['conditions'].upsert(object, ['id'], ensure=False)
+        if create:
+            helpers.get_slug_cache('conditions').set(slug, object['id'])
 
         # Log debug
         logger.debug('Condition - %s: %s',
@@ -38,7 +38,7 @@ def write_intervention(conn, intervention, source_id):
 
     # Get slug/find object
     slug = helpers.slugify_string(name)
-    obj = conn['database']['interventions'].find_one(slug=slug)
+    obj = helpers.find_by_slug(conn, 'interventions', slug)
 
     # Create object
     if not obj:
@@ -66,6 +66,8 @@ def write_intervention(conn, intervention, source_id):
 
         # Write object
         conn['database']['interventions'].upsert(obj, ['id'], ensure=False)
+        if create:
+            helpers.get_slug_cache('interventions').set(slug, obj['id'])
 
         # Log debug
         logger.debug('Intervention - %s: %s',
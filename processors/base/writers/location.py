@@ -39,7 +39,7 @@ def write_location(conn, location, source_id, trial_id=None):
 
     # Get slug/find object
     slug = helpers.slugify_string(name)
-    object = conn['database']['locations'].find_one(slug=slug)
+    object = helpers.find_by_slug(conn, 'locations', slug)
 
     # Create object
     if not object:
@@ -63,6 +63,8 @@ def write_location(conn, location, source_id, trial_id=None):
 
         # Write object
         conn['database']['locations'].upsert(object, ['id'], ensure=False)
+        if create:
+            helpers.get_slug_cache('locations').set(slug, object['id'])
 
         # Log debug
         logger.debug('Location - %s: %s',
@@ -39,7 +39,7 @@ def write_organisation(conn, organisation, source_id, trial_id=None):
 
     # Get slug/read object
     slug = helpers.slugify_string(name)
-    object = conn['database']['organisations'].find_one(slug=slug)
+    object = helpers.find_by_slug(conn, 'organisations', slug)
 
     # Create object
     if not object:
@@ -62,6 +62,8 @@ def write_organisation(conn, organisation, source_id, trial_id=None):
 
         # Write object
         conn['database']['organisations'].upsert(object, ['id'], ensure=False)
+        if create:
+            helpers.get_slug_cache('organisations').set(slug, object['id'])
 
         # Log debug
         logger.debug('Organisation - %s: %s',
@@ -40,7 +40,7 @@ def write_person(conn, person, source_id, trial_id=None):
     # Get slug/read object
     slug = helpers.slugify_string(
         '{name}_{trial_id}'.format(name=name, trial_id=person['trial_id']))
-    object = conn['database']['persons'].find_one(slug=slug)
+    object = helpers.find_by_slug(conn, 'persons', slug)
 
     # Create object
     if not object:
@@ -63,6 +63,8 @@ def write_person(conn, person, source_id, trial_id=None):
 
         # Write object
         conn['database']['persons'].upsert(object, ['id'], ensure=False)
+        if create:
+            helpers.get_slug_cache('persons').set(slug, object['id'])
 
         # Log debug
         logger.debug('Person - %s: %s',
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 
 # Module API
 
-def write_record(conn, record, source_id, trial_id, trial, is_primary):
+def write_record(conn, record, source_id, trial_id, trial, is_primary, index=None):
     """Write record to database.
 
     Args:
@@ -21,6 +21,7 @@ def write_record(conn, record, source_id, trial_id, trial, is_primary):
         trial_id (uuid): related trial_id
         trial (dict): related trial data
         is_primary (bool): is the record primary
+        index (TrialIdentifierIndex): identifier index to keep up to date
 
     Raises:
         KeyError: if data structure is not valid
@@ -43,7 +44,49 @@ def write_record(conn, record, source_id, trial_id, trial, is_primary):
         create = True
 
     # Update obj
-    obj.update({
+    obj.update(get_record_data(record, source_id, trial_id, trial, is_primary))
+
+    # Validate object
+    if not helpers.validate_remote_url(obj['source_url']):
+        logger.warning(
+            'Record - %s wasn\'t %s because its "%s" field is invalid: %s',
+            trial['identifiers'],
+            'created' if create else 'updated',
+            'source_url',
+            obj['source_url']
+        )
+        return None
+
+    # Write object
+    conn['database']['records'].upsert(obj, ['id'], ensure=False)
+    if index is not None:
+        index.add_record(obj['id'], trial_id, trial['identifiers'])
+
+    # Log debug
+    logger.debug('Record - %s: %s',
+        'created' if create else 'updated', trial['identifiers'])
+
+    return obj['id']
+
+
+def get_record_data(record, source_id, trial_id, trial, is_primary):
+    """Get record fields to write from raw record and normalized trial data.
+
+    Args:
+        record (dict): raw collected data
+        source_id (str): related source id
+        trial_id (uuid): related trial_id
+        trial (dict): related trial data
+        is_primary (bool): is the record primary
+
+    Raises:
+        KeyError: if data structure is not valid
+
+    Returns:
+        dict: record fields (without `id` and `created_at`)
+
+    """
+    return {
         'updated_at': record['meta_updated'],
         'trial_id': trial_id,
         'source_id': source_id,
@@ -71,24 +114,4 @@ def write_record(conn, record, source_id, trial_id, trial, is_primary):
         'has_published_results': trial.get('has_published_results'),
         'results_exemption_date': trial.get('results_exemption_date'),
         'is_primary': is_primary,
-    })
-
-    # Validate object
-    if not helpers.validate_remote_url(obj['source_url']):
-        logger.warning(
-            'Record - %s wasn\'t %s because its "%s" field is invalid: %s',
-            trial['identifiers'],
-            'created' if create else 'updated',
-            'source_url',
-            obj['source_url']
-        )
-        return None
-
-    # Write object
-    conn['database']['records'].upsert(obj, ['id'], ensure=False)
-
-    # Log debug
-    logger.debug('Record - %s: %s',
-        'created' if create else 'updated', trial['identifiers'])
-
-    return obj['id']
+    }
@@ -13,12 +13,13 @@ logger = logging.getLogger(__name__)
 
 # Module API
 
-def write_trial(conn, trial, source_id, record_id):
+def write_trial(conn, trial, source_id, record_id, index=None):
     """Write trial to database.
 
     Args:
         conn (dict): connection dict
         trial (dict): normilized trial data
+        index (TrialIdentifierIndex): identifier index to find trial with
 
     Raises:
         KeyError: if data structure is not valid
@@ -31,10 +32,12 @@ def write_trial(conn, trial, source_id, record_id):
     timestamp = datetime.datetime.utcnow()
 
     # Get trial object (first try to ignore source record for better dedup)
-    object = helpers.find_trial_by_identifiers(conn, trial['identifiers'],
-        ignore_record_id=record_id)
-    if not object:
-        object = helpers.find_trial_by_identifiers(conn, trial['identifiers'])
+    with helpers.get_stats().timer('find_trial'):
+        object = helpers.find_trial_by_identifiers(conn, trial['identifiers'],
+            ignore_record_id=record_id, index=index)
+        if not object:
+            object = helpers.find_trial_by_identifiers(conn, trial['identifiers'],
+                index=index)
 
     # Create object
     if not object:
@@ -77,30 +80,7 @@ def write_trial(conn, trial, source_id, record_id):
     if is_primary:
 
         # Update object
-        object.update({
-            'source_id': source_id,
-            # ---
-            'identifiers': trial['identifiers'],
-            'registration_date': trial.get('registration_date', None),
-            'completion_date': trial.get('completion_date', None),
-            'public_title': trial['public_title'],
-            'brief_summary': trial.get('brief_summary', None),
-            'scientific_title': trial.get('scientific_title', None),
-            'description': trial.get('description', None),
-            'status': trial.get('status'),
-            'recruitment_status': trial.get('recruitment_status', None),
-            'eligibility_criteria': trial.get('eligibility_criteria', None),
-            'target_sample_size': trial.get('target_sample_size', None),
-            'first_enrollment_date': trial.get('first_enrollment_date', None),
-            'study_type': trial.get('study_type', None),
-            'study_design': trial.get('study_design', None),
-            'study_phase': trial.get('study_phase', None),
-            'primary_outcomes': trial.get('primary_outcomes', None),
-            'secondary_outcomes': trial.get('primary_outcomes', None),
-            'gender': trial.get('gender', None),
-            'has_published_results': trial.get('has_published_results', None),
-            'results_exemption_date': trial.get('results_exemption_date'),
-        })
+        object.update(get_trial_data(trial, source_id))
 
     # Write object
     conn['database']['trials'].upsert(object, ['id'], ensure=False)
@@ -110,3 +90,43 @@ def write_trial(conn, trial, source_id, record_id):
         'created' if create else 'updated', trial['identifiers'])
 
     return object['id'], is_primary
+
+
+def get_trial_data(trial, source_id):
+    """Get trial fields to write from normalized trial data.
+
+    Args:
+        trial (dict): normalized trial data
+        source_id (str): related source id
+
+    Raises:
+        KeyError: if data structure is not valid
+
+    Returns:
+        dict: trial fields
+
+    """
+    return {
+        'source_id': source_id,
+        # ---
+        'identifiers': trial['identifiers'],
+        'registration_date': trial.get('registration_date', None),
+        'completion_date': trial.get('completion_date', None),
+        'public_title': trial['public_title'],
+        'brief_summary': trial.get('brief_summary', None),
+        'scientific_title': trial.get('scientific_title', None),
+        'description': trial.get('description', None),
+        'status': trial.get('status'),
+        'recruitment_status': trial.get('recruitment_status', None),
+        'eligibility_criteria': trial.get('eligibility_criteria', None),
+        'target_sample_size': trial.get('target_sample_size', None),
+        'first_enrollment_date': trial.get('first_enrollment_date', None),
+        'study_type': trial.get('study_type', None),
+        'study_design': trial.get('study_design', None),
+        'study_phase': trial.get('study_phase', None),
+        'primary_outcomes': trial.get('primary_outcomes', None),
+        'secondary_outcomes': trial.get('primary_outcomes', None),
+        'gender': trial.get('gender', None),
+        'has_published_results': trial.get('has_published_results', None),
+        'results_exemption_date': trial.get('results_exemption_date'),
+    }
@@ -4,22 +4,85 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import uuid
+import collections
+from sqlalchemy.dialects import postgresql
+
 
 # Module API
 
 def write_trial_relationship(conn, entity_name, entity_data, entity_id, trial_id):
     """Write trial relathionship to database.
     """
-    data = {}
-    entity_id_field = '%s_id' % entity_name
+    table, keys = _get_table_and_keys(entity_name)
+    data = _get_data(entity_name, entity_data, entity_id, trial_id)
+    conn['database'][table].upsert(data, keys, ensure=False)
+
+
+def write_trial_relationships(conn, entity_name, relationships):
+    """Write trial relathionships to database using a single statement.
+
+    Args:
+        conn (dict): connection dict
+        entity_name (str): related entity name (e.g. condition)
+        relationships (list): (entity_data, entity_id, trial_id) tuples,
+            could be related to several trials
+
+    """
+    table, keys = _get_table_and_keys(entity_name)
+
+    # The same row can't be affected twice by a statement, so the last
+    # relationship wins as it would with one upsert per relationship
+    rows = collections.OrderedDict()
+    for entity_data, entity_id, trial_id in relationships:
+        data = _get_data(entity_name, entity_data, entity_id, trial_id)
+        rows[tuple(uuid.UUID(str(data[key])).hex for key in keys)] = data
+    if not rows:
+        return
+
+    statement = postgresql.insert(conn['database'][table].table)
+    statement = statement.values(list(rows.values()))
+    if entity_name in _ENTITIES_WITH_ROLE:
+        statement = statement.on_conflict_do_update(
+            index_elements=keys, set_={'role': statement.excluded.role})
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=keys)
+    conn['database'].query(statement)
+
+
+def delete_trial_relationships(conn, entity_names, trial_id):
+    """Delete trial relationships with given entities using a single query.
+
+    Args:
+        conn (dict): connection dict
+        entity_names (list): related entity names (e.g. condition)
+        trial_id (str): trial id
+
+    """
+    query = ' '.join(
+        'DELETE FROM %s WHERE trial_id = :trial_id;' % _get_table_and_keys(name)[0]
+        for name in entity_names)
+    conn['database'].query(query, trial_id=trial_id)
+
+
+# Internal
+
+_ENTITIES_WITH_ROLE = ['location', 'organisation', 'person']
+
+
+def _get_table_and_keys(entity_name):
     table = 'trials_%ss' % entity_name
-    keys = ['trial_id', entity_id_field]
+    keys = ['trial_id', '%s_id' % entity_name]
+    return table, keys
+
+
+def _get_data(entity_name, entity_data, entity_id, trial_id):
     data = {
         'trial_id': trial_id,
-        entity_id_field: entity_id,
+        '%s_id' % entity_name: entity_id,
     }
-    if entity_name in ['location', 'organisation', 'person']:
+    if entity_name in _ENTITIES_WITH_ROLE:
         data.update({
             'role': entity_data.get('trial_role', None),
         })
-    conn['database'][table].upsert(data, keys, ensure=False)
+    return data
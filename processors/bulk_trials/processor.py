@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from importlib import import_module
+from .. import base
+
+
+# Module API
+
+def process(conf, conn, *tables):
+    """Rebuild trials of all (or given) registries using `bulk_load_trials`.
+
+    Tables are processed in the given order, by default registries
+    preferred as primary sources of trials go first.
+    """
+    registries = []
+    for table in tables or _TABLES:
+        extractors_module = import_module('processors.%s.extractors' % table)
+        extractors = base.helpers.get_variables(
+            extractors_module, lambda x: x.startswith('extract_'))
+        registries.append((table, extractors))
+    base.processors.bulk_load_trials(conn, registries)
+
+
+# Internal
+
+_TABLES = [
+    'nct', 'euctr', 'isrctn', 'actrn', 'jprn', 'ictrp', 'gsk', 'pfizer', 'takeda',
+]
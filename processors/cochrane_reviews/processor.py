@@ -18,6 +18,7 @@ logger = logging.getLogger(__name__)
 def process(conf, conn):
     studies = conn['warehouse']['cochrane_reviews'].distinct('study_id')
     study_ids = [study['study_id'] for study in studies]
+    index = base.helpers.TrialIdentifierIndex(conn)
 
     for study_id in study_ids:
         try:
@@ -32,7 +33,8 @@ def process(conf, conn):
                     identifiers = extract_ref_identifiers(reference)
                     matching_trials = []
                     for id_name, id_value in identifiers.items():
-                        found_trials = match_by_identifier(conn, id_name, id_value)
+                        found_trials = match_by_identifier(conn, id_name, id_value,
+                                                           index=index)
                         matching_trials.extend(found_trials)
 
                     if len(matching_trials) == 0:
@@ -55,13 +57,13 @@ def process(conf, conn):
             })
 
 
-def match_by_identifier(conn, id_name, id_value):
+def match_by_identifier(conn, id_name, id_value, index=None):
     """Choose method of identification based on identifier"""
 
     if id_name == 'pubmed_id':
         matched_trials = match_by_pubmed_id(conn, id_value)
     elif id_name == 'nct_id':
-        matched_trials = match_by_nct_id(conn, id_value)
+        matched_trials = match_by_nct_id(conn, id_value, index=index)
     else:
         raise NotImplementedError("Don't know how to match by '{0}'".format(id_name))
 
@@ -103,11 +105,11 @@ def match_by_pubmed_id(conn, pubmed_id):
     return trial_ids
 
 
-def match_by_nct_id(conn, nct_id):
+def match_by_nct_id(conn, nct_id, index=None):
     """Find correspondent trial based on nct_id"""
 
     query_criteria = {'nct': 'NCT' + nct_id}
-    trial = base.helpers.find_trial_by_identifiers(conn, query_criteria)
+    trial = base.helpers.find_trial_by_identifiers(conn, query_criteria, index=index)
     if trial:
         return [trial['id']]
     else:
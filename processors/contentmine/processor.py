@@ -4,45 +4,93 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
+import sys
+import gzip
 import json
 import logging
+import itertools
 from .. import base
 logger = logging.getLogger(__name__)
 
 
 # Module API
 
-def process(conf, conn):
+def process(conf, conn, path=None):
+    """Export trials and their records' terms for ContentMine.
+
+    Trials are streamed ordered by id and written one by one, so memory
+    doesn't grow with the database. Output is a JSON array printed to stdout
+    or written to `path`: as JSON Lines (one trial per line) if it ends
+    with `.jsonl` and gzipped if it ends with `.gz` (e.g. `trials.jsonl.gz`).
+
+    Args:
+        conf (dict): config dict
+        conn (dict): connection dict
+        path (str): output file path (optional)
+
+    """
 
     # Prepare
-    trials = {}
-    offset = 0
-    bufsize = 10000
     query = """
         SELECT t.id, t.public_title, t.brief_summary, r.primary_id, r.scientific_title
         FROM trials as t
         JOIN records as r ON r.trial_id = t.id
-        ORDER BY trial_id LIMIT %s OFFSET %s
+        ORDER BY t.id
     """
+    rows = base.helpers.iter_query_rows(conn, 'database', query, bufsize=_BUFFER_SIZE)
+    trials = (_get_trial(trial_rows)
+              for _, trial_rows in itertools.groupby(rows, key=lambda row: row['id']))
 
     # Excecute
-    while True:
-        rows = list(conn['database'].query(query % (bufsize, offset)))
-        if not rows:
-            break
-        for row in rows:
-            id = row['id'].hex
-            trial = trials.setdefault(id, {})
-            trial['internal_id'] = id
-            trial['title'] = row['public_title']
-            # trial['description'] = row['brief_summary']
-            terms = trial.setdefault('terms', set())
-            terms.add(row['primary_id'])
-            scientific_title = (row['scientific_title'] or '').strip()
-            if scientific_title not in ['', 'null']:
-                terms.add(scientific_title)
-        offset += bufsize
-        logger.info('Translated %s trial records' % offset)
-
-    # Print
-    print(json.dumps(trials.values(), cls=base.helpers.JSONEncoder, indent=4))
+    if path is None:
+        count = _write_trials(trials, _get_stdout(), json_lines=False)
+    else:
+        base_path = path[:-len('.gz')] if path.endswith('.gz') else path
+        opener = gzip.open if path.endswith('.gz') else io.open
+        with opener(path, 'wb') as file:
+            count = _write_trials(trials, file, json_lines=base_path.endswith('.jsonl'))
+    logger.info('Exported %s trials', count)
+
+
+# Internal
+
+_BUFFER_SIZE = 10000
+
+
+def _get_trial(rows):
+    trial = {}
+    terms = []
+    for row in rows:
+        trial['internal_id'] = row['id'].hex
+        trial['title'] = row['public_title']
+        # trial['description'] = row['brief_summary']
+        scientific_title = (row['scientific_title'] or '').strip()
+        for term in [row['primary_id'], scientific_title]:
+            if term not in ['', 'null'] and term not in terms:
+                terms.append(term)
+    trial['terms'] = terms
+    return trial
+
+
+def _write_trials(trials, file, json_lines=False):
+    count = 0
+    if not json_lines:
+        file.write(b'[')
+    for trial in trials:
+        if json_lines:
+            line = json.dumps(trial, cls=base.helpers.JSONEncoder) + '\n'
+        else:
+            line = (',\n' if count else '\n') + json.dumps(
+                trial, cls=base.helpers.JSONEncoder, indent=4)
+        file.write(line.encode('utf-8'))
+        count += 1
+        if not count % _BUFFER_SIZE:
+            logger.info('Exported %s trials', count)
+    if not json_lines:
+        file.write(b'\n]\n')
+    return count
+
+
+def _get_stdout():
+    return getattr(sys.stdout, 'buffer', sys.stdout)
@@ -35,6 +35,9 @@ def process(conf, conn):
         aws_access_key_id=conf['AWS_ACCESS_KEY_ID'],
         aws_secret_access_key=conf['AWS_SECRET_ACCESS_KEY'])
 
+    # Archives are only downloaded again if they've changed
+    cache = base.helpers.get_download_cache(conf)
+
     # Iterate contributions mapping
     for contrib_id, mappings in conf['CONTRIB'].items():
         try:
@@ -47,7 +50,7 @@ def process(conf, conn):
 
             # Get contribution and download documents
             contrib = conn['explorerdb']['data_contributions'].find_one(id=contrib_id)
-            _download_documents(contrib['data_url'], dirpath)
+            _download_documents(contrib['data_url'], dirpath, cache=cache)
 
             # Process downloaded documents
             for filename in os.listdir(dirpath):
@@ -86,8 +89,10 @@ def process(conf, conn):
                     create = False
                     document_id = document['id']
 
-                # Upload document to S3
-                resource.Bucket(bucket).upload_file(filepath, key)
+                # Upload document to S3 (its key is its checksum so
+                # documents already written are already uploaded)
+                if create:
+                    resource.Bucket(bucket).upload_file(filepath, key)
 
                 # Write document to database
                 table.upsert({
@@ -111,24 +116,33 @@ def process(conf, conn):
         except Exception:
             base.config.SENTRY.captureException()
 
+    if cache is not None:
+        cache.save()
+
 # Internal
 
 
-def _download_documents(url, dirpath):
+def _download_documents(url, dirpath, cache=None):
     """Download documents to dirpath and extract if needed.
     """
-    content = requests.get(url).content
+    if cache is not None:
+        source = cache.fetch(url).path
+    else:
+        source = io.BytesIO(requests.get(url).content)
     # Archive of documents
     if url.lower().endswith('.zip'):
-        arch = zipfile.ZipFile(io.BytesIO(content))
+        arch = zipfile.ZipFile(source)
         for name in arch.namelist():
             arch.extract(name, dirpath)
     # Just single document
     else:
-        filename = os.path.basepath(url)
+        filename = os.path.basename(url)
         filepath = os.path.join(dirpath, filename)
-        with open(filepath, 'wb') as file:
-            file.write(content)
+        if cache is not None:
+            shutil.copyfile(source, filepath)
+        else:
+            with open(filepath, 'wb') as file:
+                file.write(source.getvalue())
 
 
 def _extract_metadata(filename, mappings):
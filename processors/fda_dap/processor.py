@@ -4,12 +4,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
+import uuid
 import hashlib
 import logging
+import tempfile
 import requests
-import StringIO
+import requests.adapters
+import concurrent.futures
 import PyPDF2
 import boto3
+import boto3.s3.transfer
 from .. import base
 logger = logging.getLogger(__name__)
 
@@ -21,13 +26,16 @@ def process(conf, conn):
     assert source_id is not None
 
     processor = FDADAPProcessor(conf, conn)
-    for record in base.helpers.iter_rows(conn, 'warehouse', 'fda_dap', orderby='id'):
-        try:
-            processor.process_record(record, source_id)
-        except Exception:
-            base.config.SENTRY.captureException(extra={
-                'meta_id': record['meta_id'],
-            })
+    try:
+        for record in base.helpers.iter_rows(conn, 'warehouse', 'fda_dap', orderby='id'):
+            try:
+                processor.process_record(record, source_id)
+            except Exception:
+                base.config.SENTRY.captureException(extra={
+                    'meta_id': record['meta_id'],
+                })
+    finally:
+        processor.close()
 
 
 def _create_source(conn):
@@ -41,9 +49,36 @@ def _create_source(conn):
 
 
 class FDADAPProcessor(object):
+    """Write FDA approvals and their documents merged into PDFs on S3.
+
+    PDFs of a document are downloaded concurrently by a bounded thread pool
+    (`FDA_DAP_DOWNLOAD_WORKERS`) sharing a pooled HTTP session, and merged
+    PDFs are uploaded by a single S3 client. Call `close` when done.
+
+    With `DOWNLOAD_CACHE_PATH` set PDFs are cached between runs, and
+    documents whose PDFs haven't changed since they were merged and uploaded
+    are skipped without downloading, merging or uploading them again.
+    """
+
     def __init__(self, conf, conn):
         self._conf = conf
         self._conn = conn
+        workers = conf.get('FDA_DAP_DOWNLOAD_WORKERS', base.config.FDA_DAP_DOWNLOAD_WORKERS)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._s3_client = None
+        self._cache = base.helpers.get_download_cache(conf, session=self._session)
+
+    def close(self):
+        """Stop download threads and close HTTP connections.
+        """
+        self._executor.shutdown()
+        self._session.close()
+        if self._cache is not None:
+            self._cache.save()
 
     def process_record(self, record, source_id):
         fda_approval = self._write_fda_approval(record)
@@ -68,11 +103,27 @@ class FDADAPProcessor(object):
         file_data = {}
         file_modified = False
 
-        # Merge PDFs and upload to S3 if we haven't done it already
+        # Skip PDFs which haven't changed since they were merged and uploaded
         urls = document['urls']
+        merged_key = None
+        if self._cache is not None:
+            cached_files = list(self._executor.map(self._cache.fetch, urls))
+            merged_key = 'fda_dap:%s' % ','.join(cached_file.sha1 for cached_file in cached_files)
+            merged_sha1 = self._cache.get_value(merged_key)
+            if merged_sha1 is not None:
+                existing_file = self._conn['database']['files'].find_one(sha1=merged_sha1)
+                if existing_file and existing_file['source_url']:
+                    logging.debug('Merged PDF is up to date: %s' % existing_file['source_url'])
+                    return uuid.UUID(existing_file['id']).hex
+
+        # Merge PDFs and upload to S3 if we haven't done it already
         logging.debug('Downloading PDFs from %s' % ', '.join(urls))
-        with DownloadAndMergePDFs(urls) as pdf_file:
-            sha1 = self._calculate_sha1(pdf_file)
+        merger = DownloadAndMergePDFs(urls, session=self._session,
+                                      executor=self._executor, cache=self._cache)
+        with merger as pdf_file:
+            sha1 = merger.sha1
+            if merged_key is not None:
+                self._cache.set_value(merged_key, sha1)
 
             existing_file = self._conn['database']['files'].find_one(sha1=sha1)
             if existing_file:
@@ -143,12 +194,14 @@ class FDADAPProcessor(object):
         return self._conn['database']['fda_approvals'].find_one(id=fda_approval_id)
 
     def _upload_to_s3(self, fd, checksum):
-        s3 = boto3.resource(
-            's3',
-            region_name=self._conf['AWS_S3_REGION'],
-            aws_access_key_id=self._conf['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=self._conf['AWS_SECRET_ACCESS_KEY']
-        )
+        if self._s3_client is None:
+            self._s3_client = boto3.client(
+                's3',
+                region_name=self._conf['AWS_S3_REGION'],
+                aws_access_key_id=self._conf['AWS_ACCESS_KEY_ID'],
+                aws_secret_access_key=self._conf['AWS_SECRET_ACCESS_KEY']
+            )
+        s3 = self._s3_client
         bucket_name = self._conf['AWS_S3_BUCKET']
         key = 'documents/fda/%s.pdf' % checksum
 
@@ -160,40 +213,127 @@ class FDADAPProcessor(object):
             ])
         else:
             url = '/'.join([
-                s3.meta.client.meta.endpoint_url,
+                s3.meta.endpoint_url,
                 bucket_name,
                 key,
             ])
 
-        s3.Bucket(bucket_name).upload_fileobj(fd, key)
+        # Big files are uploaded in parts concurrently
+        s3.upload_fileobj(fd, bucket_name, key, Config=_S3_TRANSFER_CONFIG)
 
         return url
 
-    def _calculate_sha1(self, fd):
-        BLOCKSIZE = 65536
-        hasher = hashlib.sha1()
-        for chunk in iter(lambda: fd.read(BLOCKSIZE), b''):
-            hasher.update(chunk)
-        fd.seek(0)
-        return hasher.hexdigest()
-
 
 class DownloadAndMergePDFs(object):
-    def __init__(self, urls):
+    """Download PDFs concurrently and merge them into a temporary file.
+
+    Downloads are streamed into temporary files kept in memory only while
+    they're small, and the merged PDF is SHA-1 hashed while it's written
+    (see `sha1`), so memory doesn't grow with the PDFs' size.
+
+    Example:
+        merger = DownloadAndMergePDFs(urls)
+        with merger as pdf_file:
+            upload(pdf_file, merger.sha1)
+
+    Args:
+        urls (list): PDF urls in the order to merge them
+        session (requests.Session): session to download with (optional)
+        executor (concurrent.futures.Executor): executor to download with (optional)
+        cache (DownloadCache): cache to get PDFs from (optional)
+
+    """
+
+    def __init__(self, urls, session=None, executor=None, cache=None):
         self._urls = urls
+        self._session = session or requests
+        self._executor = executor
+        self._cache = cache
         self._merger = PyPDF2.PdfFileMerger(strict=False)
+        self._files = []
+        self.sha1 = None
 
     def __enter__(self):
-        pdfs = [requests.get(url) for url in self._urls]
-
-        for pdf in pdfs:
-            self._merger.append(StringIO.StringIO(pdf.content))
-
-        output = StringIO.StringIO()
-        self._merger.write(output)
-        output.seek(0)
+        try:
+            for pdf in self._download_all():
+                self._merger.append(pdf)
+
+            output = self._spool()
+            writer = _HashingWriter(output)
+            self._merger.write(writer)
+            self.sha1 = writer.hexdigest()
+            output.seek(0)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
 
         return output
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         self._merger.close()
+        for file in self._files:
+            file.close()
+
+    def _download_all(self):
+        if self._executor is None:
+            for url in self._urls:
+                self._files.append(self._download(url))
+            return list(self._files)
+        downloads = [self._executor.submit(self._download, url) for url in self._urls]
+        concurrent.futures.wait(downloads)
+        # Keep downloaded files to close them even if other downloads failed
+        for download in downloads:
+            if download.exception() is None:
+                self._files.append(download.result())
+        for download in downloads:
+            if download.exception() is not None:
+                raise download.exception()
+        return list(self._files)
+
+    def _download(self, url):
+        if self._cache is not None:
+            return io.open(self._cache.fetch(url).path, 'rb')
+        response = self._session.get(url, stream=True)
+        try:
+            response.raise_for_status()
+            pdf = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                pdf.write(chunk)
+        finally:
+            response.close()
+        pdf.seek(0)
+        return pdf
+
+    def _spool(self):
+        output = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+        self._files.append(output)
+        return output
+
+
+# Internal
+
+_CHUNK_SIZE = 64 * 1024
+_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+_S3_TRANSFER_CONFIG = boto3.s3.transfer.TransferConfig(
+    multipart_threshold=_SPOOL_MAX_SIZE,
+    multipart_chunksize=_SPOOL_MAX_SIZE,
+)
+
+
+class _HashingWriter(object):
+    """Write to file object computing SHA-1 of everything written.
+    """
+
+    def __init__(self, fd):
+        self._fd = fd
+        self._hasher = hashlib.sha1()
+
+    def write(self, data):
+        self._hasher.update(data)
+        self._fd.write(data)
+
+    def tell(self):
+        return self._fd.tell()
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
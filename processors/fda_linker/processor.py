@@ -11,6 +11,7 @@ logger = logging.getLogger(__name__)
 
 def process(conf, conn):
     count = 0
+    index = base.helpers.TrialIdentifierIndex(conn)
     for document in base.helpers.iter_rows(conn, 'database', 'documents',
                                            orderby='id', source_id='fda'):
         try:
@@ -33,7 +34,7 @@ def process(conf, conn):
 
                 # Get trial
                 trial = base.helpers.find_trial_by_identifiers(
-                    conn, identifiers=identifiers)
+                    conn, identifiers=identifiers, index=index)
 
                 if trial:
                     base.writers.write_trial_relationship(
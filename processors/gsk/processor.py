@@ -13,4 +13,5 @@ from . import extractors as extractors_module
 def process(conf, conn):
     extractors = base.helpers.get_variables(
         extractors_module, lambda x: x.startswith('extract_'))
-    base.processors.process_trials(conn, 'gsk', extractors)
+    base.processors.process_trials(conn, 'gsk', extractors,
+                                   full=conf['PROCESS_FULL'])
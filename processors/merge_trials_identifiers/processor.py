@@ -14,41 +14,53 @@ logger = logging.getLogger(__name__)
 
 def process(conf, conn):
     """Merge trial identifiers
-    """
 
-    # Prepare
-    query = """
-        WITH records_identifiers AS (
-            SELECT trial_id, ids.key, ids.value
-            FROM records, jsonb_each(identifiers) AS ids
-        ), merged_identifiers AS (
-            SELECT trials.id,
-                trials.identifiers AS trial_identifiers,
-                json_object_agg(key, value)::jsonb AS records_identifiers
-            FROM records_identifiers
-            INNER JOIN trials ON records_identifiers.trial_id = trials.id
-            GROUP BY trials.id
-        )
-        SELECT *
-        FROM merged_identifiers
-        WHERE trial_identifiers != records_identifiers
+    Records are grouped by shared identifiers (see `TrialDeduplicator`).
+    Records of trials duplicating another trial are moved to it (trials left
+    without records are removed by `trial_remover`) and identifiers of every
+    trial are merged with identifiers of its records. Watermarks of sources
+    of moved records are reset, so the next runs write them again.
     """
+    deduplicator = base.helpers.TrialDeduplicator(conn)
+
+    # Move records of duplicate trials
+    merged_records = {}
+    moved_source_ids = set()
+    for record_id, trial_id in deduplicator.get_merged_records().items():
+        merged_records.setdefault(trial_id, []).append(record_id)
+    for trial_id, record_ids in merged_records.items():
+        rows = conn['database'].query("""
+            UPDATE records SET trial_id = :trial_id, is_primary = false
+            WHERE id = ANY(CAST(:record_ids AS uuid[]))
+            RETURNING source_id
+        """, trial_id=trial_id, record_ids=record_ids)
+        moved_source_ids.update(row['source_id'] for row in rows)
+        logger.info('Moved %s records to trial %s', len(record_ids), trial_id)
+    if moved_source_ids:
+        base.helpers.reset_watermarks(conn, moved_source_ids)
+
+    # Get trials identifiers
+    query = 'SELECT id, identifiers FROM trials'
+    trials_identifiers = {row['id'].hex: row['identifiers']
+                          for row in conn['database'].query(query)}
 
     # Execute
     count = 0
     failed = 0
 
-    for result in conn['database'].query(query):
+    for trial_id, records_identifiers in deduplicator.get_trial_identifiers().items():
         try:
-            trial_identifiers = result['trial_identifiers']
+            trial_identifiers = trials_identifiers.get(trial_id)
+            if trial_identifiers is None:
+                continue
             identifiers = dict(trial_identifiers.items() +
-                               result['records_identifiers'].items())
+                               records_identifiers.items())
 
             if sorted(identifiers.items()) == sorted(trial_identifiers.items()):
                 continue
 
             trial = {
-                'id': result['id'].hex,
+                'id': trial_id,
                 'identifiers': identifiers,
                 'updated_at': datetime.datetime.utcnow(),
             }
@@ -59,7 +71,7 @@ def process(conf, conn):
 
         except Exception:
             base.config.SENTRY.captureException(extra={
-                'identifiers': result['trial_identifiers'],
+                'identifiers': trials_identifiers.get(trial_id),
             })
             failed += 1
 
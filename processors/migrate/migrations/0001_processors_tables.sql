@@ -0,0 +1,13 @@
+-- Tables owned by processors to keep state between runs
+
+CREATE TABLE IF NOT EXISTS processors_watermarks (
+    name text PRIMARY KEY,
+    meta_updated timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS processors_checkpoints (
+    name text PRIMARY KEY,
+    value text NOT NULL,
+    updated_at timestamp with time zone NOT NULL
+);
@@ -0,0 +1,4 @@
+-- Source of the records processed from the watermarked table, so watermarks
+-- can be reset when the source's records are removed
+
+ALTER TABLE processors_watermarks ADD COLUMN source_id text;
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import glob
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Module API
+
+def process(conf, conn):
+    """Apply migrations of tables owned by processors (e.g. `processors_watermarks`).
+
+    The API `database` schema is managed by the API, but processors keep
+    their state between runs in their own tables. Migrations are SQL files
+    in `migrations` applied in name order, every one in its own transaction
+    and only once (applied migrations are kept in `processors_migrations`).
+    It must be run before other processors on deploy.
+    """
+    db = conn['database']
+    db.query("""
+        CREATE TABLE IF NOT EXISTS processors_migrations (
+            name text PRIMARY KEY,
+            migrated_at timestamp with time zone NOT NULL
+        )
+    """)
+    applied = set(row['name'] for row in db.query('SELECT name FROM processors_migrations'))
+
+    count = 0
+    for path in sorted(glob.glob(os.path.join(_MIGRATIONS_PATH, '*.sql'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in applied:
+            continue
+        with io.open(path, encoding='utf-8') as file:
+            sql = file.read()
+        db.begin()
+        try:
+            db.executable.execute(sql)
+            db.query("""
+                INSERT INTO processors_migrations (name, migrated_at) VALUES (:name, now())
+            """, name=name)
+        except Exception:
+            db.rollback()
+            raise
+        else:
+            db.commit()
+        logger.info('Applied migration %s', name)
+        count += 1
+
+    logger.info('Applied %s migrations', count)
+
+
+# Internal
+
+_MIGRATIONS_PATH = os.path.join(os.path.dirname(__file__), 'migrations')
@@ -5,10 +5,11 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import json
-import time
+import Queue
 import logging
 import requests
 import datetime
+import threading
 from .. import base
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,13 @@ logger = logging.getLogger(__name__)
 # Module API
 
 def process(conf, conn):
+    """Export trials to OSF in batches ordered by trial id.
+
+    The next batch is read from the database while the previous one is being
+    posted. Failed posts are retried with exponential backoff and the id of
+    the last exported trial is saved as a checkpoint, so an interrupted
+    export continues from it on the next run (use `--full` to start over).
+    """
 
     # Log started
     logger.info('Started trials export')
@@ -23,97 +31,138 @@ def process(conf, conn):
     # Export trials
     # http://jamdb.readthedocs.io/en/latest/index.html
     count = 0
-    limit = 100
-    token_ttl_seconds = 30*60  # api has limit 60*60 seconds
-    token_issued_time = datetime.datetime.now()
-    session = requests.Session()
-    for trials in _read_trial_groups(conn, limit=limit):
-
-        # Get trial ids for logging errors
-        trial_ids = [trial['id'] for trial in trials]
-
-        try:
-
-            # Ensure authenticated
-            if (datetime.datetime.now() - token_issued_time).seconds > token_ttl_seconds:
-                del session.headers['Authorization']
-            if 'Authorization' not in session.headers:
-                url = '%s/auth' % conf['OSF_URL']
-                res = session.post(url, json={
-                  'data': {
-                    'type': 'users',
-                    'attributes': {
-                      'provider': 'osf',
-                      'access_token': conf['OSF_KEY'],
-                    }
-                  }
+    exporter = _TrialsExporter(conf)
+    after_id = None
+    if not conf.get('PROCESS_FULL'):
+        after_id = base.helpers.get_checkpoint(conn, _CHECKPOINT)
+        if after_id is not None:
+            logger.info('Continuing trials export after trial %s', after_id)
+    trial_groups = _iter_prefetched(_read_trial_groups(conn, limit=_LIMIT, after_id=after_id))
+    try:
+        for trials in trial_groups:
+            try:
+                base.helpers.call_with_retry(
+                    lambda: exporter.export(trials),
+                    retries=_RETRIES, backoff=_BACKOFF, max_backoff=_MAX_BACKOFF)
+            except Exception:
+                base.config.SENTRY.captureException(extra={
+                    'trial_ids': [trial['id'] for trial in trials],
                 })
-                # Check status
-                # 200 - ok
-                if res.status_code not in [200]:
-                    raise RuntimeError('Can\'t authenticate')
-                token = res.json()['data']['attributes']['token']
-                token_issued_time = datetime.datetime.now()
-                session.headers.update({'Authorization': token})
-                logger.info('Successfully authenticated')
-
-            # Ensure collection exists
-            url = '%s/namespaces/%s/collections'
-            url = url % (conf['OSF_URL'], conf['OSF_NAMESPACE'])
-            res = session.post(url, json={
-                'data': {
-                    'id': 'trials',
-                    'type': 'collections',
-                    'attributes': {},
-                }
-            })
-            # Check status
-            # 201 - created
-            # 409 - conflict (already exists)
-            if res.status_code == 201:
-                logger.info('Created collection "trials"')
-            elif res.status_code not in [409]:
-                raise RuntimeError('Can\'t create "trials" collection')
-
-            # Export trials
-            # We use bulk post
-            # https://github.com/CenterForOpenScience/jamdb/blob/master/features/document/create.feature#L244
-            url = '%s/namespaces/%s/collections/trials/documents'
-            url = url % (conf['OSF_URL'], conf['OSF_NAMESPACE'])
-            data = []
-            for trial in trials:
-                data.append({
-                    'id': trial['id'],
-                    'type': 'documents',
-                    'attributes': json.loads(json.dumps(
-                        trial, cls=base.helpers.JSONEncoder)),
-                })
-            res = session.post(url, json={'data': data}, headers={
-                'Content-Type': 'application/vnd.api+json; ext="bulk"',
-            })
-            # Check status
-            # 201 - created
-            # 409 - conflict (already exists)
-            if res.status_code not in [201, 409]:
-                raise RuntimeError('Can\'t create "trial" documents: %s/%s', res.json(), trial_ids)
+                logger.warning('Stopped trials export after %s trials, '
+                               'it will continue from the failed trials next run', count)
+                return
+            base.helpers.set_checkpoint(conn, _CHECKPOINT, trials[-1]['id'])
             count += len(trials)
             logger.info('Exported %s trials', count)
-
-        except Exception:
-            base.config.SENTRY.captureException()
-            time.sleep(5*60)
-            continue
+    finally:
+        trial_groups.close()
 
     # Log finished
+    base.helpers.set_checkpoint(conn, _CHECKPOINT, None)
     logger.info('Finished trials export')
 
 
 # Internal
 
-def _read_trial_groups(conn, limit=100):
+_LIMIT = 100
+_RETRIES = 5
+_BACKOFF = 5
+_MAX_BACKOFF = 5 * 60
+_CHECKPOINT = 'osf'
+_TOKEN_TTL_SECONDS = 30 * 60  # api has limit 60*60 seconds
+
+
+class _TrialsExporter(object):
+    def __init__(self, conf):
+        self._conf = conf
+        self._session = requests.Session()
+        self._token_issued_time = None
+
+    def export(self, trials):
+        """Post trials as documents of the "trials" collection.
+        """
+        conf = self._conf
+        session = self._session
+        trial_ids = [trial['id'] for trial in trials]
+
+        # Ensure authenticated
+        if (self._token_issued_time is not None and
+                (datetime.datetime.now() - self._token_issued_time).seconds > _TOKEN_TTL_SECONDS):
+            session.headers.pop('Authorization', None)
+        if 'Authorization' not in session.headers:
+            url = '%s/auth' % conf['OSF_URL']
+            res = session.post(url, json={
+              'data': {
+                'type': 'users',
+                'attributes': {
+                  'provider': 'osf',
+                  'access_token': conf['OSF_KEY'],
+                }
+              }
+            })
+            # Check status
+            # 200 - ok
+            if res.status_code not in [200]:
+                raise RuntimeError('Can\'t authenticate')
+            token = res.json()['data']['attributes']['token']
+            self._token_issued_time = datetime.datetime.now()
+            session.headers.update({'Authorization': token})
+            logger.info('Successfully authenticated')
+
+        # Ensure collection exists
+        url = '%s/namespaces/%s/collections'
+        url = url % (conf['OSF_URL'], conf['OSF_NAMESPACE'])
+        res = session.post(url, json={
+            'data': {
+                'id': 'trials',
+                'type': 'collections',
+                'attributes': {},
+            }
+        })
+        # Check status
+        # 201 - created
+        # 409 - conflict (already exists)
+        if res.status_code == 201:
+            logger.info('Created collection "trials"')
+        elif res.status_code not in [409]:
+            raise RuntimeError('Can\'t create "trials" collection')
+
+        # Export trials
+        # We use bulk post
+        # https://github.com/CenterForOpenScience/jamdb/blob/master/features/document/create.feature#L244
+        url = '%s/namespaces/%s/collections/trials/documents'
+        url = url % (conf['OSF_URL'], conf['OSF_NAMESPACE'])
+        data = []
+        for trial in trials:
+            data.append({
+                'id': trial['id'],
+                'type': 'documents',
+                'attributes': json.loads(json.dumps(
+                    trial, cls=base.helpers.JSONEncoder)),
+            })
+        res = session.post(url, json={'data': data}, headers={
+            'Content-Type': 'application/vnd.api+json; ext="bulk"',
+        })
+        # Check status
+        # 201 - created
+        # 409 - conflict (already exists)
+        if res.status_code not in [201, 409]:
+            raise RuntimeError('Can\'t create "trial" documents: %s/%s' % (res.json(), trial_ids))
+
+
+def _read_trial_groups(conn, limit=100, after_id=None):
     """Yields lists of trials with max limit length.
+
+    Trials are paged on their ids (only trials after `after_id`), so every
+    page is as fast as the first one.
     """
     QUERY = """
+        WITH page AS (
+            SELECT id FROM trials
+            {where}
+            ORDER BY id
+            LIMIT :limit
+        )
         SELECT
         t.id::text,
         t.brief_summary,
@@ -132,7 +181,7 @@ def _read_trial_groups(conn, limit=100):
         coalesce(json_agg(i.*) FILTER (WHERE i.id is not NULL), '[]'::json) as interventions,
         coalesce(json_agg(g.*) FILTER (WHERE g.id is not NULL), '[]'::json) as organisations,
         coalesce(json_agg(p.*) FILTER (WHERE p.id is not NULL), '[]'::json) as persons
-        FROM trials t
+        FROM page JOIN trials t ON t.id = page.id
         LEFT JOIN trials_locations as tl ON t.id = tl.trial_id LEFT JOIN locations l ON l.id = tl.location_id
         LEFT JOIN trials_conditions as tc ON t.id = tc.trial_id LEFT JOIN conditions c ON c.id = tc.condition_id
         LEFT JOIN trials_interventions as ti ON t.id = ti.trial_id LEFT JOIN interventions i ON i.id = ti.intervention_id
@@ -140,14 +189,58 @@ def _read_trial_groups(conn, limit=100):
         LEFT JOIN trials_persons as tp ON t.id = tp.trial_id LEFT JOIN persons p ON p.id = tp.person_id
         GROUP BY t.id
         ORDER BY t.id
-        LIMIT {limit}
-        OFFSET {offset}
     """
-    offset = 0
     while True:
-        query = QUERY.format(limit=limit, offset=offset)
-        trials = list(conn['database'].query(query))
+        if after_id is None:
+            query = QUERY.format(where='')
+        else:
+            query = QUERY.format(where='WHERE id > CAST(:after_id AS uuid)')
+        trials = list(conn['database'].query(query, limit=limit, after_id=after_id))
         if not trials:
             break
         yield trials
-        offset += limit
+        after_id = trials[-1]['id']
+
+
+def _iter_prefetched(iterator, size=1):
+    """Yield items of iterator read ahead by a background thread.
+
+    Up to `size` items are read ahead, so reading the next item overlaps with
+    processing the current one. Closing the generator stops the thread.
+    """
+    items = Queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(value):
+        while not stopped.is_set():
+            try:
+                items.put(value, timeout=1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as exception:
+            put((done, exception))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, exception = items.get()
+            if exception is not None:
+                raise exception
+            if item is done:
+                break
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
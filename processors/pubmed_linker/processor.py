@@ -15,6 +15,7 @@ def process(conf, conn):
 
     # Iterate over all pubmed publications
     count = 0
+    index = base.helpers.TrialIdentifierIndex(conn)
     for publication in base.helpers.iter_rows(conn, 'database', 'publications',
             orderby='id', source_id='pubmed'):
         try:
@@ -32,7 +33,7 @@ def process(conf, conn):
 
                 # Get trial
                 trial = base.helpers.find_trial_by_identifiers(
-                    conn, identifiers=identifiers)
+                    conn, identifiers=identifiers, index=index)
 
                 # Found trial - add relationship
                 if trial:
@@ -4,8 +4,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
+import time
 from itertools import groupby
 
+import processors.base.config as config
 import processors.base.helpers as helpers
 import logging
 logger = logging.getLogger(__name__)
@@ -36,7 +39,29 @@ def process(conf, conn):
 
         tasks_data = _create_tasks(rows)
 
-        processor.run(tasks_data, ['fda_approval_id'])
+        # Tasks are fetched from the server only without a snapshot of the
+        # last run, which is removed until this run succeeds. Tasks deleted
+        # or duplicated on the server aren't in the snapshot, so it's fetched
+        # again once it's older than `PYBOSSA_SNAPSHOT_MAX_AGE` days (or
+        # with `--full`)
+        checkpoint = 'pybossa_indications:%s' % project_id
+        max_age = conf.get('PYBOSSA_SNAPSHOT_MAX_AGE', config.PYBOSSA_SNAPSHOT_MAX_AGE) * 24 * 3600
+        snapshot = None
+        fetched_at = time.time()
+        if not conf.get('PROCESS_FULL'):
+            value = helpers.get_checkpoint(conn, checkpoint)
+            if value is not None:
+                value = json.loads(value)
+                if fetched_at - value.get('fetched_at', 0) < max_age:
+                    snapshot = value['tasks']
+                    fetched_at = value['fetched_at']
+        helpers.set_checkpoint(conn, checkpoint, None)
+
+        snapshot = processor.run(tasks_data, ['fda_approval_id'], snapshot=snapshot)
+        helpers.set_checkpoint(conn, checkpoint, json.dumps({
+            'fetched_at': fetched_at,
+            'tasks': snapshot,
+        }))
     else:
         logger.info('No new and modified indications found for tasks creation')
 
@@ -11,10 +11,21 @@ logger = logging.getLogger(__name__)
 
 # Module API
 
-def process(conf, conn):
+def process(conf, conn, mode='bulk'):
+    """Remove records which don't belong to their trials.
 
+    By default records of all trials are planned at once and removed in
+    batches. With the `per_trial` mode records are compared and removed
+    trial by trial as before, e.g. to check results of the bulk mode:
+
+        $ make start record_remover per_trial
+
+    """
     processor = _RecordRemover(conf, conn)
-    processor._remove_records_without_trial()
+    if mode == 'per_trial':
+        processor._remove_records_without_trial_per_trial()
+    else:
+        processor._remove_records_without_trial()
 
 
 class _RecordRemover(object):
@@ -23,10 +34,52 @@ class _RecordRemover(object):
         self._conn = conn
 
     def _remove_records_without_trial(self):
-        """Remove records without trial.
+        """Remove records which don't belong to their trials.
+
+        Records are grouped by shared identifiers (see `TrialDeduplicator`)
+        and records of a trial planned for another group of records are
+        removed in batches, so they're processed again and get the right
+        trial (watermarks of their sources are reset). With `PROCESS_DRY_RUN`
+        set records are only reported.
+        """
+        dry_run = self._conf.get('PROCESS_DRY_RUN', False)
+        action = 'Would remove' if dry_run else 'Removed'
+        deduplicator = base.helpers.TrialDeduplicator(self._conn)
+        record_ids = deduplicator.get_split_records()
+
+        count = 0
+        trial_ids = set()
+        for offset in range(0, len(record_ids), _BATCH_SIZE):
+            batch = record_ids[offset:offset + _BATCH_SIZE]
+            try:
+                records = self._remove_records(batch, dry_run=dry_run)
+            except Exception:
+                base.config.SENTRY.captureException(extra={
+                    'record_ids': batch,
+                })
+                continue
+            for record in records:
+                count += 1
+                trial_ids.add(record['trial_id'])
+                logger.info('%s record %s (%s) of trial %s: %s', action,
+                    record['id'], record['source_id'], record['trial_id'], record['identifiers'])
+
+        logger.info('%s %s records of %s trials', action, count, len(trial_ids))
+
+    def _remove_records_without_trial_per_trial(self):
+        """Remove records without identifiers shared with their trials' biggest segment.
+
+        Records of every trial with multiple records are split into segments
+        of records sharing identifiers and records outside of the biggest
+        segment are removed one by one. Watermarks of their sources are reset
+        at the end of the run. With `PROCESS_DRY_RUN` set records are only
+        reported.
         """
+        dry_run = self._conf.get('PROCESS_DRY_RUN', False)
+        action = 'Would remove' if dry_run else 'Removed'
 
         count = 0
+        source_ids = set()
         for trial in base.helpers.iter_rows(self._conn, 'database', 'trials', orderby='id'):
             try:
                 # Count trials
@@ -66,12 +119,45 @@ class _RecordRemover(object):
                     idset = set(record['identifiers'].items())
                     if not biggest_segment.intersection(idset):
                         if self._conn['database']['records'].find_one(id=record['id']):
-                            self._conn['database']['records'].delete(id=record['id'])
-                            logger.info('Removed record: %s', record['identifiers'])
+                            if not dry_run:
+                                self._conn['database']['records'].delete(id=record['id'])
+                                source_ids.add(record['source_id'])
+                            logger.info('%s record: %s', action, record['identifiers'])
 
                 # Log info
                 if count and not count % 100:
-                    logger.info('Processed %s records', count)
+                    logger.info('Processed %s trials', count)
 
             except Exception:
-                base.config.SENTRY.captureException()
+                base.config.SENTRY.captureException(extra={
+                    'trial_id': trial['id'],
+                })
+
+        if source_ids:
+            base.helpers.reset_watermarks(self._conn, source_ids)
+
+    def _remove_records(self, record_ids, dry_run=False):
+        db = self._conn['database']
+        query = """
+            %s FROM records
+            WHERE id = ANY(CAST(:record_ids AS uuid[]))
+            %s
+        """ % (('SELECT id, trial_id, source_id, identifiers', '') if dry_run else
+               ('DELETE', 'RETURNING id, trial_id, source_id, identifiers'))
+        if dry_run:
+            return list(db.query(query, record_ids=record_ids))
+        db.begin()
+        try:
+            records = list(db.query(query, record_ids=record_ids))
+            base.helpers.reset_watermarks(self._conn,
+                set(record['source_id'] for record in records))
+        except Exception:
+            db.rollback()
+            raise
+        db.commit()
+        return records
+
+
+# Internal
+
+_BATCH_SIZE = 1000
@@ -19,7 +19,8 @@ def process(conf, conn):
     1. Run this processor to delete all data from the sources except the
        trials;
     2. Run all other sources' processors to update the remaining trials with
-       the data from sources we won't remove;
+       the data from sources we won't remove (this processor resets all
+       watermarks, so they process all their records);
     3. Run trial_remover to remove trials without records;
     4. Run sources_remover to finally remove the sources themselves.
     '''
@@ -42,10 +43,12 @@ def process(conf, conn):
         _delete_organisations(db, source_ids)
         _delete_persons(db, source_ids)
         _delete_publications(db, source_ids)
+        base.helpers.reset_watermarks(conn)
     except Exception:
         base.config.SENTRY.captureException()
         logger.debug('Rolling back')
         db.rollback()
+        base.helpers.clear_slug_caches()
     else:
         db.commit()
     finally:
@@ -163,6 +166,7 @@ def _delete_trial_related_entity(db, entity_table, entity_table_id, source_ids):
     logger.debug('Deleted trials_%s' % entity_table)
 
     num_records = db[entity_table].delete(source_id=source_ids)
+    base.helpers.clear_slug_caches(entity_table)
     msg = 'Deleted {} {}'.format(int(num_records), entity_table)
     logger.debug(msg)
 
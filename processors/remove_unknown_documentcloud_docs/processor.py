@@ -6,35 +6,66 @@ from __future__ import unicode_literals
 
 import logging
 import urllib2
+import collections
+import concurrent.futures
 import documentcloud
+from .. import base
 logger = logging.getLogger(__name__)
 
 
 def process(conf, conn):
-    query = (
-        'SELECT documentcloud_id FROM files'
-        ' WHERE documentcloud_id IS NOT NULL'
-    )
-    dc_local_ids = set([_extract_dc_id(row['documentcloud_id'])
-                        for row in conn['database'].query(query)])
-    dc_remote_ids = set([_extract_dc_id(dc_id)
-                         for dc_id in _documentcloud_projects(conf)])
-    dc_ids = dc_remote_ids - dc_local_ids
+    """Delete DocumentCloud documents of the project unknown to the database.
 
+    Remote and local ids are compared walking both in sorted order, so local
+    ids are streamed instead of loaded at once. Documents are deleted by
+    `DOCUMENTCLOUD_WORKERS` threads respecting `DOCUMENTCLOUD_RATE_LIMIT`,
+    and failed deletions are retried. With `PROCESS_DRY_RUN` set documents
+    are only reported.
+    """
+    query = '''
+        SELECT DISTINCT split_part(documentcloud_id, '-', 1) COLLATE "C" AS documentcloud_id
+        FROM files
+        WHERE documentcloud_id IS NOT NULL
+        ORDER BY 1
+    '''
+    dc_local_ids = (row['documentcloud_id']
+                    for row in base.helpers.iter_query_rows(conn, 'database', query, bufsize=_BUFFER_SIZE))
     dc_client = _documentcloud_client(conf)
-    total = len(dc_ids)
-    for i, dc_id in enumerate(dc_ids):
-        count = '%d/%d' % (i + 1, total)
-        logger.debug('Deleting from DocumentCloud: %s (%s)', dc_id, count)
-        try:
-            dc_client.documents.delete(dc_id)
-        except (documentcloud.toolbox.DoesNotExistError, urllib2.HTTPError):
-            logger.exception('Ignoring error for %s', dc_id)
+    dc_remote_ids = sorted(set(_extract_dc_id(dc_id)
+                               for dc_id in _documentcloud_projects(conf, dc_client)))
+    dc_ids = _iter_unknown_ids(dc_remote_ids, dc_local_ids)
+
+    if conf.get('PROCESS_DRY_RUN'):
+        count = 0
+        for dc_id in dc_ids:
+            logger.info('Would delete from DocumentCloud: %s', dc_id)
+            count += 1
+        logger.info('Would delete %s of %s DocumentCloud docs', count, len(dc_remote_ids))
+        return
 
+    workers = conf.get('DOCUMENTCLOUD_WORKERS', base.config.DOCUMENTCLOUD_WORKERS)
+    rate_limiter = base.helpers.RateLimiter(
+        conf.get('DOCUMENTCLOUD_RATE_LIMIT', base.config.DOCUMENTCLOUD_RATE_LIMIT))
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    counts = collections.Counter()
+    pending = collections.deque()
+    try:
+        for dc_id in dc_ids:
+            pending.append((dc_id, executor.submit(_delete_document, dc_client, rate_limiter, dc_id)))
+            while len(pending) > workers * 2 or (pending and pending[0][1].done()):
+                _collect_result(pending.popleft(), counts)
+        while pending:
+            _collect_result(pending.popleft(), counts)
+    finally:
+        executor.shutdown()
+    logger.info('Deleted %s of %s DocumentCloud docs (%s failed)',
+                counts['deleted'], len(dc_remote_ids), counts['failed'])
 
-def _documentcloud_projects(conf):
+
+def _documentcloud_projects(conf, client=None):
     project_title = conf['DOCUMENTCLOUD_PROJECT']
-    client = _documentcloud_client(conf)
+    if client is None:
+        client = _documentcloud_client(conf)
 
     project = client.projects.get_by_title(project_title)
     return project.document_ids
@@ -59,3 +90,64 @@ def _extract_dc_id(dc_id):
     parts = dc_id.split('-')
     if parts:
         return parts[0]
+
+
+# Internal
+
+_RETRIES = 3
+_BACKOFF = 1
+_BUFFER_SIZE = 10000
+
+
+def _iter_unknown_ids(remote_ids, local_ids):
+    """Yield remote ids missing from local ids (both sorted and unique).
+    """
+    local_ids = iter(local_ids)
+    local_id = next(local_ids, None)
+    for remote_id in remote_ids:
+        while local_id is not None and local_id < remote_id:
+            local_id = next(local_ids, None)
+        if local_id != remote_id:
+            yield remote_id
+
+
+def _delete_document(client, rate_limiter, dc_id):
+    """Delete document retrying on connection and server errors.
+
+    Returns:
+        bool: False if the document doesn't exist anymore
+
+    """
+    def delete():
+        rate_limiter.wait('documentcloud')
+        try:
+            client.documents.delete(dc_id)
+        except documentcloud.toolbox.DoesNotExistError:
+            return False
+        except urllib2.HTTPError as exception:
+            if exception.code == 404:
+                return False
+            if exception.code < 500 and exception.code != 429:
+                raise _PermanentError(exception)
+            raise
+        return True
+
+    return base.helpers.call_with_retry(
+        delete, retries=_RETRIES, backoff=_BACKOFF, exceptions=(urllib2.URLError,))
+
+
+class _PermanentError(Exception):
+    """Client error which shouldn't be retried.
+    """
+
+
+def _collect_result(item, counts):
+    dc_id, future = item
+    try:
+        deleted = future.result()
+    except (urllib2.URLError, _PermanentError):
+        logger.exception('Ignoring error for %s', dc_id)
+        counts['failed'] += 1
+    else:
+        logger.debug('Deleted from DocumentCloud: %s', dc_id)
+        counts['deleted' if deleted else 'missing'] += 1
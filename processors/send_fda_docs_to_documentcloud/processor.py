@@ -7,12 +7,21 @@ from __future__ import unicode_literals
 
 import re
 import logging
+import threading
+import collections
+import concurrent.futures
 from .. import base
 import documentcloud
 logger = logging.getLogger(__name__)
 
 
 def process(conf, conn):
+    """Send FDA documents' files to DocumentCloud (see `_SendFDADocsToDocumentCloudProcessor`).
+
+    Files are processed by `DOCUMENTCLOUD_WORKERS` threads and their new
+    DocumentCloud ids are written in batches. Ids of files uploaded before a
+    failure are written too, so they aren't uploaded again by the next run.
+    """
     query = '''
         SELECT DISTINCT ON (files.id)
           documents.name,
@@ -32,66 +41,172 @@ def process(conf, conn):
         ORDER BY files.id
     '''
     processor = _SendFDADocsToDocumentCloudProcessor(conf, conn['database'])
-    for the_file in conn['database'].query(query):
-        try:
+    try:
+        processor.prefetch_documents()
+    except Exception:
+        base.config.SENTRY.captureException()
+
+    # Process files
+    workers = conf.get('DOCUMENTCLOUD_WORKERS', base.config.DOCUMENTCLOUD_WORKERS)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    pending = collections.deque()
+    updates = []
+    try:
+        for the_file in conn['database'].query(query):
             the_file['id'] = the_file['id'].hex
-            processor.process_file(the_file)
-            logger.debug('Processed file %s' % the_file['id'])
-        except Exception:
-            base.config.SENTRY.captureException(extra={
-                'file_id': the_file['id'],
-            })
+            pending.append((the_file, executor.submit(processor.process_file, the_file)))
+            while len(pending) > workers * 2 or (pending and pending[0][1].done()):
+                _collect_result(pending.popleft(), updates)
+            if len(updates) >= _BATCH_SIZE:
+                _write_documentcloud_ids(conn, updates)
+                updates = []
+    finally:
+        executor.shutdown()
+        while pending:
+            _collect_result(pending.popleft(), updates)
+        _write_documentcloud_ids(conn, updates)
+
+
+# Internal
+
+_BATCH_SIZE = 100
+
+
+def _collect_result(item, updates):
+    the_file, future = item
+    try:
+        documentcloud_id = future.result()
+    except Exception:
+        base.config.SENTRY.captureException(extra={
+            'file_id': the_file['id'],
+        })
+    else:
+        if documentcloud_id is not None:
+            updates.append((the_file['id'], documentcloud_id))
+        logger.debug('Processed file %s' % the_file['id'])
+
+
+def _write_documentcloud_ids(conn, updates):
+    if not updates:
+        return
+    query = """
+        UPDATE files SET documentcloud_id = updates.documentcloud_id
+        FROM (
+            SELECT
+                unnest(CAST(:file_ids AS uuid[])) AS id,
+                unnest(CAST(:documentcloud_ids AS text[])) AS documentcloud_id
+        ) AS updates
+        WHERE files.id = updates.id
+    """
+    conn['database'].query(query,
+        file_ids=[file_id for file_id, _ in updates],
+        documentcloud_ids=[documentcloud_id for _, documentcloud_id in updates])
+    logger.debug('Updated DocumentCloud ids of %s files', len(updates))
 
 
 class _SendFDADocsToDocumentCloudProcessor(object):
+    """Upload FDA documents' files to DocumentCloud and keep their metadata.
+
+    The DocumentCloud client and project are created once per processor.
+    New documents are uploaded with all their metadata in the upload call
+    and existing documents are only saved if their metadata changed.
+
+    It's safe to process files from multiple threads. All calls to
+    DocumentCloud share a rate limit (`DOCUMENTCLOUD_RATE_LIMIT`).
+    """
+
     def __init__(self, conf, db):
         self._conf = conf
         self._db = db
+        self._client = None
+        self._project_object = None
+        self._documents = {}
+        self._lock = threading.Lock()
+        self._rate_limiter = base.helpers.RateLimiter(
+            conf.get('DOCUMENTCLOUD_RATE_LIMIT', base.config.DOCUMENTCLOUD_RATE_LIMIT))
+
+    def prefetch_documents(self):
+        """Get documents of the project at once, so they aren't got one by one.
+        """
+        self._wait()
+        query = 'projectid:%s' % self._project.id
+        documents = self._dc_client.documents.search(query, data=True)
+        self._documents = {doc.id.split('-')[0]: doc for doc in documents}
+        logger.debug('Prefetched %s DocumentCloud docs', len(self._documents))
 
     def process_file(self, the_file):
+        """Upload file (if needed) and update its document's metadata.
+
+        Returns:
+            str/None: new DocumentCloud id of the file/if it didn't change
+
+        """
+        metadata = self._get_metadata(the_file)
+        uploaded = False
         if the_file.get('documentcloud_id'):
-            doc = self._dc_client.documents.get(the_file['documentcloud_id'])
+            doc = self._documents.get(str(the_file['documentcloud_id']))
+            if doc is None or getattr(doc, 'file_hash', None) is None:
+                self._wait()
+                doc = self._dc_client.documents.get(the_file['documentcloud_id'])
         else:
-            doc = self._upload_file(the_file)
+            doc = self._upload_file(the_file, metadata)
+            uploaded = True
 
         if doc.file_hash and (doc.file_hash != the_file['sha1']):
             logger.debug('Deleting outdated DocumentCloud doc: %s' % doc.id)
+            self._wait()
             doc.delete()
-            doc = self._upload_file(the_file)
-
-        application_type = re.findall(r'^[a-zA-Z]+',
-                                      the_file['fda_application_id'])[0]
-
-        doc.title = self._generate_title(the_file)
-        doc.project = self._project
-        doc.access = 'public'
-        doc.data = {
-            'fda_application': the_file['fda_application_id'],
-            'application_type': application_type,
-            'supplement_number': str(the_file['supplement_number']),
-            'name': the_file['name'],
-            'type': the_file['type'],
-            'action_date': the_file['action_date'].isoformat(),
-        }
-
-        doc.save()
+            doc = self._upload_file(the_file, metadata)
+            uploaded = True
+
+        # Uploaded documents already have their metadata
+        if not uploaded and not self._has_metadata(doc, metadata):
+            doc.title = metadata['title']
+            doc.project = self._project
+            doc.access = metadata['access']
+            doc.data = metadata['data']
+            self._wait()
+            doc.save()
 
         documentcloud_id = doc.id.split('-')[0]
         if the_file.get('documentcloud_id') != documentcloud_id:
-            the_file['documentcloud_id'] = documentcloud_id
-            self._db['files'].upsert(the_file, ['id'], ensure=False)
+            return documentcloud_id
+        return None
 
-    def _upload_file(self, the_file):
-        title = self._generate_title(the_file)
+    def _upload_file(self, the_file, metadata):
+        self._wait()
         doc = self._dc_client.documents.upload(
             the_file['source_url'],
-            title=title,
-            project=self._project.id
+            title=metadata['title'],
+            project=self._project.id,
+            access=metadata['access'],
+            data=metadata['data']
         )
         logger.debug('PDF uploaded to DocumentCloud: %s' % the_file['source_url'])
 
         return doc
 
+    def _get_metadata(self, the_file):
+        application_type = re.findall(r'^[a-zA-Z]+',
+                                      the_file['fda_application_id'])[0]
+        return {
+            'title': self._generate_title(the_file),
+            'access': 'public',
+            'data': {
+                'fda_application': the_file['fda_application_id'],
+                'application_type': application_type,
+                'supplement_number': str(the_file['supplement_number']),
+                'name': the_file['name'],
+                'type': the_file['type'],
+                'action_date': the_file['action_date'].isoformat(),
+            },
+        }
+
+    def _has_metadata(self, doc, metadata):
+        return (getattr(doc, 'title', None) == metadata['title'] and
+                getattr(doc, 'access', None) == metadata['access'] and
+                getattr(doc, 'data', None) == metadata['data'])
+
     def _generate_title(self, the_file):
         return '-'.join([
             the_file['fda_application_id'],
@@ -100,16 +215,27 @@ class _SendFDADocsToDocumentCloudProcessor(object):
             the_file['name']
         ])
 
+    def _wait(self):
+        self._rate_limiter.wait('documentcloud')
+
     @property
     def _project(self):
-        title = self._conf['DOCUMENTCLOUD_PROJECT']
-        project, _ = self._dc_client.projects.get_or_create_by_title(title)
+        with self._lock:
+            if self._project_object is None:
+                title = self._conf['DOCUMENTCLOUD_PROJECT']
+                self._project_object, _ = self._get_client().projects.get_or_create_by_title(title)
 
-        return project
+        return self._project_object
 
     @property
     def _dc_client(self):
-        username = self._conf['DOCUMENTCLOUD_USERNAME']
-        password = self._conf['DOCUMENTCLOUD_PASSWORD']
+        with self._lock:
+            return self._get_client()
+
+    def _get_client(self):
+        if self._client is None:
+            username = self._conf['DOCUMENTCLOUD_USERNAME']
+            password = self._conf['DOCUMENTCLOUD_PASSWORD']
+            self._client = documentcloud.DocumentCloud(username, password)
 
-        return documentcloud.DocumentCloud(username, password)
+        return self._client
@@ -4,35 +4,98 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
+import hashlib
+import urlparse
 import documentcloud
+import concurrent.futures
 import logging
 from .. import base
 logger = logging.getLogger(__name__)
 
 
 def process(conf, conn):
+    """Sync text of files' pages from their DocumentCloud documents.
+
+    Pages are fetched concurrently by `DOCUMENTCLOUD_WORKERS` threads making
+    at most `DOCUMENTCLOUD_RATE_LIMIT` requests per second per host. Files
+    with as many pages as their document (and the same hash if DocumentCloud
+    returns it) are skipped. The last synced file is saved as a checkpoint
+    when a file is written or every `_CHECKPOINT_INTERVAL` files, so an
+    interrupted sync continues from it (use `--full` to start over).
+    """
+    workers = conf.get('DOCUMENTCLOUD_WORKERS', base.config.DOCUMENTCLOUD_WORKERS)
+    rate_limit = conf.get('DOCUMENTCLOUD_RATE_LIMIT', base.config.DOCUMENTCLOUD_RATE_LIMIT)
+    rate_limiter = base.helpers.RateLimiter(rate_limit)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    checkpoint = None
+    if not conf.get('PROCESS_FULL'):
+        checkpoint = base.helpers.get_checkpoint(conn, _CHECKPOINT)
+        if checkpoint is not None:
+            logger.info('Continuing text sync after file %s', checkpoint)
+
+    client = documentcloud.DocumentCloud()
+    count = 0
+    skipped_count = 0
+    unsaved_count = 0
+    try:
+        for row in _iter_files(conn, checkpoint):
+            written = False
+            doc = _get_document(client, row['documentcloud_id'])
+            if doc is not None:
+                if _is_synced(row, doc):
+                    skipped_count += 1
+                else:
+                    pages = _get_pages(doc, executor, rate_limiter)
+                    if pages and _write_pages(conn, row, pages):
+                        written = True
+                        count += 1
+            unsaved_count += 1
+            if written or unsaved_count >= _CHECKPOINT_INTERVAL:
+                base.helpers.set_checkpoint(conn, _CHECKPOINT,
+                    '%d:%s' % (row['has_pages'], row['id'].hex))
+                unsaved_count = 0
+    finally:
+        executor.shutdown()
+
+    base.helpers.set_checkpoint(conn, _CHECKPOINT, None)
+    logger.info('Synced text of %s files (%s files were up to date)', count, skipped_count)
+
+
+# Internal
+
+_CHECKPOINT = 'sync_text_from_documentcloud'
+_CHECKPOINT_INTERVAL = 100
+
+
+def _iter_files(conn, checkpoint=None):
+    """Yield files with documents, files without pages first.
+
+    Pages aren't selected (they would be loaded for all files at once), only
+    their hash to compare them with pages got from DocumentCloud.
+    """
     query = '''
-        SELECT id, documentcloud_id FROM files
-          WHERE documentcloud_id IS NOT NULL
-          ORDER BY pages DESC  -- Process files without pages first
+        SELECT id, documentcloud_id, sha1, pages_count, pages_hash, pages_count > 0 AS has_pages
+        FROM (
+            SELECT id, documentcloud_id, sha1, coalesce(array_length(pages, 1), 0) AS pages_count,
+                md5(CAST(array_to_json(pages) AS text)) AS pages_hash
+            FROM files
+            WHERE documentcloud_id IS NOT NULL
+        ) AS files
+        {where}
+        ORDER BY has_pages, id  -- Process files without pages first
     '''
-    client = documentcloud.DocumentCloud()
-    for row in conn['database'].query(query):
-        pages = _get_pages(client, row['documentcloud_id'])
-        if pages:
-            the_file = {
-                'id': row['id'].hex,
-                'pages': pages,
-            }
-            base.writers.write_file(conn, the_file)
-
-
-def _get_pages(client, doc_id):
-    doc = None
-    pages = None
+    if checkpoint is None:
+        return conn['database'].query(query.format(where=''))
+    has_pages, after_id = checkpoint.split(':')
+    return conn['database'].query(
+        query.format(where='WHERE (pages_count > 0, id) > (:has_pages, CAST(:after_id AS uuid))'),
+        has_pages=bool(int(has_pages)), after_id=after_id)
+
 
+def _get_document(client, doc_id):
     try:
-        doc = client.documents.get(doc_id)
+        return client.documents.get(doc_id)
     except Exception as e:
         is_http_error_403 = (getattr(e, 'code', None) == 403)
         if is_http_error_403:
@@ -41,17 +104,48 @@ def _get_pages(client, doc_id):
             'documentcloud_id': doc_id,
         })
 
+
+def _is_synced(row, doc):
+    file_hash = getattr(doc, 'file_hash', None)
+    return (row['pages_count'] > 0 and row['pages_count'] == doc.pages and
+            (file_hash is None or file_hash == row['sha1']))
+
+
+def _get_pages(doc, executor, rate_limiter):
+    def get_page_text(page):
+        rate_limiter.wait(urlparse.urlparse(doc.get_page_text_url(page)).netloc)
+        return doc.get_page_text(page).strip()
+
+    pages = None
     try:
-        if doc:
-            pages = [doc.get_page_text(page).strip()
-                     for page in range(1, doc.pages + 1)]
-            has_only_empty_pages = all([not page for page in pages])
-            if has_only_empty_pages:
-                pages = None
+        pages = list(executor.map(get_page_text, range(1, doc.pages + 1)))
+        has_only_empty_pages = all([not page for page in pages])
+        if has_only_empty_pages:
+            pages = None
     except NotImplementedError:
         msg = 'Skipped extracting text from non-public document'
         base.config.SENTRY.captureException(message=msg, extra={
-            'documentcloud_id': doc_id,
+            'documentcloud_id': doc.id,
         })
 
     return pages
+
+
+def _write_pages(conn, row, pages):
+    """Write file's pages unless they haven't changed.
+    """
+    if row['pages_hash'] == _get_pages_hash(pages):
+        return False
+    the_file = {
+        'id': row['id'].hex,
+        'pages': pages,
+    }
+    base.writers.write_file(conn, the_file)
+    return True
+
+
+def _get_pages_hash(pages):
+    """Get hash of pages as `md5(CAST(array_to_json(pages) AS text))` in PostgreSQL.
+    """
+    text = json.dumps(pages, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
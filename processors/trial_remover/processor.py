@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+import collections
 from .. import base
 logger = logging.getLogger(__name__)
 
@@ -18,11 +19,86 @@ def process(conf, conn):
     NOTE: Please run `remove_unknown_documentcloud_docs` processor after this processor.
     """
 
-    remove_trials_without_records(conf, conn)
+    remove_trials_without_records_in_bulk(conf, conn)
+
+
+def remove_trials_without_records_in_bulk(conf, conn, batch_size=None):
+    """Remove trials without records and their unreferenced relations set-wise.
+
+    Trials without records are found with an anti-join and removed in batches,
+    every batch in its own transaction. Tables are deleted from in dependency
+    order with a query per table for the whole batch, entities only if no
+    other trial (or FDA application) still references them. If a batch fails
+    its trials are removed one by one, so a bad row only blocks its trial.
+    With `PROCESS_DRY_RUN` set rows which would be removed are only counted
+    with the same anti-joins, nothing is deleted.
+
+    Args:
+        conf (dict): config dict
+        conn (dict): connection dict
+        batch_size (int): number of trials per transaction
+            (default: `TRIAL_REMOVER_BATCH_SIZE`)
+
+    Returns:
+        dict: number of removed rows per table
+
+    """
+    db = conn['database']
+    dry_run = conf.get('PROCESS_DRY_RUN', False)
+    if batch_size is None:
+        batch_size = conf.get('TRIAL_REMOVER_BATCH_SIZE', base.config.TRIAL_REMOVER_BATCH_SIZE)
+
+    # Prepare
+    query = """
+        SELECT trials.id FROM trials
+        WHERE trials.source_id != 'pubmed' AND NOT EXISTS (
+            SELECT 1 FROM records WHERE records.trial_id = trials.id
+        )
+        ORDER BY trials.id
+    """
+    trial_ids = [row['id'].hex for row in db.query(query)]
+    logger.info('Found %s trials without records', len(trial_ids))
+
+    # Execute
+    counts = collections.OrderedDict((table, 0) for table in _TABLES)
+    error_count = 0
+    for offset in range(0, len(trial_ids), batch_size):
+        batch = trial_ids[offset:offset + batch_size]
+        if dry_run:
+            batch_counts = _count_trials(db, batch, trial_ids[:offset + batch_size])
+        else:
+            try:
+                batch_counts = _delete_trials_in_transaction(db, batch)
+            except Exception:
+                logger.warning('Failed to remove batch of trials, removing them one by one: %s',
+                               ', '.join(batch))
+                batch_counts = collections.Counter()
+                for trial_id in batch:
+                    try:
+                        batch_counts.update(_delete_trials_in_transaction(db, [trial_id]))
+                    except Exception:
+                        base.config.SENTRY.captureException(extra={
+                            'trial_id': trial_id,
+                        })
+                        error_count += 1
+        for table, count in batch_counts.items():
+            counts[table] += count
+        logger.info('%s %s of %s trials without records',
+                    'Would remove' if dry_run else 'Removed',
+                    counts['trials'], len(trial_ids))
+
+    # Deleted entities' slugs can't be cached anymore
+    if not dry_run:
+        base.helpers.clear_slug_caches(*_ENTITY_TABLES)
+    for table, count in counts.items():
+        logger.info('%s %s rows from %s', 'Would remove' if dry_run else 'Removed', count, table)
+    if error_count > 0:
+        logger.warning('Failed to remove %s trials without records', error_count)
+    return counts
 
 
 def remove_trials_without_records(conf, conn):
-    """Remove trials without records"""
+    """Remove trials without records one by one (see `_TrialRemover`)"""
 
     # Prepare
     query = """
@@ -142,4 +218,206 @@ class _TrialRemover(object):
 
             # If the related entity is not attached to other trials, delete it too
             if len(entity_relations) == 0:
+                base.helpers.get_slug_cache(entity_table).remove(entity.get('slug'))
                 yield entity
+
+
+# Internal
+
+# Entity tables related to trials through `trials_<table>` join tables
+_ENTITY_TABLES = [
+    'conditions', 'interventions', 'locations', 'organisations', 'persons', 'publications',
+]
+
+# Tables in the order rows are deleted from them
+_TABLES = ['trials_%s' % table for table in _ENTITY_TABLES] + _ENTITY_TABLES + [
+    'trials_documents', 'documents', 'files',
+    'risk_of_biases_risk_of_bias_criterias', 'risk_of_biases', 'trials',
+]
+
+# Additional conditions for entities to be deleted
+_ENTITY_CONDITIONS = {
+    'interventions': 'fda_application_id IS NULL',
+    'organisations': """NOT EXISTS (
+        SELECT 1 FROM fda_applications WHERE fda_applications.organisation_id = organisations.id
+    )""",
+}
+
+
+def _delete_trials_in_transaction(db, trial_ids):
+    db.begin()
+    try:
+        counts = _delete_trials(db, trial_ids)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    return counts
+
+
+def _delete_trials(db, trial_ids):
+    counts = collections.OrderedDict()
+
+    # Relations to entities and entities not related to other trials anymore
+    entity_ids = {}
+    for table in _ENTITY_TABLES:
+        join_table = 'trials_%s' % table
+        column = '%s_id' % table[:-1]
+        rows = _execute(db, """
+            DELETE FROM {join_table} WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+            RETURNING {column}
+        """.format(join_table=join_table, column=column), trial_ids=trial_ids)
+        counts[join_table] = len(rows)
+        entity_ids[table] = list(set(row[column].hex for row in rows))
+    for table in _ENTITY_TABLES:
+        rows = _execute(db, """
+            DELETE FROM {table} WHERE id = ANY(CAST(:ids AS uuid[]))
+                AND NOT EXISTS (
+                    SELECT 1 FROM {join_table} WHERE {join_table}.{column} = {table}.id
+                )
+                AND {condition}
+            RETURNING id
+        """.format(table=table, join_table='trials_%s' % table, column='%s_id' % table[:-1],
+                   condition=_ENTITY_CONDITIONS.get(table, 'TRUE')),
+            ids=entity_ids[table])
+        counts[table] = len(rows)
+
+    # Documents not related to other trials or FDA approvals and their files
+    rows = _execute(db, """
+        DELETE FROM trials_documents WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+        RETURNING document_id
+    """, trial_ids=trial_ids)
+    counts['trials_documents'] = len(rows)
+    rows = _execute(db, """
+        DELETE FROM documents WHERE id = ANY(CAST(:ids AS uuid[]))
+            AND fda_approval_id IS NULL
+            AND NOT EXISTS (
+                SELECT 1 FROM trials_documents WHERE trials_documents.document_id = documents.id
+            )
+        RETURNING file_id
+    """, ids=list(set(row['document_id'].hex for row in rows)))
+    counts['documents'] = len(rows)
+    rows = _execute(db, """
+        DELETE FROM files WHERE id = ANY(CAST(:ids AS uuid[]))
+            AND NOT EXISTS (SELECT 1 FROM documents WHERE documents.file_id = files.id)
+        RETURNING id
+    """, ids=list(set(row['file_id'].hex for row in rows if row['file_id'] is not None)))
+    counts['files'] = len(rows)
+
+    # Risk of biases
+    rows = _execute(db, """
+        DELETE FROM risk_of_biases_risk_of_bias_criterias
+        WHERE risk_of_bias_id IN (
+            SELECT id FROM risk_of_biases WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+        )
+        RETURNING risk_of_bias_id
+    """, trial_ids=trial_ids)
+    counts['risk_of_biases_risk_of_bias_criterias'] = len(rows)
+    rows = _execute(db, """
+        DELETE FROM risk_of_biases WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+        RETURNING id
+    """, trial_ids=trial_ids)
+    counts['risk_of_biases'] = len(rows)
+
+    # Trials which didn't get records in the meantime
+    rows = _execute(db, """
+        DELETE FROM trials WHERE id = ANY(CAST(:trial_ids AS uuid[]))
+            AND NOT EXISTS (SELECT 1 FROM records WHERE records.trial_id = trials.id)
+        RETURNING id
+    """, trial_ids=trial_ids)
+    counts['trials'] = len(rows)
+
+    return counts
+
+
+def _count_trials(db, trial_ids, removed_trial_ids):
+    # Rows are counted as if trials of the previous batches (`removed_trial_ids`
+    # also include the batch) were removed already, so shared rows are counted
+    # in the batch removing their last reference like `_delete_trials` does
+    counts = collections.OrderedDict()
+
+    # Relations to entities and entities not related to trials which aren't removed
+    for table in _ENTITY_TABLES:
+        counts['trials_%s' % table] = _count(db, """
+            SELECT count(*) FROM trials_{table} WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+        """.format(table=table), trial_ids=trial_ids)
+    for table in _ENTITY_TABLES:
+        counts[table] = _count(db, """
+            SELECT count(*) FROM {table}
+            WHERE id IN (
+                    SELECT {column} FROM {join_table}
+                    WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM {join_table} WHERE {join_table}.{column} = {table}.id
+                        AND {join_table}.trial_id != ALL(CAST(:removed_trial_ids AS uuid[]))
+                )
+                AND {condition}
+        """.format(table=table, join_table='trials_%s' % table, column='%s_id' % table[:-1],
+                   condition=_ENTITY_CONDITIONS.get(table, 'TRUE')),
+            trial_ids=trial_ids, removed_trial_ids=removed_trial_ids)
+
+    # Documents not related to trials which aren't removed or FDA approvals and their files
+    counts['trials_documents'] = _count(db, """
+        SELECT count(*) FROM trials_documents WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+    """, trial_ids=trial_ids)
+    row = _execute(db, """
+        WITH all_removed_documents AS (
+            SELECT id, file_id FROM documents
+            WHERE id IN (
+                    SELECT document_id FROM trials_documents
+                    WHERE trial_id = ANY(CAST(:removed_trial_ids AS uuid[]))
+                )
+                AND fda_approval_id IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM trials_documents
+                    WHERE trials_documents.document_id = documents.id
+                        AND trials_documents.trial_id != ALL(CAST(:removed_trial_ids AS uuid[]))
+                )
+        ), removed_documents AS (
+            SELECT id, file_id FROM all_removed_documents
+            WHERE id IN (
+                SELECT document_id FROM trials_documents
+                WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+            )
+        )
+        SELECT
+            (SELECT count(*) FROM removed_documents) AS documents,
+            (SELECT count(*) FROM files
+             WHERE id IN (SELECT file_id FROM removed_documents)
+                AND NOT EXISTS (
+                    SELECT 1 FROM documents WHERE documents.file_id = files.id
+                        AND documents.id NOT IN (SELECT id FROM all_removed_documents)
+                )
+            ) AS files
+    """, trial_ids=trial_ids, removed_trial_ids=removed_trial_ids)[0]
+    counts['documents'] = row['documents']
+    counts['files'] = row['files']
+
+    # Risk of biases
+    counts['risk_of_biases_risk_of_bias_criterias'] = _count(db, """
+        SELECT count(*) FROM risk_of_biases_risk_of_bias_criterias
+        WHERE risk_of_bias_id IN (
+            SELECT id FROM risk_of_biases WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+        )
+    """, trial_ids=trial_ids)
+    counts['risk_of_biases'] = _count(db, """
+        SELECT count(*) FROM risk_of_biases WHERE trial_id = ANY(CAST(:trial_ids AS uuid[]))
+    """, trial_ids=trial_ids)
+
+    # Trials which didn't get records in the meantime
+    counts['trials'] = _count(db, """
+        SELECT count(*) FROM trials WHERE id = ANY(CAST(:trial_ids AS uuid[]))
+            AND NOT EXISTS (SELECT 1 FROM records WHERE records.trial_id = trials.id)
+    """, trial_ids=trial_ids)
+
+    return counts
+
+
+def _count(db, query, **params):
+    for row in db.query(query, **params):
+        return row['count']
+
+
+def _execute(db, query, **params):
+    return list(db.query(query, **params))
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import pytest
+from importlib import import_module
+from processors.base import helpers
+from processors.base.processors.trial import process_trials
+from benchmarks import fixtures
+
+
+class TestFixtures(object):
+    @pytest.mark.parametrize('table,generate_records', [
+        ('nct', fixtures.generate_nct_records),
+        ('euctr', fixtures.generate_euctr_records),
+        ('ictrp', fixtures.generate_ictrp_records),
+    ])
+    def test_generated_records_are_processed(self, conn, table, generate_records):
+        fixtures.insert_records(conn, table, generate_records(5))
+        extractors = helpers.get_variables(
+            import_module('processors.%s.extractors' % table),
+            lambda x: x.startswith('extract_'))
+
+        process_trials(conn, table, extractors)
+
+        assert conn['database']['records'].count() == 5
+
+    def test_generated_records_are_reproducible(self):
+        assert fixtures.generate_nct_records(3, seed=1) == fixtures.generate_nct_records(3, seed=1)
@@ -9,6 +9,7 @@ import dataset
 from sqlalchemy import MetaData
 from sqlalchemy.orm import sessionmaker
 import processors.base.config as config
+import processors.base.helpers as helpers
 
 # Make fixtures available to all tests
 
@@ -48,6 +49,7 @@ def conn(request):
     def teardown():
         truncate_database(conn['database'].engine)
         truncate_database(conn['warehouse'].engine)
+        helpers.clear_slug_caches()
         api_session.close()
         warehouse_session.close()
 
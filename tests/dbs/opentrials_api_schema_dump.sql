@@ -71,6 +71,9 @@ ALTER TABLE IF EXISTS ONLY public.publications DROP CONSTRAINT IF EXISTS publica
 ALTER TABLE IF EXISTS ONLY public.publications DROP CONSTRAINT IF EXISTS publications_pkey;
 ALTER TABLE IF EXISTS ONLY public.conditions DROP CONSTRAINT IF EXISTS problems_slug_unique;
 ALTER TABLE IF EXISTS ONLY public.conditions DROP CONSTRAINT IF EXISTS problems_pkey;
+ALTER TABLE IF EXISTS ONLY public.processors_watermarks DROP CONSTRAINT IF EXISTS processors_watermarks_pkey;
+ALTER TABLE IF EXISTS ONLY public.processors_migrations DROP CONSTRAINT IF EXISTS processors_migrations_pkey;
+ALTER TABLE IF EXISTS ONLY public.processors_checkpoints DROP CONSTRAINT IF EXISTS processors_checkpoints_pkey;
 ALTER TABLE IF EXISTS ONLY public.persons DROP CONSTRAINT IF EXISTS persons_slug_unique;
 ALTER TABLE IF EXISTS ONLY public.persons DROP CONSTRAINT IF EXISTS persons_pkey;
 ALTER TABLE IF EXISTS ONLY public.organisations DROP CONSTRAINT IF EXISTS organisations_slug_unique;
@@ -109,6 +112,9 @@ DROP TABLE IF EXISTS public.risk_of_biases;
 DROP TABLE IF EXISTS public.risk_of_bias_criterias;
 DROP TABLE IF EXISTS public.records;
 DROP TABLE IF EXISTS public.publications;
+DROP TABLE IF EXISTS public.processors_watermarks;
+DROP TABLE IF EXISTS public.processors_migrations;
+DROP TABLE IF EXISTS public.processors_checkpoints;
 DROP TABLE IF EXISTS public.persons;
 DROP TABLE IF EXISTS public.organisations;
 DROP TABLE IF EXISTS public.locations;
@@ -348,6 +354,39 @@ CREATE TABLE persons (
 );
 
 
+--
+-- Name: processors_checkpoints; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE TABLE processors_checkpoints (
+    name text NOT NULL,
+    value text NOT NULL,
+    updated_at timestamp with time zone NOT NULL
+);
+
+
+--
+-- Name: processors_migrations; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE TABLE processors_migrations (
+    name text NOT NULL,
+    migrated_at timestamp with time zone NOT NULL
+);
+
+
+--
+-- Name: processors_watermarks; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE TABLE processors_watermarks (
+    name text NOT NULL,
+    meta_updated timestamp with time zone NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    source_id text
+);
+
+
 --
 -- Name: publications; Type: TABLE; Schema: public; Owner: -; Tablespace: 
 --
@@ -761,6 +800,30 @@ ALTER TABLE ONLY persons
     ADD CONSTRAINT persons_slug_unique UNIQUE (slug);
 
 
+--
+-- Name: processors_checkpoints_pkey; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
+--
+
+ALTER TABLE ONLY processors_checkpoints
+    ADD CONSTRAINT processors_checkpoints_pkey PRIMARY KEY (name);
+
+
+--
+-- Name: processors_migrations_pkey; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
+--
+
+ALTER TABLE ONLY processors_migrations
+    ADD CONSTRAINT processors_migrations_pkey PRIMARY KEY (name);
+
+
+--
+-- Name: processors_watermarks_pkey; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
+--
+
+ALTER TABLE ONLY processors_watermarks
+    ADD CONSTRAINT processors_watermarks_pkey PRIMARY KEY (name);
+
+
 --
 -- Name: problems_pkey; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
 --
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+import processors.base.helpers as helpers
+import processors.base.helpers.checkpoint as checkpoint
+
+
+class TestCheckpoint(object):
+    def test_set_checkpoint(self, conn):
+        assert helpers.get_checkpoint(conn, 'name') is None
+
+        helpers.set_checkpoint(conn, 'name', 'first')
+        helpers.set_checkpoint(conn, 'name', 'second')
+
+        assert helpers.get_checkpoint(conn, 'name') == 'second'
+
+    def test_set_checkpoint_to_none_removes_it(self, conn):
+        helpers.set_checkpoint(conn, 'name', 'first')
+
+        helpers.set_checkpoint(conn, 'name', None)
+
+        assert helpers.get_checkpoint(conn, 'name') is None
+
+    def test_set_checkpoint_logs_only_its_size(self, conn):
+        with mock.patch.object(checkpoint, 'logger') as logger:
+            helpers.set_checkpoint(conn, 'name', 'secret value')
+
+        logger.debug.assert_called_once_with('Checkpoint of %s set (%s characters)', 'name', 12)
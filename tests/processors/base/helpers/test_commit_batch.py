@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import pytest
+import dataset
+import processors.base.config as config
+import processors.base.helpers as helpers
+
+
+class TestCommitBatch(object):
+    @pytest.mark.parametrize('size', [1, 2, 10])
+    def test_rolls_back_only_failed_records(self, conn, size):
+        batch = helpers.CommitBatch(conn['database'], size=size)
+
+        for name in ['source1', 'source2', 'source3']:
+            batch.begin()
+            _write_source(conn, name)
+            if name == 'source2':
+                batch.rollback()
+            else:
+                batch.commit()
+        batch.flush()
+
+        sources = conn['database']['sources'].find(order_by='id')
+        assert [source['id'] for source in sources] == ['source1', 'source3']
+
+    def test_commits_every_size_records(self, conn):
+        batch = helpers.CommitBatch(conn['database'], size=2)
+        other_db = dataset.connect(config.DATABASE_URL)
+
+        try:
+            for name in ['source1', 'source2', 'source3']:
+                batch.begin()
+                _write_source(conn, name)
+                batch.commit()
+            committed_count = other_db['sources'].count()
+            batch.flush()
+            flushed_count = other_db['sources'].count()
+        finally:
+            other_db.engine.dispose()
+
+        assert (committed_count, flushed_count) == (2, 3)
+
+
+def _write_source(conn, name):
+    conn['database']['sources'].insert({
+        'id': name,
+        'name': name,
+        'type': 'register',
+    }, ensure=False)
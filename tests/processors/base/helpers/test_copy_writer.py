@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import datetime
+import processors.base.helpers as helpers
+
+
+class TestCopyWriter(object):
+    def test_copies_rows_in_buffers(self, conn, nct_source):
+        records = [_get_record(index) for index in range(5)]
+        writer = helpers.CopyWriter(conn['database'], 'records', bufsize=2)
+
+        for record in records:
+            writer.write(record)
+        copied_count = conn['database']['records'].count()
+        writer.flush()
+
+        assert (copied_count, writer.count) == (4, 5)
+        assert conn['database']['records'].count() == 5
+
+    def test_copies_special_values(self, conn, nct_source):
+        record = dict(_get_record(0), **{
+            'public_title': 'Tab\there,\nnew line and back\\slash',
+            'eligibility_criteria': [{'inclusion': 'Adults'}],
+            'primary_outcomes': 'Primary outcome',
+            'brief_summary': None,
+            'is_primary': True,
+            'study_phase': ['Phase 1', 'N/A', 'Quote " and back\\slash'],
+            'unknown_field': 'Ignored',
+        })
+        writer = helpers.CopyWriter(conn['database'], 'records')
+
+        writer.write(record)
+        writer.flush()
+
+        copied = conn['database']['records'].find_one(id=record['id'])
+        for field in ['public_title', 'eligibility_criteria', 'primary_outcomes',
+                      'brief_summary', 'is_primary', 'registration_date']:
+            assert copied[field] == record[field]
+        # Lists are copied as written by psycopg2
+        inserted_id = conn['database']['records'].insert(dict(_get_record(1), **{
+            'study_phase': record['study_phase'],
+        }))
+        inserted = conn['database']['records'].find_one(id=inserted_id)
+        assert copied['study_phase'] == inserted['study_phase'] == \
+            '{"Phase 1",N/A,"Quote \\" and back\\\\slash"}'
+
+
+def _get_record(index):
+    return {
+        'id': uuid.uuid1().hex,
+        'source_id': 'nct',
+        'source_url': 'https://clinicaltrials.gov/ct2/show/NCT%08d' % index,
+        'identifiers': {'nct': 'NCT%08d' % index},
+        'public_title': 'Public title',
+        'registration_date': datetime.date(2016, 1, 1),
+        'created_at': datetime.datetime(2016, 1, 1, 12),
+    }
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import mock
+import hashlib
+import processors.base.helpers as helpers
+
+
+class TestDownloadCache(object):
+    def test_fetch_downloads_file_by_its_content(self, tmpdir):
+        session = _session({'http://example.org/a': b'content'})
+        cache = helpers.DownloadCache(str(tmpdir), max_size=100, session=session)
+
+        cached_file = cache.fetch('http://example.org/a')
+
+        assert cached_file.sha1 == hashlib.sha1(b'content').hexdigest()
+        assert cached_file.modified
+        with io.open(cached_file.path, 'rb') as file:
+            assert file.read() == b'content'
+
+    def test_fetch_validates_url_once_per_cache(self, tmpdir):
+        session = _session({'http://example.org/a': b'content'})
+        cache = helpers.DownloadCache(str(tmpdir), max_size=100, session=session)
+
+        cache.fetch('http://example.org/a')
+        cached_file = cache.fetch('http://example.org/a')
+
+        assert not cached_file.modified
+        assert session.get.call_count == 1
+
+    def test_fetch_revalidates_cached_files(self, tmpdir):
+        session = _session({'http://example.org/a': b'content'})
+        helpers.DownloadCache(str(tmpdir), max_size=100, session=session).fetch('http://example.org/a')
+        cache = helpers.DownloadCache(str(tmpdir), max_size=100, session=session)
+
+        cached_file = cache.fetch('http://example.org/a')
+
+        assert not cached_file.modified
+        assert session.get.call_args[1]['headers'] == {'If-None-Match': '"%s"' % cached_file.sha1}
+        assert (cache.hits, cache.misses) == (1, 0)
+
+    def test_fetch_downloads_changed_files(self, tmpdir):
+        contents = {'http://example.org/a': b'content'}
+        session = _session(contents)
+        helpers.DownloadCache(str(tmpdir), max_size=100, session=session).fetch('http://example.org/a')
+        contents['http://example.org/a'] = b'changed content'
+        cache = helpers.DownloadCache(str(tmpdir), max_size=100, session=session)
+
+        cached_file = cache.fetch('http://example.org/a')
+
+        assert cached_file.modified
+        assert cached_file.sha1 == hashlib.sha1(b'changed content').hexdigest()
+
+    def test_fetch_evicts_least_recently_used_files(self, tmpdir):
+        session = _session({
+            'http://example.org/a': b'a' * 40,
+            'http://example.org/b': b'b' * 40,
+            'http://example.org/c': b'c' * 40,
+        })
+        cache = helpers.DownloadCache(str(tmpdir), max_size=100, session=session)
+
+        cache.fetch('http://example.org/a')
+        cache.fetch('http://example.org/b')
+        cache.fetch('http://example.org/a')
+        cache.fetch('http://example.org/c')
+
+        assert cache.size == 80
+        assert cache.fetch('http://example.org/a').modified is False
+        assert cache.fetch('http://example.org/b').modified is True
+
+    def test_values_are_kept_between_caches(self, tmpdir):
+        helpers.DownloadCache(str(tmpdir), max_size=100).set_value('key', 'value')
+
+        assert helpers.DownloadCache(str(tmpdir), max_size=100).get_value('key') == 'value'
+
+
+def _session(contents):
+    def get(url, headers=None, stream=False):
+        content = contents[url]
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        response = mock.Mock(headers={'ETag': etag})
+        response.status_code = 304 if (headers or {}).get('If-None-Match') == etag else 200
+        response.iter_content.side_effect = lambda size: iter([content])
+        return response
+
+    return mock.Mock(get=mock.Mock(side_effect=get))
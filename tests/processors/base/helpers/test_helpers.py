@@ -4,6 +4,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import uuid
+import datetime
 import pytest
 import processors.base.helpers as helpers
 
@@ -53,6 +55,24 @@ class TestFindListOfIdentifiers(object):
     def test_allows_whitespace_in_identifiers(self, text, identifiers):
         assert sorted(helpers.find_list_of_identifiers(text)) == sorted(identifiers)
 
+    @pytest.mark.parametrize('text,identifiers', [
+        ('JPRN-UMIN123456789', [{'jprn': 'JPRN-UMIN123456789'}, {'jprn': 'UMIN123456789'}]),
+        ('isrctnct12345678', [{'nct': 'nct12345678'}]),
+        ('NCT12345678NCT87654321', []),
+    ])
+    def test_finds_overlapping_identifiers_of_different_prefixes(self, text, identifiers):
+        assert helpers.find_list_of_identifiers(text) == identifiers
+
+    def test_returns_identifiers_ordered_by_source(self):
+        text = 'NCT00020500 ISRCTN02018090 NCT00020501 EUCTR2013-030180-02'
+
+        assert helpers.find_list_of_identifiers(text) == [
+            {'euctr': 'EUCTR2013-030180-02'},
+            {'isrctn': 'ISRCTN02018090'},
+            {'nct': 'NCT00020500'},
+            {'nct': 'NCT00020501'},
+        ]
+
 
 class TestGetCleanedIdentifiers(object):
     @pytest.mark.parametrize('identifiers', [
@@ -149,3 +169,139 @@ class TestLocationNormalizer(object):
 
     def test_location_normalizer(self, test_input, expected):
         assert helpers.get_canonical_location_name(test_input) == expected
+
+    def test_location_normalizer_memoizes_results(self):
+        normalizer = helpers.LocationNormalizer()
+
+        assert normalizer.normalize('Chnia') == 'China'
+        assert normalizer.normalize('Chnia') == 'China'
+        assert normalizer.normalize('Outside') == 'Outside'
+        assert (normalizer.hits, normalizer.misses) == (1, 2)
+
+    def test_location_normalizer_prefers_first_exact_match(self):
+        normalizer = helpers.LocationNormalizer()
+
+        assert normalizer.normalize('Emirates, United Arab') == 'United Arab Emirates'
+
+
+class TestIterRows(object):
+    @pytest.mark.parametrize('options', [
+        {},
+        {'count': False},
+        {'keyset': True},
+        {'server_side': True},
+    ])
+    def test_yields_all_rows_in_order(self, conn, options):
+        meta_ids = _insert_nct_rows(conn, 7)
+
+        rows = helpers.iter_rows(conn, 'warehouse', 'nct', orderby='meta_id',
+                                 bufsize=3, **options)
+
+        assert [row['meta_id'] for row in rows] == sorted(meta_ids)
+
+    @pytest.mark.parametrize('options', [
+        {},
+        {'keyset': True},
+        {'server_side': True},
+    ])
+    def test_applies_filter(self, conn, options):
+        _insert_nct_rows(conn, 4)
+        nct_filter = {'nct_id': ['NCT00000001', 'NCT00000003']}
+
+        rows = helpers.iter_rows(conn, 'warehouse', 'nct', orderby='meta_id',
+                                 bufsize=1, **dict(options, **nct_filter))
+
+        assert sorted(row['nct_id'] for row in rows) == nct_filter['nct_id']
+
+    def test_keyset_supports_descending_order(self, conn):
+        meta_ids = _insert_nct_rows(conn, 5)
+
+        rows = helpers.iter_rows(conn, 'warehouse', 'nct', orderby='-meta_id',
+                                 bufsize=2, keyset=True)
+
+        assert [row['meta_id'] for row in rows] == sorted(meta_ids, reverse=True)
+
+    @pytest.mark.parametrize('options', [
+        {},
+        {'keyset': True},
+        {'server_side': True},
+    ])
+    def test_shards_split_rows_without_overlapping(self, conn, options):
+        meta_ids = _insert_nct_rows(conn, 10)
+
+        sharded_meta_ids = []
+        for index in range(3):
+            rows = helpers.iter_rows(conn, 'warehouse', 'nct', orderby='meta_id',
+                                     bufsize=2, shard=(index, 3), **options)
+            sharded_meta_ids.extend(row['meta_id'] for row in rows)
+
+        assert sorted(sharded_meta_ids) == sorted(meta_ids)
+
+    @pytest.mark.parametrize('options', [
+        {},
+        {'keyset': True},
+        {'server_side': True},
+    ])
+    def test_yields_rows_updated_since_or_without_meta_updated(self, conn, options):
+        for nct_id, meta_updated in [
+            ('NCT00000001', datetime.datetime(2017, 1, 1)),
+            ('NCT00000002', datetime.datetime(2017, 1, 2)),
+            ('NCT00000003', None),
+        ]:
+            conn['warehouse']['nct'].insert({
+                'meta_id': uuid.uuid4().hex,
+                'nct_id': nct_id,
+                'meta_updated': meta_updated,
+            })
+
+        rows = helpers.iter_rows(conn, 'warehouse', 'nct', orderby='meta_id', bufsize=1,
+                                 updated_since=datetime.datetime(2017, 1, 1), **options)
+
+        assert sorted(row['nct_id'] for row in rows) == ['NCT00000002', 'NCT00000003']
+
+    def test_doesnt_change_received_filter(self, conn):
+        _insert_nct_rows(conn, 2)
+        nct_filter = {'nct_id': 'NCT00000001'}
+
+        list(helpers.iter_rows(conn, 'warehouse', 'nct', orderby='meta_id',
+                               **nct_filter))
+
+        assert nct_filter == {'nct_id': 'NCT00000001'}
+
+
+class TestLockIdentifiers(object):
+    def test_locks_are_released_on_commit(self, conn):
+        identifiers = {'nct': 'NCT00000001', 'isrctn': 'ISRCTN00000001'}
+
+        conn['database'].begin()
+        helpers.lock_identifiers(conn, identifiers)
+        locks_count = _count_advisory_locks(conn)
+        conn['database'].commit()
+
+        assert locks_count == 2
+        assert _count_advisory_locks(conn) == 0
+
+    def test_ignores_empty_identifiers(self, conn):
+        conn['database'].begin()
+        helpers.lock_identifiers(conn, {})
+        locks_count = _count_advisory_locks(conn)
+        conn['database'].commit()
+
+        assert locks_count == 0
+
+
+def _count_advisory_locks(conn):
+    query = "SELECT count(*) AS count FROM pg_locks WHERE locktype = 'advisory'"
+    return list(conn['database'].query(query))[0]['count']
+
+
+def _insert_nct_rows(conn, count):
+    meta_ids = []
+    for index in range(count):
+        meta_id = uuid.uuid4().hex
+        conn['warehouse']['nct'].insert({
+            'meta_id': meta_id,
+            'nct_id': 'NCT%08d' % index,
+        })
+        meta_ids.append(meta_id)
+    return meta_ids
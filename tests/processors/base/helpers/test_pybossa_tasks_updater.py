@@ -4,6 +4,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 import mock
 import pbclient
 import processors.base.helpers as helpers
@@ -95,10 +96,83 @@ class TestPyBossaTasksUpdater(object):
         assert existing_tasks[0].data['info'] == tasks_data[0]
         pbclient_mock.update_task.assert_called_with(existing_tasks[0])
 
+    @mock.patch('processors.base.helpers.pybossa_tasks_updater.pbclient')
+    def test_it_doesnt_update_unchanged_tasks(self, pbclient_mock):
+        tasks_data = [
+            {'foo': 50, 'bar': {'baz': 1, 'qux': 2}},
+        ]
+        existing_tasks = [
+            _mock_task({'bar': {'qux': 2, 'baz': 1}, 'foo': 50}),
+        ]
+
+        _setup_pbclient_mock(pbclient_mock, existing_tasks)
+
+        updater = helpers.PyBossaTasksUpdater('http://example.org', 'API_KEY', None)
+        updater.run(tasks_data, ['foo'])
+
+        pbclient_mock.update_task.assert_not_called()
+        pbclient_mock.create_task.assert_not_called()
+        pbclient_mock.delete_task.assert_not_called()
+
+    @mock.patch('processors.base.helpers.pybossa_tasks_updater.pbclient')
+    def test_it_leaves_duplicate_tasks_out_of_the_snapshot(self, pbclient_mock):
+        existing_tasks = [
+            _mock_task({'foo': 50}, id=51),
+            _mock_task({'foo': 50}, id=52),
+        ]
 
-def _mock_task(info):
+        _setup_pbclient_mock(pbclient_mock, existing_tasks)
+
+        updater = helpers.PyBossaTasksUpdater('http://example.org', 'API_KEY', None)
+        snapshot = updater.run([{'foo': 50}], ['foo'])
+
+        pbclient_mock.delete_task.assert_not_called()
+        assert [task_id for task_id, _ in snapshot.values()] == [51]
+
+    @mock.patch('processors.base.helpers.pybossa_tasks_updater.pbclient')
+    def test_it_returns_snapshot_for_the_next_run(self, pbclient_mock):
+        tasks_data = [
+            {'foo': 50},
+            {'foo': 60},
+        ]
+        existing_tasks = [
+            _mock_task({'foo': 50}, id=51),
+            _mock_task({'foo': 70}, id=52),
+        ]
+
+        _setup_pbclient_mock(pbclient_mock, existing_tasks)
+        pbclient_mock.create_task.return_value = pbclient.Task({'id': 53, 'info': {'foo': 60}})
+
+        updater = helpers.PyBossaTasksUpdater('http://example.org', 'API_KEY', None)
+        snapshot = updater.run(tasks_data, ['foo'])
+
+        assert sorted(task_id for task_id, _ in snapshot.values()) == [51, 53]
+        assert json.loads(json.dumps(snapshot)) == snapshot
+
+    @mock.patch('processors.base.helpers.pybossa_tasks_updater.pbclient')
+    def test_it_fetches_only_changed_tasks_with_snapshot(self, pbclient_mock):
+        _setup_pbclient_mock(pbclient_mock, [
+            _mock_task({'foo': 50, 'bar': 1}, id=51),
+            _mock_task({'foo': 60, 'bar': 1}, id=52),
+        ])
+        updater = helpers.PyBossaTasksUpdater('http://example.org', 'API_KEY', None)
+        snapshot = updater.run([{'foo': 50, 'bar': 1}, {'foo': 60, 'bar': 1}], ['foo'])
+
+        pbclient_mock.reset_mock()
+        changed_task = _mock_task({'foo': 60, 'bar': 1}, id=52)
+        pbclient_mock.find_tasks.return_value = [changed_task]
+        updater = helpers.PyBossaTasksUpdater('http://example.org', 'API_KEY', None)
+        updater.run([{'foo': 50, 'bar': 1}, {'foo': 60, 'bar': 2}], ['foo'], snapshot=snapshot)
+
+        pbclient_mock.get_tasks.assert_not_called()
+        pbclient_mock.find_tasks.assert_called_once_with(None, id=52)
+        assert changed_task.data['info'] == {'foo': 60, 'bar': 2}
+        pbclient_mock.update_task.assert_called_once_with(changed_task)
+
+
+def _mock_task(info, id=51):
     task = mock.Mock()
-    task.id = 51
+    task.id = id
     task.data = {
         'info': info,
     }
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+import processors.base.helpers as helpers
+
+
+class TestRateLimiter(object):
+    @mock.patch('time.sleep')
+    @mock.patch('time.time', return_value=100.0)
+    def test_spaces_calls_of_the_same_key(self, time_mock, sleep_mock):
+        limiter = helpers.RateLimiter(rate=2)
+
+        limiter.wait('host')
+        limiter.wait('host')
+        limiter.wait('other host')
+        limiter.wait('host')
+
+        assert [call[0][0] for call in sleep_mock.call_args_list] == [0.5, 1.0]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+import pytest
+import processors.base.helpers as helpers
+
+
+class TestCallWithRetry(object):
+    def test_returns_result_after_failed_attempts(self):
+        func = mock.Mock(side_effect=[ValueError(), ValueError(), 'result'])
+        sleep = mock.Mock()
+
+        assert helpers.call_with_retry(func, retries=2, sleep=sleep) == 'result'
+        assert func.call_count == 3
+        assert sleep.call_count == 2
+
+    def test_raises_last_error_when_retries_are_exhausted(self):
+        func = mock.Mock(side_effect=ValueError())
+
+        with pytest.raises(ValueError):
+            helpers.call_with_retry(func, retries=2, sleep=mock.Mock())
+        assert func.call_count == 3
+
+    def test_doesnt_retry_other_errors(self):
+        func = mock.Mock(side_effect=KeyError())
+
+        with pytest.raises(KeyError):
+            helpers.call_with_retry(func, exceptions=(ValueError,), sleep=mock.Mock())
+        assert func.call_count == 1
+
+
+class TestGetBackoffDelay(object):
+    def test_delay_grows_exponentially_up_to_max_backoff(self):
+        with mock.patch('random.uniform', side_effect=lambda low, high: high):
+            delays = [helpers.get_backoff_delay(attempt, backoff=1, max_backoff=5)
+                      for attempt in range(4)]
+
+        assert delays == [1, 2, 4, 5]
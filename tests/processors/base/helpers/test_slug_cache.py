@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import pytest
+import processors.base.helpers as helpers
+import processors.base.writers as writers
+
+
+@pytest.fixture(autouse=True)
+def clear_slug_caches():
+    yield
+    helpers.clear_slug_caches()
+
+
+class TestSlugCache(object):
+    def test_returns_cached_ids(self):
+        cache = helpers.SlugCache()
+
+        cache.set('placebo', 'id1')
+
+        assert cache.get('placebo') == 'id1'
+        assert cache.get('aspirin') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_evicts_least_recently_used_slugs(self):
+        cache = helpers.SlugCache(size=2)
+
+        cache.set('placebo', 'id1')
+        cache.set('aspirin', 'id2')
+        cache.get('placebo')
+        cache.set('ibuprofen', 'id3')
+
+        assert len(cache) == 2
+        assert cache.get('aspirin') is None
+        assert cache.get('placebo') == 'id1'
+        assert cache.get('ibuprofen') == 'id3'
+
+    def test_clear_slug_caches_clears_only_given_tables(self):
+        helpers.get_slug_cache('conditions').set('asthma', 'id1')
+        helpers.get_slug_cache('locations').set('brazil', 'id2')
+
+        helpers.clear_slug_caches('conditions')
+
+        assert helpers.get_slug_cache('conditions').get('asthma') is None
+        assert helpers.get_slug_cache('locations').get('brazil') == 'id2'
+
+
+class TestFindBySlug(object):
+    def test_finds_cached_entity_without_querying(self, conn, nct_source):
+        condition_id = writers.write_condition(conn, {'name': 'Asthma'}, nct_source)
+        conn['database']['conditions'].delete(id=condition_id)
+
+        result = helpers.find_by_slug(conn, 'conditions', 'asthma')
+
+        assert result == {'id': condition_id, 'slug': 'asthma'}
+
+    def test_caches_found_entity(self, conn, nct_source):
+        condition_id = writers.write_condition(conn, {'name': 'Asthma'}, nct_source)
+        helpers.clear_slug_caches()
+
+        helpers.find_by_slug(conn, 'conditions', 'asthma')
+
+        cached_id = helpers.get_slug_cache('conditions').get('asthma')
+        assert uuid.UUID(cached_id).hex == condition_id
+
+    def test_writers_reuse_cached_entities(self, conn, nct_source):
+        first_id = writers.write_location(conn, {'name': 'Brazil'}, nct_source)
+        second_id = writers.write_location(conn, {'name': 'Brazil'}, nct_source)
+
+        assert first_id == second_id
+        assert conn['database']['locations'].count(slug='brazil') == 1
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import processors.base.helpers as helpers
+
+
+class TestStats(object):
+    def test_collects_timers_and_counters(self):
+        stats = helpers.Stats(enabled=True)
+
+        with stats.timer('extract'):
+            pass
+        with stats.timer('extract'):
+            pass
+        stats.count('processed', 2)
+
+        assert stats.timers['extract'][0] == 2
+        assert stats.counters == {'processed': 2}
+        assert 'extract' in stats.format_summary()
+
+    def test_does_nothing_if_disabled(self):
+        stats = helpers.Stats()
+
+        with stats.timer('extract'):
+            pass
+        stats.count('processed')
+        stats.end_batch()
+
+        assert (stats.timers, stats.counters, stats.batches) == ({}, {}, [])
+
+    def test_batches_contain_changes_since_previous_batch(self):
+        stats = helpers.Stats(enabled=True)
+
+        stats.count('processed', 3)
+        with stats.timer('commit'):
+            pass
+        stats.end_batch(table='nct')
+        stats.count('processed')
+        stats.end_batch(table='nct')
+
+        assert [batch['counters'] for batch in stats.batches] == [{'processed': 3}, {'processed': 1}]
+        assert [list(batch['timers']) for batch in stats.batches] == [['commit'], []]
+        assert stats.batches[0]['table'] == 'nct'
+
+    def test_merge(self):
+        stats = helpers.Stats(enabled=True)
+        other = helpers.Stats(enabled=True)
+        stats.count('processed')
+        other.count('processed', 2)
+        with other.timer('commit'):
+            pass
+        other.end_batch()
+
+        stats.merge(other)
+
+        assert stats.counters == {'processed': 3}
+        assert stats.timers['commit'][0] == 1
+        assert len(stats.batches) == 1
+
+    def test_write_json_lines(self, tmpdir):
+        stats = helpers.Stats(enabled=True)
+        stats.count('processed')
+        stats.end_batch()
+        path = tmpdir.join('stats.jsonl')
+
+        stats.write_json_lines(str(path), processor='nct')
+
+        lines = [json.loads(line) for line in path.readlines()]
+        assert [line['type'] for line in lines] == ['batch', 'summary']
+        assert all(line['processor'] == 'nct' for line in lines)
+        assert lines[1]['counters'] == {'processed': 1}
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import processors.base.helpers as helpers
+
+TRIAL1 = uuid.UUID(int=1).hex
+TRIAL2 = uuid.UUID(int=2).hex
+RECORD1 = uuid.UUID(int=11).hex
+RECORD2 = uuid.UUID(int=12).hex
+RECORD3 = uuid.UUID(int=13).hex
+RECORD4 = uuid.UUID(int=14).hex
+
+
+class TestTrialDeduplicator(object):
+    def test_plans_records_sharing_identifiers_for_one_trial(self):
+        deduplicator = helpers.TrialDeduplicator()
+        deduplicator.add_record(RECORD1, TRIAL1, {'nct': 'NCT00000001'})
+        deduplicator.add_record(RECORD2, TRIAL2, {'nct': 'NCT00000001', 'euctr': '2004-000001-01'})
+        deduplicator.add_record(RECORD3, TRIAL1, {'euctr': '2004-000001-01'})
+        deduplicator.add_record(RECORD4, None, {'isrctn': 'ISRCTN00000001'})
+
+        assert deduplicator.get_plan() == [
+            (TRIAL1, [RECORD1, RECORD2, RECORD3]),
+            (None, [RECORD4]),
+        ]
+        assert deduplicator.get_merged_records() == {RECORD2: TRIAL1}
+        assert deduplicator.get_split_records() == []
+        assert deduplicator.get_trial_identifiers() == {
+            TRIAL1: {'nct': 'NCT00000001', 'euctr': '2004-000001-01'},
+        }
+
+    def test_splits_records_of_the_smaller_group(self):
+        deduplicator = helpers.TrialDeduplicator()
+        deduplicator.add_record(RECORD1, TRIAL1, {'nct': 'NCT00000001'})
+        deduplicator.add_record(RECORD2, TRIAL1, {'nct': 'NCT00000001', 'euctr': '2004-000001-01'})
+        deduplicator.add_record(RECORD3, TRIAL1, {'isrctn': 'ISRCTN00000001'})
+
+        assert deduplicator.get_plan() == [
+            (TRIAL1, [RECORD1, RECORD2]),
+            (None, [RECORD3]),
+        ]
+        assert deduplicator.get_split_records() == [RECORD3]
+        assert deduplicator.get_merged_records() == {}
+
+    def test_primary_records_identifiers_win(self):
+        deduplicator = helpers.TrialDeduplicator()
+        deduplicator.add_record(RECORD1, TRIAL1, {'nct': 'NCT00000001', 'euctr': 'A'}, is_primary=True)
+        deduplicator.add_record(RECORD2, TRIAL1, {'nct': 'NCT00000001', 'euctr': 'B'})
+
+        assert deduplicator.get_trial_identifiers() == {
+            TRIAL1: {'nct': 'NCT00000001', 'euctr': 'A'},
+        }
+
+    def test_loads_records(self, conn, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+
+        deduplicator = helpers.TrialDeduplicator(conn)
+
+        assert deduplicator.get_plan() == [
+            (uuid.UUID(trial).hex, [uuid.UUID(record).hex]),
+        ]
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import processors.base.helpers as helpers
+
+
+class TestTrialIdentifierIndex(object):
+    def test_loads_records_identifiers(self, conn, trial, record):
+        _link_record(conn, record, trial, {'nct': 'NCT00212927'})
+
+        index = helpers.TrialIdentifierIndex(conn)
+
+        assert list(index.find_trial_ids({'nct': 'NCT00212927'})) == [trial]
+        assert list(index.find_trial_ids({'nct': 'NCT00000001'})) == []
+
+    def test_ignores_record(self, conn, trial, record):
+        _link_record(conn, record, trial, {'nct': 'NCT00212927'})
+
+        index = helpers.TrialIdentifierIndex(conn)
+        trial_ids = index.find_trial_ids({'nct': 'NCT00212927'},
+                                         ignore_record_id=record)
+
+        assert list(trial_ids) == []
+
+    def test_add_record_updates_identifiers(self, conn):
+        index = helpers.TrialIdentifierIndex(conn)
+        record_id = uuid.uuid1().hex
+        trial_id = uuid.uuid1().hex
+
+        index.add_record(record_id, trial_id, {'nct': 'NCT00000001'})
+        index.add_record(record_id, trial_id, {'isrctn': 'ISRCTN00000001'})
+
+        assert list(index.find_trial_ids({'nct': 'NCT00000001'})) == []
+        assert list(index.find_trial_ids({'isrctn': 'ISRCTN00000001'})) == [trial_id]
+
+    def test_remove_record(self, conn):
+        index = helpers.TrialIdentifierIndex(conn)
+        record_id = uuid.uuid1().hex
+        index.add_record(record_id, uuid.uuid1().hex, {'nct': 'NCT00000001'})
+
+        index.remove_record(record_id)
+
+        assert list(index.find_trial_ids({'nct': 'NCT00000001'})) == []
+
+    def test_rollback_undoes_changes_since_begin(self, conn):
+        index = helpers.TrialIdentifierIndex(conn)
+        record_id = uuid.uuid1().hex
+        trial_id = uuid.uuid1().hex
+        index.add_record(record_id, trial_id, {'nct': 'NCT00000001'})
+
+        index.begin()
+        index.add_record(record_id, uuid.uuid1().hex, {'isrctn': 'ISRCTN00000001'})
+        index.add_record(uuid.uuid1().hex, uuid.uuid1().hex, {'nct': 'NCT00000002'})
+        index.rollback()
+
+        assert list(index.find_trial_ids({'nct': 'NCT00000001'})) == [trial_id]
+        assert list(index.find_trial_ids({'isrctn': 'ISRCTN00000001'})) == []
+        assert list(index.find_trial_ids({'nct': 'NCT00000002'})) == []
+
+    def test_commit_keeps_changes_since_begin(self, conn):
+        index = helpers.TrialIdentifierIndex(conn)
+        trial_id = uuid.uuid1().hex
+
+        index.begin()
+        index.add_record(uuid.uuid1().hex, trial_id, {'nct': 'NCT00000001'})
+        index.commit()
+        index.rollback()
+
+        assert list(index.find_trial_ids({'nct': 'NCT00000001'})) == [trial_id]
+
+    def test_lazy_index_loads_records_by_identifier(self, conn, trial, record):
+        _link_record(conn, record, trial, {'nct': 'NCT00212927'})
+
+        index = helpers.TrialIdentifierIndex(conn, lazy=True)
+
+        assert list(index.find_trial_ids({'nct': 'NCT00212927'})) == [trial]
+        assert list(index.find_trial_ids({'nct': 'NCT00000001'})) == []
+
+
+class TestFindTrialByIdentifiersWithIndex(object):
+    def test_finds_the_same_trial_as_without_index(self, conn, trial, record):
+        identifiers = {'nct': 'NCT00212927'}
+        _link_record(conn, record, trial, identifiers)
+        index = helpers.TrialIdentifierIndex(conn)
+
+        expected = helpers.find_trial_by_identifiers(conn, identifiers)
+        result = helpers.find_trial_by_identifiers(conn, identifiers, index=index)
+
+        assert uuid.UUID(result['id']).hex == uuid.UUID(expected['id']).hex == trial
+
+    def test_skips_records_of_removed_trials(self, conn):
+        index = helpers.TrialIdentifierIndex(conn)
+        index.add_record(uuid.uuid1().hex, uuid.uuid1().hex, {'nct': 'NCT00000001'})
+
+        result = helpers.find_trial_by_identifiers(
+            conn, {'nct': 'NCT00000001'}, index=index)
+
+        assert result is None
+
+
+def _link_record(conn, record_id, trial_id, identifiers):
+    conn['database']['records'].update({
+        'id': record_id,
+        'trial_id': trial_id,
+        'identifiers': identifiers,
+    }, ['id'])
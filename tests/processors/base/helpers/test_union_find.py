@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import processors.base.helpers as helpers
+
+
+class TestUnionFind(object):
+    def test_groups_items_transitively(self):
+        groups = helpers.UnionFind()
+
+        groups.union('record1', ('nct', 'NCT00000001'))
+        groups.union('record2', ('nct', 'NCT00000001'))
+        groups.union('record2', ('euctr', '2004-000001-01'))
+        groups.union('record3', ('euctr', '2004-000001-01'))
+        groups.add('record4')
+
+        assert groups.find('record1') == groups.find('record3')
+        assert groups.find('record1') != groups.find('record4')
+        assert set(frozenset(group) for group in groups.groups().values()) == {
+            frozenset(['record1', 'record2', 'record3',
+                       ('nct', 'NCT00000001'), ('euctr', '2004-000001-01')]),
+            frozenset(['record4']),
+        }
+
+    def test_find_adds_unknown_items(self):
+        groups = helpers.UnionFind()
+
+        assert groups.find('record1') == 'record1'
+        assert 'record1' in groups
+        assert len(groups) == 1
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import processors.base.helpers as helpers
+
+
+class TestWatermarkTracker(object):
+    def test_watermark_is_the_latest_updated(self):
+        tracker = helpers.WatermarkTracker()
+
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 2)})
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 3)})
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 1)})
+
+        assert tracker.watermark == datetime.datetime(2017, 1, 3)
+
+    def test_watermark_doesnt_pass_failed_rows(self):
+        tracker = helpers.WatermarkTracker()
+
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 3)})
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 2)}, failed=True)
+
+        assert tracker.watermark < datetime.datetime(2017, 1, 2)
+
+    def test_merge(self):
+        tracker = helpers.WatermarkTracker()
+        other_tracker = helpers.WatermarkTracker()
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 2)})
+        other_tracker.add({'meta_updated': datetime.datetime(2017, 1, 3)})
+
+        tracker.merge(other_tracker)
+
+        assert tracker.watermark == datetime.datetime(2017, 1, 3)
+
+    def test_watermark_is_none_without_rows(self):
+        assert helpers.WatermarkTracker().watermark is None
+
+    def test_watermark_doesnt_pass_limit(self):
+        tracker = helpers.WatermarkTracker(limit=datetime.datetime(2017, 1, 2))
+
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 1)})
+        tracker.add({'meta_updated': datetime.datetime(2017, 1, 3)})
+
+        assert tracker.watermark == datetime.datetime(2017, 1, 2)
+
+
+class TestWatermark(object):
+    def test_get_returns_none_if_not_set(self, conn):
+        assert helpers.get_watermark(conn, 'nct') is None
+
+    def test_set_and_get(self, conn):
+        first = datetime.datetime(2017, 1, 1, tzinfo=_UTC())
+        second = datetime.datetime(2017, 1, 2, tzinfo=_UTC())
+
+        helpers.set_watermark(conn, 'nct', first)
+        helpers.set_watermark(conn, 'nct', second)
+
+        assert helpers.get_watermark(conn, 'nct') == second
+        assert helpers.get_watermark(conn, 'euctr') is None
+
+    def test_reset_watermarks_of_sources(self, conn):
+        meta_updated = datetime.datetime(2017, 1, 1, tzinfo=_UTC())
+        helpers.set_watermark(conn, 'nct', meta_updated, source_id='nct')
+        helpers.set_watermark(conn, 'euctr', meta_updated, source_id='euctr')
+
+        helpers.reset_watermarks(conn, ['nct'])
+
+        assert helpers.get_watermark(conn, 'nct') is None
+        assert helpers.get_watermark(conn, 'euctr') == meta_updated
+
+    def test_reset_all_watermarks(self, conn):
+        meta_updated = datetime.datetime(2017, 1, 1, tzinfo=_UTC())
+        helpers.set_watermark(conn, 'nct', meta_updated, source_id='nct')
+        helpers.set_watermark(conn, 'icdcm', meta_updated)
+
+        helpers.reset_watermarks(conn)
+
+        assert helpers.get_watermark(conn, 'nct') is None
+        assert helpers.get_watermark(conn, 'icdcm') is None
+
+    def test_get_latest_updated(self, conn, nct_record):
+        nct = conn['warehouse']['nct'].find_one(nct_id=nct_record)
+
+        assert helpers.get_latest_updated(conn, 'nct') == nct['meta_updated']
+
+
+class _UTC(datetime.tzinfo):
+    def utcoffset(self, dt):
+        return datetime.timedelta(0)
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
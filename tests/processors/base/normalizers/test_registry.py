@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import mock
+import pytest
+from processors.base import normalizers
+from processors.base.normalizers import registry
+
+
+class TestVariationsTable(object):
+    def test_loads_table_once_on_first_use(self, tmpdir):
+        path = tmpdir.join('genders.json')
+        path.write(json.dumps({'M': ['male'], 'F': ['female']}))
+        table = normalizers.VariationsTable(str(path))
+        path.remove()
+
+        with pytest.raises(IOError):
+            table.get('M')
+        path.write(json.dumps({'M': ['male']}))
+
+        assert table.get('M') == ('male',)
+        path.write(json.dumps({}))
+        assert dict(table) == {'M': ('male',)}
+
+    def test_is_immutable(self, tmpdir):
+        path = tmpdir.join('genders.json')
+        path.write(json.dumps({'M': ['male']}))
+        table = normalizers.VariationsTable(str(path))
+
+        with pytest.raises(TypeError):
+            table['F'] = ('female',)
+        with pytest.raises(AttributeError):
+            table['M'].append('female')
+
+
+class TestRegistry(object):
+    def test_registers_new_tables(self, tmpdir):
+        path = tmpdir.join('statuses.json')
+        path.write(json.dumps({'Recruiting': 'ongoing'}))
+
+        with mock.patch.dict(registry._tables):
+            normalizers.register_variations_table('status', str(path))
+
+            assert normalizers.get_variations_table('status')['Recruiting'] == 'ongoing'
+        with pytest.raises(KeyError):
+            normalizers.get_variations_table('status')
+
+    def test_phase_suggestions_are_not_shared(self):
+        suggestions = normalizers.get_normalized_phase('I-IIA')
+        suggestions.append('Phase 4')
+
+        assert normalizers.get_normalized_phase('I-IIA') == ['Phase 1', 'Phase 2A']
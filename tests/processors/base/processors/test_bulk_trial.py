@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import pytest
+from importlib import import_module
+from processors.base import helpers
+from processors.base import writers
+from processors.base.processors.trial import process_trials
+from processors.base.processors.bulk_trial import bulk_load_trials
+from benchmarks import fixtures
+
+
+class TestBulkTrialLoader(object):
+    def test_loads_the_same_trials_as_process_trials(self, conn, registries):
+        _insert_records(conn)
+        for table, extractors in registries:
+            process_trials(conn, table, extractors, full=True)
+        expected = _get_loaded_data(conn)
+        _delete_loaded_data(conn)
+
+        bulk_load_trials(conn, registries, bufsize=7)
+
+        assert _get_loaded_data(conn) == expected
+
+    def test_keeps_ids_of_existing_trials_and_entities(self, conn, registries):
+        _insert_records(conn)
+        process_trials(conn, 'nct', registries[0][1])
+        trial_ids = _get_trial_ids(conn)
+        condition_ids = {row['slug']: row['id'] for row in conn['database']['conditions']}
+        relationships_count = conn['database']['trials_conditions'].count()
+
+        bulk_load_trials(conn, registries[:1])
+
+        assert _get_trial_ids(conn) == trial_ids
+        assert {row['slug']: row['id'] for row in conn['database']['conditions']} == condition_ids
+        assert conn['database']['trials_conditions'].count() == relationships_count
+
+    def test_replaces_existing_records_with_the_same_source_url(self, conn, registries, record):
+        _insert_records(conn)
+        nct_record = next(iter(conn['warehouse']['nct'].find(order_by='meta_id')))
+        conn['database']['records'].update({
+            'id': record,
+            'source_url': nct_record['meta_source'],
+        }, ['id'])
+
+        bulk_load_trials(conn, registries[:1])
+
+        records = list(conn['database']['records'].find(source_url=nct_record['meta_source']))
+        assert [uuid.UUID(row['id']).hex for row in records] == [uuid.UUID(nct_record['meta_id']).hex]
+        assert conn['database']['records'].find_one(id=record) is None
+
+    def test_sets_watermarks_and_drops_staging_tables(self, conn, registries):
+        _insert_records(conn)
+
+        bulk_load_trials(conn, registries)
+
+        for table, _ in registries:
+            assert helpers.get_watermark(conn, table) is not None
+        staging_tables = conn['database'].query(
+            "SELECT tablename FROM pg_tables WHERE tablename LIKE 'bulk\\_%'")
+        assert list(staging_tables) == []
+
+
+@pytest.fixture
+def registries():
+    return [
+        (table, helpers.get_variables(import_module('processors.%s.extractors' % table),
+                                      lambda x: x.startswith('extract_')))
+        for table in ['nct', 'euctr', 'ictrp']
+    ]
+
+
+def _insert_records(conn):
+    fixtures.insert_records(conn, 'nct', fixtures.generate_nct_records(10))
+    fixtures.insert_records(conn, 'euctr', fixtures.generate_euctr_records(6))
+    fixtures.insert_records(conn, 'ictrp', fixtures.generate_ictrp_records(10))
+
+
+def _get_trial_ids(conn):
+    return {row['id']: row['trial_id'] for row in conn['database']['records']}
+
+
+def _get_loaded_data(conn):
+    db = conn['database']
+    records = {}
+    for row in db['records']:
+        records.setdefault(row['trial_id'], set()).add((row['id'], row['is_primary']))
+    # Every written column but ids and timestamps
+    trial_fields = set(writers.get_trial_data({'identifiers': {}, 'public_title': ''}, None))
+    record_fields = set(writers.get_record_data(
+        {'meta_updated': None, 'meta_source': None}, None, None,
+        {'identifiers': {}, 'public_title': ''}, False)) - {'trial_id', 'updated_at'}
+    data = {
+        'trials': {
+            frozenset(records[row['id']]): {field: row[field] for field in trial_fields}
+            for row in db['trials']},
+        'records': {
+            row['id']: {field: row[field] for field in record_fields}
+            for row in db['records']},
+        'documents': set((row['source_url'], row['document_category_id']) for row in db['documents']),
+    }
+    for entity in ['condition', 'intervention', 'location', 'organisation', 'person']:
+        names = {row['id']: row['name'] for row in db['%ss' % entity]}
+        data[entity] = set(
+            (frozenset(records[row['trial_id']]), names[row['%s_id' % entity]], row.get('role'))
+            for row in db['trials_%ss' % entity])
+    return data
+
+
+def _delete_loaded_data(conn):
+    for table in [
+        'trials_conditions', 'trials_interventions', 'trials_locations',
+        'trials_organisations', 'trials_persons', 'trials_documents', 'documents',
+        'conditions', 'interventions', 'locations', 'organisations', 'persons',
+        'records', 'trials', 'processors_watermarks',
+    ]:
+        conn['database'][table].delete()
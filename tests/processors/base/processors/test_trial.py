@@ -6,9 +6,15 @@ from __future__ import unicode_literals
 
 import pytest
 import uuid
+import mock
+import datetime
+import sqlalchemy.exc
+from processors.base import config
+from processors.base import writers
 from processors.base import helpers
 import processors.nct.extractors as nct_extractors
 from processors.base.processors.trial import process_trials
+from processors.base.processors.trial import _process_trials_rows
 
 
 class TestTrialProcessor(object):
@@ -32,8 +38,138 @@ class TestTrialProcessor(object):
         assert updated_current_primary['is_primary'] == False
         assert new_record['is_primary'] ==  True
 
+    def test_processes_records_in_parallel_shards(self, conn, extractors, nct_source):
+        nct_ids = ['NCT%08d' % index for index in range(1, 7)]
+        for nct_id in nct_ids:
+            _insert_nct_record(conn, nct_id)
+
+        process_trials(conn, 'nct', extractors, workers=3)
+
+        records = conn['database']['records'].find(source_id='nct')
+        assert sorted(record['identifiers']['nct'] for record in records) == nct_ids
+        assert conn['database']['trials'].count() == len(nct_ids)
+
+    def test_doesnt_find_trials_of_rolled_back_records(self, conn, extractors, nct_source):
+        for nct_id in ['NCT00000001', 'NCT00000002']:
+            _insert_nct_record(conn, nct_id, secondary_ids=['ISRCTN12345678'])
+        extract_conditions = extractors['extract_conditions']
+        def failing_extract_conditions(record):
+            if record['nct_id'] == 'NCT00000001':
+                raise ValueError('Invalid record')
+            return extract_conditions(record)
+        extractors['extract_conditions'] = failing_extract_conditions
+
+        with mock.patch.object(config.SENTRY, 'captureException'):
+            process_trials(conn, 'nct', extractors, commit_batch_size=2)
+
+        record = conn['database']['records'].find_one()
+        trial = conn['database']['trials'].find_one()
+        assert conn['database']['records'].count() == 1
+        assert conn['database']['trials'].count() == 1
+        assert record['identifiers']['nct'] == 'NCT00000002'
+        assert record['trial_id'] == trial['id']
+
+    def test_retries_shard_conflicts_without_cached_rolled_back_entities(self, conn, extractors,
+        nct_source):
+        _insert_nct_record(conn, 'NCT00000001', conditions=['Asthma'])
+        write_trial_relationships = writers.write_trial_relationships
+        calls = []
+        def conflicting_write_trial_relationships(conn, entity_name, relationships):
+            calls.append(entity_name)
+            if calls == ['condition']:
+                raise sqlalchemy.exc.IntegrityError('INSERT', {}, Exception('Conflict'))
+            return write_trial_relationships(conn, entity_name, relationships)
+
+        with mock.patch.object(writers, 'write_trial_relationships',
+                               conflicting_write_trial_relationships):
+            success, failed, _ = _process_trials_rows(conn, 'nct', extractors, nct_source,
+                                                      shard=(0, 1))
+
+        condition = conn['database']['conditions'].find_one(slug='asthma')
+        assert (success, failed) == (1, 0)
+        assert condition is not None
+        assert conn['database']['trials_conditions'].count(condition_id=condition['id']) == 1
+
+    def test_processes_only_records_updated_since_last_run(self, conn, extractors, nct_source):
+        _insert_nct_record(conn, 'NCT00000001')
+        process_trials(conn, 'nct', extractors)
+        _insert_nct_record(conn, 'NCT00000002', meta_updated=datetime.date(2017, 1, 1))
+        conn['database']['records'].delete()
+
+        process_trials(conn, 'nct', extractors)
+
+        records = conn['database']['records'].find(source_id='nct')
+        assert [record['identifiers']['nct'] for record in records] == ['NCT00000002']
+
+    def test_processes_all_records_if_full(self, conn, extractors, nct_source):
+        _insert_nct_record(conn, 'NCT00000001')
+        process_trials(conn, 'nct', extractors)
+        conn['database']['records'].delete()
+
+        process_trials(conn, 'nct', extractors, full=True)
+
+        assert conn['database']['records'].count(source_id='nct') == 1
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_collects_stats_if_enabled(self, conn, extractors, nct_source, workers):
+        for nct_id in ['NCT00000001', 'NCT00000002']:
+            _insert_nct_record(conn, nct_id)
+        # Shards would race to create the shared document category and retry
+        # the losing record, so it's created beforehand to count stages exactly
+        writers.write_document_category(conn, extractors['extract_document_category'](None))
+        stats = helpers.reset_stats(enabled=True)
+
+        try:
+            process_trials(conn, 'nct', extractors, workers=workers)
+        finally:
+            helpers.reset_stats(enabled=False)
+
+        assert stats.counters == {'processed': 2}
+        assert stats.timers['find_trial'][0] == 2
+        assert stats.timers['write_trial'][0] == 2
+        assert stats.timers['write_record'][0] == 2
+        # Every record is committed and every worker flushes once at the end
+        assert stats.timers['commit'][0] == 2 + workers
+        assert 'extract' in stats.timers
+
+    def test_commits_in_batches_rolling_back_failed_records(self, conn, extractors, nct_source):
+        for nct_id in ['NCT00000001', 'NCT00000002', 'NCT00000003']:
+            _insert_nct_record(conn, nct_id)
+        extract_conditions = extractors['extract_conditions']
+        def failing_extract_conditions(record):
+            if record['nct_id'] == 'NCT00000002':
+                raise ValueError('Invalid record')
+            return extract_conditions(record)
+        extractors['extract_conditions'] = failing_extract_conditions
+
+        with mock.patch.object(config.SENTRY, 'captureException') as capture_exception:
+            process_trials(conn, 'nct', extractors, commit_batch_size=2)
+
+        records = conn['database']['records'].find()
+        assert sorted(record['identifiers']['nct'] for record in records) == ['NCT00000001', 'NCT00000003']
+        assert conn['database']['trials'].count() == 2
+        capture_exception.assert_called_once()
+        assert capture_exception.call_args[1]['extra']['record']['nct_id'] == 'NCT00000002'
+
 
 @pytest.fixture
 def extractors():
     return helpers.get_variables(nct_extractors,
         lambda x: x.startswith('extract_'))
+
+
+def _insert_nct_record(conn, nct_id, meta_updated=datetime.date(2016, 12, 11),
+                       conditions=None, secondary_ids=None):
+    conn['warehouse']['nct'].insert({
+        'meta_id': uuid.uuid1().hex,
+        'meta_source': 'https://clinicaltrials.gov/ct2/show/%s' % nct_id,
+        'meta_created': datetime.date(2016, 12, 11),
+        'meta_updated': meta_updated,
+        'nct_id': nct_id,
+        'brief_title': 'Public title %s' % nct_id,
+        'official_title': 'Scientific title',
+        'clinical_results': False,
+        'firstreceived_date': datetime.date(2016, 1, 1),
+        'conditions': conditions,
+        'secondary_ids': secondary_ids,
+    })
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import processors.base.writers as writers
+
+
+class TestTrialRelationshipsWriter(object):
+    def test_writes_relationships_of_several_trials(self, conn, nct_source, trial):
+        other_trial = _create_trial(conn, trial)
+        first_id = writers.write_condition(conn, {'name': 'Asthma'}, nct_source)
+        second_id = writers.write_condition(conn, {'name': 'Cancer'}, nct_source)
+
+        writers.write_trial_relationships(conn, 'condition', [
+            ({}, first_id, trial),
+            ({}, second_id, trial),
+            ({}, first_id, other_trial),
+        ])
+
+        assert _get_entity_ids(conn, 'condition', trial) == sorted([first_id, second_id])
+        assert _get_entity_ids(conn, 'condition', other_trial) == [first_id]
+
+    def test_updates_role_of_existing_relationships(self, conn, nct_source, trial):
+        location_id = writers.write_location(conn, {'name': 'Brazil'}, nct_source)
+        writers.write_trial_relationship(
+            conn, 'location', {'trial_role': 'other'}, location_id, trial)
+
+        writers.write_trial_relationships(conn, 'location', [
+            ({'trial_role': 'other'}, location_id, trial),
+            ({'trial_role': 'recruitment_countries'}, location_id, trial),
+        ])
+
+        relationships = list(conn['database']['trials_locations'].find(trial_id=trial))
+        assert len(relationships) == 1
+        assert relationships[0]['role'] == 'recruitment_countries'
+
+    def test_ignores_empty_relationships(self, conn):
+        writers.write_trial_relationships(conn, 'condition', [])
+
+        assert conn['database']['trials_conditions'].count() == 0
+
+
+class TestDeleteTrialRelationships(object):
+    def test_deletes_only_given_trial_relationships(self, conn, nct_source, trial):
+        other_trial = _create_trial(conn, trial)
+        condition_id = writers.write_condition(conn, {'name': 'Asthma'}, nct_source)
+        location_id = writers.write_location(conn, {'name': 'Brazil'}, nct_source)
+        writers.write_trial_relationships(conn, 'condition', [
+            ({}, condition_id, trial),
+            ({}, condition_id, other_trial),
+        ])
+        writers.write_trial_relationship(conn, 'location', {}, location_id, trial)
+
+        writers.delete_trial_relationships(conn, ['condition', 'location'], trial)
+
+        assert _get_entity_ids(conn, 'condition', trial) == []
+        assert _get_entity_ids(conn, 'location', trial) == []
+        assert _get_entity_ids(conn, 'condition', other_trial) == [condition_id]
+
+
+def _create_trial(conn, trial_id):
+    other_trial = conn['database']['trials'].find_one(id=trial_id)
+    other_trial.update({
+        'id': uuid.uuid1().hex,
+        'identifiers': {'nct': 'NCT00000001'},
+    })
+    return conn['database']['trials'].insert(other_trial)
+
+
+def _get_entity_ids(conn, entity_name, trial_id):
+    relationships = conn['database']['trials_%ss' % entity_name].find(trial_id=trial_id)
+    return sorted(uuid.UUID(relationship['%s_id' % entity_name]).hex
+                  for relationship in relationships)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import gzip
+import json
+import uuid
+import processors.contentmine.processor as processor
+
+
+class TestContentmineProcessor(object):
+    def test_writes_trials_as_json_lines(self, conn, tmpdir, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial, 'primary_id': 'NCT00212927'}, ['id'])
+        path = str(tmpdir.join('trials.jsonl'))
+
+        processor.process({}, conn, path)
+
+        with io.open(path, 'rb') as file:
+            trials = [json.loads(line.decode('utf-8')) for line in file]
+        assert trials == [{
+            'internal_id': uuid.UUID(trial).hex,
+            'title': 'Continuity of Care and Outcomes After Discharge From Hospital',
+            'terms': ['NCT00212927', 'Patient Outcomes After Discharge From Hospital'],
+        }]
+
+    def test_writes_trials_ordered_by_id_as_gzipped_json(self, conn, tmpdir, trial, record):
+        trial_object = conn['database']['trials'].find_one(id=trial)
+        other_trial = dict(trial_object, id=uuid.uuid1().hex, public_title='Other trial')
+        conn['database']['trials'].insert(other_trial)
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        record_object = conn['database']['records'].find_one(id=record)
+        conn['database']['records'].insert(dict(record_object,
+            id=uuid.uuid1().hex, trial_id=other_trial['id'], source_url='http://example.com'))
+        path = str(tmpdir.join('trials.json.gz'))
+
+        processor.process({}, conn, path)
+
+        with gzip.open(path, 'rb') as file:
+            trials = json.loads(file.read().decode('utf-8'))
+        assert [row['internal_id'] for row in trials] == sorted(
+            uuid.UUID(id).hex for id in [trial, other_trial['id']])
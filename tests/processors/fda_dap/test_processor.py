@@ -4,7 +4,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
 import mock
+import pytest
+import hashlib
+import PyPDF2
+import concurrent.futures
 import processors.fda_dap.processor as processor
 
 
@@ -21,3 +26,93 @@ class TestFDADAPProcessor(object):
         processor._create_source(conn)
 
         write_mock.assert_called_with(conn, expected_source)
+
+    @mock.patch('boto3.client')
+    def test_upload_to_s3_reuses_client(self, client_mock):
+        conf = {
+            'AWS_S3_REGION': 'region',
+            'AWS_ACCESS_KEY_ID': 'key',
+            'AWS_SECRET_ACCESS_KEY': 'secret',
+            'AWS_S3_BUCKET': 'bucket',
+            'AWS_S3_CUSTOM_DOMAIN': 'http://example.org',
+        }
+        fda_processor = processor.FDADAPProcessor(conf, {})
+        try:
+            url = fda_processor._upload_to_s3(io.BytesIO(b'pdf'), 'sha1')
+            fda_processor._upload_to_s3(io.BytesIO(b'pdf'), 'sha2')
+        finally:
+            fda_processor.close()
+
+        assert url == 'http://example.org/documents/fda/sha1.pdf'
+        assert client_mock.call_count == 1
+        assert client_mock.return_value.upload_fileobj.call_count == 2
+
+    def test_upsert_file_skips_pdfs_merged_and_uploaded_before(self, conn, tmpdir):
+        pdfs = {'http://example.org/1.pdf': _pdf(1), 'http://example.org/2.pdf': _pdf(2)}
+        session = _session(pdfs, etags=True)
+        conf = {'DOWNLOAD_CACHE_PATH': str(tmpdir)}
+        document = {'urls': ['http://example.org/1.pdf', 'http://example.org/2.pdf']}
+
+        file_ids = []
+        with mock.patch('requests.Session', return_value=session), \
+                mock.patch.object(processor.FDADAPProcessor, '_upload_to_s3',
+                                  return_value='http://example.org/merged.pdf') as upload_mock:
+            for _ in range(2):
+                fda_processor = processor.FDADAPProcessor(conf, conn)
+                try:
+                    file_ids.append(fda_processor._upsert_file(document, {}))
+                finally:
+                    fda_processor.close()
+
+        assert file_ids[0] == file_ids[1]
+        assert upload_mock.call_count == 1
+        assert [response.status_code for response in session.responses] == [200, 200, 304, 304]
+
+
+class TestDownloadAndMergePDFs(object):
+    def test_merges_pdfs_in_order_and_hashes_the_result(self):
+        session = _session({'http://example.org/1.pdf': _pdf(1), 'http://example.org/2.pdf': _pdf(2)})
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        urls = ['http://example.org/2.pdf', 'http://example.org/1.pdf']
+        merger = processor.DownloadAndMergePDFs(urls, session=session, executor=executor)
+
+        with merger as pdf_file:
+            content = pdf_file.read()
+        executor.shutdown()
+
+        assert merger.sha1 == hashlib.sha1(content).hexdigest()
+        assert PyPDF2.PdfFileReader(io.BytesIO(content)).getNumPages() == 3
+
+    def test_raises_download_errors(self):
+        session = _session({'http://example.org/1.pdf': _pdf(1)})
+        urls = ['http://example.org/1.pdf', 'http://example.org/missing.pdf']
+        merger = processor.DownloadAndMergePDFs(urls, session=session)
+
+        with pytest.raises(ValueError):
+            with merger:
+                pass
+
+
+def _pdf(pages):
+    writer = PyPDF2.PdfFileWriter()
+    for _ in range(pages):
+        writer.addBlankPage(width=72, height=72)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _session(pdfs, etags=False):
+    def get(url, headers=None, stream=False):
+        content = pdfs.get(url, b'')
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        response = mock.Mock(headers={'ETag': etag} if etags else {})
+        response.status_code = 304 if (headers or {}).get('If-None-Match') == etag else 200
+        if url not in pdfs:
+            response.raise_for_status.side_effect = ValueError('Not found')
+        response.iter_content.side_effect = lambda size: iter([content[:size], content[size:]])
+        session.responses.append(response)
+        return response
+
+    session = mock.Mock(get=mock.Mock(side_effect=get), responses=[])
+    return session
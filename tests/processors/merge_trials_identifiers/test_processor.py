@@ -4,7 +4,6 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import mock
 import uuid
 import datetime
 import collections
@@ -77,26 +76,28 @@ class TestMergeTrialIdentifiersProcessor(object):
         assert updated_trial['identifiers'] == record_attrs['identifiers']
 
 
-    def test_doesnt_update_identifiers_if_theyre_a_subset_of_the_trials_identifiers(self):
-        query_result = [
-            {
-                'id': uuid.uuid1(),
-                'trial_identifiers': {'nct': 'NCT00000', 'ictrp': 'ICTRP0000000'},
-                'records_identifiers': {'ictrp': 'ICTRP0000000'},
-            },
-        ]
-        db_mock = mock.MagicMock()
-        db_mock['trials'] = mock.Mock()
-        db_mock.query.return_value = query_result
+    def test_doesnt_update_identifiers_if_theyre_a_subset_of_the_trials_identifiers(self,
+        conn, trial, record):
+        trial_attrs = {
+            'id': trial,
+            'identifiers': {'nct': 'NCT00000', 'ictrp': 'ICTRP0000000'},
+            'updated_at': datetime.datetime(2017, 1, 1),
+        }
+        conn['database']['trials'].update(trial_attrs, ['id'])
+        record_attrs = {
+            'id': record,
+            'trial_id': trial,
+            'identifiers': {'ictrp': 'ICTRP0000000'},
+        }
+        conn['database']['records'].update(record_attrs, ['id'])
 
-        conf = {}
-        conn = {'database': db_mock}
-        processor.process(conf, conn)
+        processor.process({}, conn)
+        updated_trial = conn['database']['trials'].find_one(id=trial)
 
-        db_mock['trials'].update.assert_not_called()
+        assert updated_trial['updated_at'].replace(tzinfo=None) == trial_attrs['updated_at']
 
 
-    def test_ignores_identifiers_order(self):
+    def test_ignores_identifiers_order(self, conn, trial, record):
         trial_identifiers = collections.OrderedDict([
             ('nct', 'NCT000000'),
             ('drks', 'DRKS0000000'),
@@ -107,19 +108,48 @@ class TestMergeTrialIdentifiersProcessor(object):
         ])
         assert trial_identifiers.items() != record_identifiers.items(), \
             'Identifiers items must be different unless sorted'
-        query_result = [
-            {
-                'id': uuid.uuid1(),
-                'trial_identifiers': trial_identifiers,
-                'records_identifiers': record_identifiers,
-            },
-        ]
-        db_mock = mock.MagicMock()
-        db_mock['trials'] = mock.Mock()
-        db_mock.query.return_value = query_result
-
-        conf = {}
-        conn = {'database': db_mock}
-        processor.process(conf, conn)
-
-        db_mock['trials'].update.assert_not_called()
+        trial_attrs = {
+            'id': trial,
+            'identifiers': trial_identifiers,
+            'updated_at': datetime.datetime(2017, 1, 1),
+        }
+        conn['database']['trials'].update(trial_attrs, ['id'])
+        record_attrs = {
+            'id': record,
+            'trial_id': trial,
+            'identifiers': record_identifiers,
+        }
+        conn['database']['records'].update(record_attrs, ['id'])
+
+        processor.process({}, conn)
+        updated_trial = conn['database']['trials'].find_one(id=trial)
+
+        assert updated_trial['updated_at'].replace(tzinfo=None) == trial_attrs['updated_at']
+
+
+    def test_moves_records_of_duplicate_trials(self, conn, trial, record):
+        duplicate_trial = _copy_row(conn, 'trials', trial)
+        duplicate_record = _copy_row(conn, 'records', record, **{
+            'trial_id': duplicate_trial,
+            'identifiers': {'nct': 'NCT00212927', 'euctr': 'EUCTR2005-000001-01'},
+            'source_url': 'https://www.clinicaltrialsregister.eu/ctr-search/trial/2005-000001-01/GB',
+        })
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        _copy_row(conn, 'records', record, **{
+            'is_primary': False,
+            'source_url': 'http://apps.who.int/trialsearch/Trial3.aspx?trialid=NCT00212927',
+        })
+
+        processor.process({}, conn)
+        moved_record = conn['database']['records'].find_one(id=duplicate_record)
+        updated_trial = conn['database']['trials'].find_one(id=trial)
+
+        assert uuid.UUID(moved_record['trial_id']).hex == trial
+        assert moved_record['is_primary'] == False
+        assert updated_trial['identifiers'] == {'nct': 'NCT00212927', 'euctr': 'EUCTR2005-000001-01'}
+
+
+def _copy_row(conn, table, row_id, **fields):
+    row = conn['database'][table].find_one(id=row_id)
+    row.update(fields, id=uuid.uuid1().hex)
+    return conn['database'][table].insert(row)
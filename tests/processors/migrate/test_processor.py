@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import processors.base.helpers as helpers
+import processors.migrate.processor as processor
+
+
+class TestMigrateProcessor(object):
+    def test_creates_processors_tables(self, conn):
+        conn['database'].query("""
+            DROP TABLE processors_watermarks, processors_checkpoints, processors_migrations
+        """)
+
+        processor.process({}, conn)
+
+        helpers.set_watermark(conn, 'nct', datetime.datetime(2017, 1, 1), source_id='nct')
+        helpers.set_checkpoint(conn, 'name', 'value')
+        assert helpers.get_checkpoint(conn, 'name') == 'value'
+        assert sorted(row['name'] for row in conn['database']['processors_migrations']) == [
+            '0001_processors_tables', '0002_watermarks_source_id']
+
+    def test_applies_migrations_once(self, conn):
+        conn['database'].query("""
+            DROP TABLE processors_watermarks, processors_checkpoints, processors_migrations
+        """)
+        processor.process({}, conn)
+
+        processor.process({}, conn)
+
+        assert conn['database']['processors_migrations'].count() == 2
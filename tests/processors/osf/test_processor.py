@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+import uuid
+import pytest
+import processors.base.helpers as helpers
+import processors.osf.processor as processor
+
+
+class TestOSFProcessor(object):
+    def test_read_trial_groups_pages_on_trial_ids(self, conn, trials):
+        groups = list(processor._read_trial_groups(conn, limit=2))
+
+        assert [[trial['id'] for trial in group] for group in groups] == [trials[:2], trials[2:]]
+
+    def test_read_trial_groups_starts_after_id(self, conn, trials):
+        groups = list(processor._read_trial_groups(conn, limit=2, after_id=trials[0]))
+
+        assert [[trial['id'] for trial in group] for group in groups] == [trials[1:]]
+
+    def test_process_continues_from_checkpoint(self, conn, conf, trials, session):
+        helpers.set_checkpoint(conn, 'osf', trials[0])
+
+        processor.process(conf, conn)
+
+        assert _get_exported_ids(session) == trials[1:]
+        assert helpers.get_checkpoint(conn, 'osf') is None
+
+    def test_process_keeps_checkpoint_of_last_exported_trials_on_failure(self, conn, conf, trials, session):
+        session.post.side_effect = [
+            _response(200, {'data': {'attributes': {'token': 'token'}}}),
+            _response(409),
+            _response(201),
+            _response(409),
+            _response(500),
+        ]
+
+        with mock.patch.object(processor, '_LIMIT', 2), mock.patch.object(processor, '_RETRIES', 0):
+            processor.process(conf, conn)
+
+        assert helpers.get_checkpoint(conn, 'osf') == trials[1]
+
+    def test_iter_prefetched_stops_reading_when_closed(self):
+        items = processor._iter_prefetched(iter(range(100)))
+
+        assert next(items) == 0
+        items.close()
+
+
+# Fixtures
+
+@pytest.fixture
+def conf():
+    return {
+        'OSF_URL': 'http://osf.example.com',
+        'OSF_KEY': 'key',
+        'OSF_NAMESPACE': 'namespace',
+    }
+
+
+@pytest.fixture
+def trials(conn, trial):
+    trial_object = conn['database']['trials'].find_one(id=trial)
+    for _ in range(2):
+        conn['database']['trials'].insert(dict(trial_object, id=uuid.uuid1().hex))
+    return sorted(str(row['id']) for row in conn['database']['trials'])
+
+
+@pytest.fixture
+def session():
+    session = mock.Mock(headers={})
+
+    def post(url, json=None, headers=None):
+        if url.endswith('/auth'):
+            return _response(200, {'data': {'attributes': {'token': 'token'}}})
+        if url.endswith('/collections'):
+            return _response(409)
+        return _response(201)
+
+    session.post.side_effect = post
+    with mock.patch.object(processor.requests, 'Session', return_value=session):
+        yield session
+
+
+def _response(status_code, data=None):
+    return mock.Mock(status_code=status_code, json=mock.Mock(return_value=data))
+
+
+def _get_exported_ids(session):
+    ids = []
+    for call in session.post.call_args_list:
+        if call[0][0].endswith('/documents'):
+            ids.extend(document['id'] for document in call[1]['json']['data'])
+    return ids
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import uuid
+import mock
+import datetime
+import processors.base.helpers as helpers
+import processors.record_remover.processor as processor
+
+
+class TestRecordRemoverProcessor(object):
+    def test_removes_records_without_identifiers_shared_with_the_trial(self, conn, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        related_record = _copy_record(conn, record, {'nct': 'NCT00212927', 'euctr': '2005-000001-01'})
+        unrelated_record = _copy_record(conn, record, {'isrctn': 'ISRCTN71203361'})
+
+        processor.process({}, conn)
+
+        records_ids = [uuid.UUID(row['id']).hex for row in conn['database']['records']]
+        assert sorted(records_ids) == sorted(uuid.UUID(id).hex for id in [record, related_record])
+        assert uuid.UUID(unrelated_record).hex not in records_ids
+
+    def test_removes_records_in_batches(self, conn, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        unrelated_records = [
+            _copy_record(conn, record, {'isrctn': 'ISRCTN71203361'}),
+            _copy_record(conn, record, {'actrn': 'ACTRN12611000001001'}),
+            _copy_record(conn, record, {'jprn': 'JPRN-UMIN000000001'}),
+        ]
+
+        with mock.patch.object(processor, '_BATCH_SIZE', 2):
+            processor.process({}, conn)
+
+        records_ids = [uuid.UUID(row['id']).hex for row in conn['database']['records']]
+        assert records_ids == [uuid.UUID(record).hex]
+        assert not set(uuid.UUID(id).hex for id in unrelated_records) & set(records_ids)
+
+    def test_resets_watermarks_of_removed_records_sources(self, conn, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        unrelated_record = _copy_record(conn, record, {'isrctn': 'ISRCTN71203361'})
+        source_id = conn['database']['records'].find_one(id=unrelated_record)['source_id']
+        helpers.set_watermark(conn, 'registry', datetime.datetime(2017, 1, 1), source_id=source_id)
+
+        processor.process({}, conn)
+
+        assert helpers.get_watermark(conn, 'registry') is None
+
+    def test_removes_records_trial_by_trial_in_per_trial_mode(self, conn, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        related_record = _copy_record(conn, record, {'nct': 'NCT00212927', 'euctr': '2005-000001-01'})
+        unrelated_record = _copy_record(conn, record, {'isrctn': 'ISRCTN71203361'})
+
+        processor.process({}, conn, 'per_trial')
+
+        records_ids = [uuid.UUID(row['id']).hex for row in conn['database']['records']]
+        assert sorted(records_ids) == sorted(uuid.UUID(id).hex for id in [record, related_record])
+        assert uuid.UUID(unrelated_record).hex not in records_ids
+
+    def test_only_reports_records_to_remove_on_dry_run(self, conn, trial, record):
+        conn['database']['records'].update({'id': record, 'trial_id': trial}, ['id'])
+        unrelated_record = _copy_record(conn, record, {'isrctn': 'ISRCTN71203361'})
+
+        with mock.patch.object(processor, 'logger') as logger:
+            processor.process({'PROCESS_DRY_RUN': True}, conn)
+
+        records_ids = [uuid.UUID(row['id']).hex for row in conn['database']['records']]
+        assert sorted(records_ids) == sorted(uuid.UUID(id).hex for id in [record, unrelated_record])
+        logger.info.assert_called_with('%s %s records of %s trials', 'Would remove', 1, 1)
+
+
+def _copy_record(conn, record_id, identifiers):
+    record = conn['database']['records'].find_one(id=record_id)
+    record.update({
+        'id': uuid.uuid1().hex,
+        'identifiers': identifiers,
+        'source_url': 'http://example.com/%s' % '/'.join(identifiers.values()),
+    })
+    return conn['database']['records'].insert(record)
@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import mock
+import urllib2
 import processors.remove_unknown_documentcloud_docs.processor as processor
 
 
@@ -51,6 +52,68 @@ class TestRemoveUnknownDocumentCloudDocsProcessor(object):
 
         assert not dc_mock().documents.get().delete.called
 
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_reports_documents_without_deleting_them_in_dry_run(self, dc_mock, conn, fda_file):
+        conn['database']['files'].update({'id': fda_file, 'documentcloud_id': '200-bar'}, ['id'])
+        conf = {
+            'DOCUMENTCLOUD_USERNAME': 'username',
+            'DOCUMENTCLOUD_PASSWORD': 'password',
+            'DOCUMENTCLOUD_PROJECT': 'project name',
+            'PROCESS_DRY_RUN': True,
+        }
+        _enable_documentcloud_mock(dc_mock, ['100-foo', '200-bar', '300-baz'])
+
+        with mock.patch.object(processor, 'logger') as logger_mock:
+            processor.process(conf, conn)
+
+        assert not dc_mock().documents.delete.called
+        logger_mock.info.assert_any_call('Would delete from DocumentCloud: %s', '100')
+        logger_mock.info.assert_any_call('Would delete from DocumentCloud: %s', '300')
+        logger_mock.info.assert_any_call('Would delete %s of %s DocumentCloud docs', 2, 3)
+
+    @mock.patch.object(processor, '_BACKOFF', 0)
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_retries_failed_deletions(self, dc_mock, conn):
+        conf = {
+            'DOCUMENTCLOUD_USERNAME': 'username',
+            'DOCUMENTCLOUD_PASSWORD': 'password',
+            'DOCUMENTCLOUD_PROJECT': 'project name',
+        }
+        _enable_documentcloud_mock(dc_mock, ['100-foo'])
+        error = urllib2.HTTPError('url', 503, 'Service Unavailable', {}, None)
+        dc_mock().documents.delete.side_effect = [error, None]
+
+        processor.process(conf, conn)
+
+        assert dc_mock().documents.delete.call_args_list == [mock.call('100'), mock.call('100')]
+
+    @mock.patch.object(processor, '_BACKOFF', 0)
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_doesnt_retry_client_errors(self, dc_mock, conn):
+        conf = {
+            'DOCUMENTCLOUD_USERNAME': 'username',
+            'DOCUMENTCLOUD_PASSWORD': 'password',
+            'DOCUMENTCLOUD_PROJECT': 'project name',
+        }
+        _enable_documentcloud_mock(dc_mock, ['100-foo', '200-bar'])
+        error = urllib2.HTTPError('url', 403, 'Forbidden', {}, None)
+        dc_mock().documents.delete.side_effect = [error, None]
+
+        processor.process(conf, conn)
+
+        assert dc_mock().documents.delete.call_count == 2
+
+
+class TestIterUnknownIds(object):
+    def test_yields_remote_ids_missing_locally(self):
+        remote_ids = ['1', '10', '2', '30', '4']
+        local_ids = ['0', '10', '3', '30', '5']
+
+        assert list(processor._iter_unknown_ids(remote_ids, local_ids)) == ['1', '2', '4']
+
+    def test_yields_all_remote_ids_without_local_ids(self):
+        assert list(processor._iter_unknown_ids(['1', '2'], [])) == ['1', '2']
+
 
 def _enable_documentcloud_mock(dc_mock, document_ids):
     project = mock.Mock()
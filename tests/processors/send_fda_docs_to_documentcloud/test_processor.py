@@ -83,6 +83,104 @@ class TestSendFDADocsToDocumentCloudProcessor(object):
         dc_mock().documents.upload.assert_called()
 
 
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_reuses_client_and_project(self, dc_mock, file_stub, conn):
+        doc_mock, project_mock = _setup_documentcloud_mock(dc_mock)
+        doc_mock.file_hash = file_stub['sha1']
+        dc_calls = dc_mock.call_count
+
+        processor = SendFDADocsToDocumentCloudProcessor(self.CONF, conn['database'])
+        processor.process_file(dict(file_stub))
+        processor.process_file(dict(file_stub))
+
+        assert dc_mock.call_count == dc_calls + 1
+        dc_mock().projects.get_or_create_by_title.assert_called_once_with(self.CONF['DOCUMENTCLOUD_PROJECT'])
+
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_uploads_new_file_with_its_metadata(self, dc_mock, file_stub, conn):
+        del file_stub['documentcloud_id']
+        doc_mock, project_mock = _setup_documentcloud_mock(dc_mock)
+        doc_mock.file_hash = None
+
+        processor = SendFDADocsToDocumentCloudProcessor(self.CONF, conn['database'])
+        processor.process_file(file_stub)
+
+        upload_kwargs = dc_mock().documents.upload.call_args[1]
+        assert upload_kwargs['project'] == project_mock.id
+        assert upload_kwargs['access'] == 'public'
+        assert upload_kwargs['data']['fda_application'] == file_stub['fda_application_id']
+        doc_mock.save.assert_not_called()
+
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_doesnt_save_unchanged_metadata(self, dc_mock, file_stub, conn):
+        doc_mock, project_mock = _setup_documentcloud_mock(dc_mock)
+        doc_mock.file_hash = file_stub['sha1']
+        processor = SendFDADocsToDocumentCloudProcessor(self.CONF, conn['database'])
+        metadata = processor._get_metadata(file_stub)
+        doc_mock.title = metadata['title']
+        doc_mock.access = metadata['access']
+        doc_mock.data = metadata['data']
+
+        processor.process_file(file_stub)
+
+        doc_mock.save.assert_not_called()
+
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_process_skips_files_matching_prefetched_documents(self, dc_mock, file_stub, conn):
+        doc_mock, project_mock = _setup_documentcloud_mock(dc_mock)
+        doc_mock.id = '%s-document-title' % file_stub['documentcloud_id']
+        doc_mock.file_hash = file_stub['sha1']
+        metadata = SendFDADocsToDocumentCloudProcessor(self.CONF, conn['database'])._get_metadata(file_stub)
+        doc_mock.title = metadata['title']
+        doc_mock.access = metadata['access']
+        doc_mock.data = metadata['data']
+        dc_mock().documents.search.return_value = [doc_mock]
+
+        processor.process(self.CONF, conn)
+
+        dc_mock().documents.get.assert_not_called()
+        doc_mock.save.assert_not_called()
+
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_process_writes_documentcloud_ids_of_uploaded_files(self, dc_mock, file_stub, conn):
+        conn['database']['files'].update({'id': file_stub['id'], 'documentcloud_id': None}, ['id'])
+        doc_mock, project_mock = _setup_documentcloud_mock(dc_mock)
+        doc_mock.file_hash = None
+        dc_mock().documents.search.return_value = []
+
+        processor.process(self.CONF, conn)
+
+        dc_mock().documents.upload.assert_called()
+        assert conn['database']['files'].find_one(id=file_stub['id'])['documentcloud_id'] == '123456'
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_process_writes_documentcloud_ids_of_files_uploaded_before_failure(self, dc_mock,
+        file_stub, conn):
+        conn['database']['files'].update({'id': file_stub['id'], 'documentcloud_id': None}, ['id'])
+        doc_mock, project_mock = _setup_documentcloud_mock(dc_mock)
+        doc_mock.file_hash = None
+        dc_mock().documents.search.return_value = []
+        query = conn['database'].query
+        def failing_query(sql, **params):
+            if 'fda_approvals' not in sql:
+                return query(sql, **params)
+            def iter_files():
+                for row in query(sql, **params):
+                    yield row
+                raise sqlalchemy.exc.OperationalError(sql, params, Exception('Connection lost'))
+            return iter_files()
+
+        with mock.patch.object(conn['database'], 'query', side_effect=failing_query):
+            with pytest.raises(sqlalchemy.exc.OperationalError):
+                processor.process(self.CONF, conn)
+
+        assert conn['database']['files'].find_one(id=file_stub['id'])['documentcloud_id'] == '123456'
+
+
 @pytest.fixture
 def file_stub(conn, fda_document):
     document_record = conn['database']['documents'].find_one(id=fda_document)
@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 import mock
 import uuid
 import pytest
+import processors.base.helpers as helpers
 import processors.sync_text_from_documentcloud.processor as processor
 
 
@@ -28,42 +29,28 @@ class TestSyncTextFromDocumentCloud(object):
 
 
     @mock.patch('documentcloud.DocumentCloud')
-    def test_ignores_documents_without_fulltext(self, dc_mock):
+    def test_ignores_documents_without_fulltext(self, dc_mock, conn, fda_file):
         conf = {}
-        conn = {
-            'database': mock.Mock(),
-        }
-        conn['database'].query.return_value = [
-            {'id': 'file_id', 'documentcloud_id': '100-foo'},
-        ]
-        dc_mock().documents.get().get_full_text.side_effect = NotImplementedError()
+        _enable_documentcloud_mock(dc_mock)
+        dc_mock().documents.get().pages = 1
+        dc_mock().documents.get().get_page_text.side_effect = NotImplementedError()
 
         processor.process(conf, conn)
 
-        conn['database'].update.assert_not_called()
+        assert conn['database']['files'].find_one(id=fda_file)['pages'] == []
 
     @mock.patch('documentcloud.DocumentCloud')
-    def test_ignores_documents_it_couldnt_load(self, dc_mock):
+    def test_ignores_documents_it_couldnt_load(self, dc_mock, conn, fda_file):
         conf = {}
-        conn = {
-            'database': mock.Mock(),
-        }
-        conn['database'].query.return_value = [
-            {'id': 'file_id', 'documentcloud_id': '100-foo'},
-        ]
         dc_mock().documents.get.side_effect = Exception()
 
         processor.process(conf, conn)
 
+        assert conn['database']['files'].find_one(id=fda_file)['pages'] == []
+
     @mock.patch('documentcloud.DocumentCloud')
-    def test_raises_stuff(self, dc_mock):
+    def test_raises_stuff(self, dc_mock, conn, fda_file):
         conf = {}
-        conn = {
-            'database': mock.Mock(),
-        }
-        conn['database'].query.return_value = [
-            {'id': 'file_id', 'documentcloud_id': '100-foo'},
-        ]
         exception = Exception()
         exception.code = 403
         dc_mock().documents.get.side_effect = exception
@@ -71,11 +58,57 @@ class TestSyncTextFromDocumentCloud(object):
         with pytest.raises(Exception):
             processor.process(conf, conn)
 
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_skips_files_with_pages_of_unchanged_documents(self, dc_mock, conn, fda_file):
+        conf = {}
+        conn['database']['files'].update({'id': fda_file, 'pages': ['page 1', 'page 2']}, ['id'])
+        _enable_documentcloud_mock(dc_mock)
+        doc_mock = dc_mock().documents.get()
+        doc_mock.pages = 2
+        doc_mock.file_hash = conn['database']['files'].find_one(id=fda_file)['sha1']
+
+        processor.process(conf, conn)
+
+        doc_mock.get_page_text.assert_not_called()
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_doesnt_write_unchanged_pages(self, dc_mock, conn, fda_file):
+        conf = {}
+        pages = ['page 1', 'pâge "2"\tend']
+        conn['database']['files'].update({'id': fda_file, 'pages': pages}, ['id'])
+        _enable_documentcloud_mock(dc_mock)
+        doc_mock = dc_mock().documents.get()
+        doc_mock.pages = 2
+        doc_mock.file_hash = 'different-hash'
+        doc_mock.get_page_text.side_effect = lambda num: pages[num - 1]
+
+        with mock.patch.object(processor.base.writers, 'write_file') as write_file:
+            processor.process(conf, conn)
+
+        write_file.assert_not_called()
+
+    @mock.patch('documentcloud.DocumentCloud')
+    def test_continues_after_checkpoint(self, dc_mock, conn, fda_file):
+        conf = {}
+        file_ids = sorted([uuid.UUID(fda_file).hex, _copy_file(conn, fda_file)])
+        helpers.set_checkpoint(conn, 'sync_text_from_documentcloud', '0:%s' % file_ids[0])
+        _enable_documentcloud_mock(dc_mock)
+        doc_mock = dc_mock().documents.get()
+        doc_mock.pages = 1
+        doc_mock.get_page_text.return_value = 'page'
+
+        processor.process(conf, conn)
+
+        pages = [conn['database']['files'].find_one(id=file_id)['pages'] for file_id in file_ids]
+        assert pages == [[], ['page']]
+        assert helpers.get_checkpoint(conn, 'sync_text_from_documentcloud') is None
+
 
 def _enable_documentcloud_mock(dc_mock):
     project = mock.Mock()
 
     document = mock.Mock()
+    document.get_page_text_url.side_effect = lambda num: 'https://www.documentcloud.org/%d.txt' % num
 
     client = mock.Mock()
     client.projects.get_by_title.return_value = project
@@ -84,3 +117,16 @@ def _enable_documentcloud_mock(dc_mock):
     dc_mock.return_value = client
 
     return dc_mock
+
+
+def _copy_file(conn, file_id):
+    the_file = conn['database']['files'].find_one(id=file_id)
+    sha1 = uuid.uuid1().hex
+    the_file.update({
+        'id': uuid.uuid1().hex,
+        'sha1': sha1,
+        'source_url': 'http://datastore.opentrials.net/documents/fda/file_%s.pdf' % sha1,
+        'documentcloud_id': '3154194',
+    })
+    conn['database']['files'].insert(the_file)
+    return the_file['id']
@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 
 import pytest
 import uuid
+import mock
 from copy import deepcopy
 import processors.trial_remover.processor as processor
 
@@ -81,6 +82,88 @@ class TestTrialRemoverProcessor(object):
         processor.process(conf, conn)
         assert conn['database']['files'].find_one(file_id=file_id) is None
 
+    def test_delete_related_organisations_doesnt_remove_organisations_with_fda_applications(self,
+        conn, conf, trial, organization, fda_application):
+        trial_organisation = {'organisation_id': organization, 'trial_id': trial, 'role': 'sponsor'}
+        conn['database']['trials_organisations'].insert(trial_organisation)
+
+        processor.process(conf, conn)
+        assert conn['database']['trials'].find_one(id=trial) is None
+        assert conn['database']['organisations'].find_one(id=organization) is not None
+
+
+    def test_remove_trials_without_records_in_bulk_returns_counts_per_table(self,
+        conn, conf, trial, document):
+        trial_object = conn['database']['trials'].find_one(id=trial)
+        other_trial = dict(trial_object, id=uuid.uuid1().hex)
+        conn['database']['trials'].insert(other_trial)
+        for trial_id in [trial, other_trial['id']]:
+            conn['database']['trials_documents'].insert({
+                'document_id': document,
+                'trial_id': trial_id,
+            })
+
+        counts = processor.remove_trials_without_records_in_bulk(conf, conn, batch_size=1)
+        assert conn['database']['trials'].count() == 0
+        assert counts['trials'] == 2
+        assert counts['trials_documents'] == 2
+        assert counts['documents'] == 1
+        assert counts['files'] == 1
+        assert counts['conditions'] == 0
+
+
+    def test_remove_trials_without_records_in_bulk_only_counts_on_dry_run(self,
+        conn, conf, trial, document):
+        trial_document = {'document_id': document, 'trial_id': trial}
+        conn['database']['trials_documents'].insert(trial_document)
+
+        counts = processor.remove_trials_without_records_in_bulk(
+            dict(conf, PROCESS_DRY_RUN=True), conn)
+        assert counts['trials'] == 1
+        assert counts['documents'] == 1
+        assert conn['database']['trials'].find_one(id=trial) is not None
+        assert conn['database']['documents'].find_one(id=document) is not None
+
+
+    @pytest.mark.parametrize('batch_size', [None, 1])
+    def test_remove_trials_without_records_in_bulk_counts_the_same_rows_on_dry_run(self,
+        conn, conf, trial, document, batch_size):
+        trial_object = conn['database']['trials'].find_one(id=trial)
+        other_trial = dict(trial_object, id=uuid.uuid1().hex)
+        conn['database']['trials'].insert(other_trial)
+        for trial_id in [trial, other_trial['id']]:
+            conn['database']['trials_documents'].insert({
+                'document_id': document,
+                'trial_id': trial_id,
+            })
+
+        with mock.patch.object(processor, '_delete_trials') as delete_trials:
+            dry_run_counts = processor.remove_trials_without_records_in_bulk(
+                dict(conf, PROCESS_DRY_RUN=True), conn, batch_size=batch_size)
+        counts = processor.remove_trials_without_records_in_bulk(conf, conn, batch_size=batch_size)
+
+        delete_trials.assert_not_called()
+        assert dry_run_counts == counts
+        assert counts['documents'] == 1
+
+
+    def test_remove_trials_without_records_in_bulk_removes_failed_batch_one_by_one(self,
+        conn, conf, trial):
+        trial_object = conn['database']['trials'].find_one(id=trial)
+        other_trial = dict(trial_object, id=uuid.uuid1().hex)
+        conn['database']['trials'].insert(other_trial)
+        delete_trials = processor._delete_trials
+        def failing_delete_trials(db, trial_ids):
+            if len(trial_ids) > 1:
+                raise ValueError('Invalid row')
+            return delete_trials(db, trial_ids)
+
+        with mock.patch.object(processor, '_delete_trials', side_effect=failing_delete_trials):
+            counts = processor.remove_trials_without_records_in_bulk(conf, conn, batch_size=2)
+
+        assert counts['trials'] == 2
+        assert conn['database']['trials'].count() == 0
+
 
 @pytest.fixture
 def conf():